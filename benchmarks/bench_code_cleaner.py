@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark: line-based vs ast-based code cleaning.
+
+Times clean_by_lines (the original implementation), clean_by_ast on every
+call (cold) and clean_code with its source-hash memo (warm) over the
+test_corpus/clean_code inputs, and prints microseconds per call as JSON.
+
+Usage:
+python benchmarks/bench_code_cleaner.py [--repeat 2000]
+"""
+
+import os
+import sys
+import glob
+import json
+import timeit
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import code_cleaner  # noqa: E402
+
+
+def load_corpus():
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "test_corpus", "clean_code", "*.input"))):
+        with open(path, encoding="utf-8") as f:
+            corpus.append(f.read())
+    return corpus
+
+
+def per_call_us(func, corpus, repeat):
+    def run():
+        for code in corpus:
+            func(code)
+    seconds = min(timeit.repeat(run, number=repeat, repeat=3))
+    return round(seconds / (repeat * len(corpus)) * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark code cleaning implementations")
+    parser.add_argument("--repeat", type=int, default=2000, help="Passes over the corpus per timing run.")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+
+    def ast_cold(code):
+        try:
+            return code_cleaner.clean_by_ast(code)
+        except SyntaxError:
+            return code_cleaner.clean_by_lines(code)
+
+    code_cleaner.clear_cache()
+    results = {
+        "cases": len(corpus),
+        "repeat": args.repeat,
+        "us_per_call": {
+            "lines": per_call_us(code_cleaner.clean_by_lines, corpus, args.repeat),
+            "ast_cold": per_call_us(ast_cold, corpus, max(1, args.repeat // 10)),
+            "ast_memoized": per_call_us(code_cleaner.clean_code, corpus, args.repeat),
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
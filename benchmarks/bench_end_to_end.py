@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of generate_pandas_code.
+
+Generates synthetic sales datasets of increasing size in each file format the
+runner reads, serves canned completions from the local OpenAI-compatible stub
+(stub_llm_server.py) with a configurable latency, and answers the same query
+repeatedly against every (format, size) pair. Each pair runs in a fresh
+process (imports are preloaded first), so peak RSS is per pair and the first
+request shows the cost of a cold process.
+
+Reports latency percentiles, throughput and the median of the runner's
+per-stage timings over the requests after the warm-up ones (the first
+request's latency is reported on its own), plus peak memory, and writes
+everything as JSON. The LLM path is measured unless --fast-path on lets the
+runner answer the query without the LLM when it can (see
+bench_fast_path.py for the fast path's hit rate on a mix of questions). --compare checks a run against an earlier JSON file and
+exits non-zero on regressions.
+
+Usage:
+python benchmarks/bench_end_to_end.py [--sizes 1000,10000,100000] [--formats csv,parquet]
+                                      [--repeat 5] [--warmup 1] [--latency 0.2] [--load-mode auto] [--output results.json]
+python benchmarks/bench_end_to_end.py --compare benchmarks/results/baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import subprocess
+from importlib import metadata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stub_llm_server import StubLLMServer  # noqa: E402
+
+DEFAULT_FORMATS = ('csv', 'xlsx', 'json', 'parquet', 'feather', 'pickle')
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_QUERY = "What are the total sales per category?"
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+# A pair regresses when its p50 latency grows by more than this factor
+REGRESSION_THRESHOLD = 1.2
+
+WRITERS = {
+    'csv': lambda df, path: df.to_csv(path, index=False),
+    'xlsx': lambda df, path: df.to_excel(path, index=False),
+    'json': lambda df, path: df.to_json(path, orient='records', date_format='iso'),
+    'jsonl': lambda df, path: df.to_json(path, orient='records', lines=True, date_format='iso'),
+    'parquet': lambda df, path: df.to_parquet(path, index=False),
+    'feather': lambda df, path: df.to_feather(path),
+    'arrow': lambda df, path: write_arrow(df, path),
+    'pickle': lambda df, path: df.to_pickle(path),
+}
+
+
+def write_arrow(df, path):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table)
+
+
+def synthetic_frame(rows, seed=0):
+    """Sales-like data: a few categorical columns, numbers and dates"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'OrderId': np.arange(rows),
+        'Category': rng.choice(['Electronics', 'Wearable', 'Audio', 'Gaming', 'Office', 'Home'], rows),
+        'Region': rng.choice(['North', 'South', 'East', 'West'], rows),
+        'Product': rng.choice([f'Product {i}' for i in range(200)], rows),
+        'Sales': rng.integers(1, 500, rows),
+        'Price': rng.uniform(5, 5000, rows).round(2),
+        'Date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D'),
+    })
+
+
+def make_datasets(data_dir, formats, sizes):
+    """Write (or reuse) one file per (format, size); returns {(format, size): path}"""
+    os.makedirs(data_dir, exist_ok=True)
+    paths = {}
+    for size in sizes:
+        frame = None
+        for file_format in formats:
+            path = os.path.join(data_dir, f"sales_{size}.{file_format}")
+            if not os.path.exists(path):
+                frame = synthetic_frame(size) if frame is None else frame
+                WRITERS[file_format](frame, path)
+            paths[(file_format, size)] = path
+    return paths
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile (q in 0..100) of a non-empty list"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def median_stages(runs):
+    stages = {}
+    for run in runs:
+        for name, ms in (run.get('timings') or {}).items():
+            stages.setdefault(name, []).append(ms)
+    return {name: round(percentile(values, 50), 1) for name, values in stages.items()}
+
+
+# ---- one (format, size) pair, in its own process --------------------------
+
+def run_cell(path, base_url, repeat, query, load_mode="full"):
+    """Answer query repeat times against path; returns raw per-run measurements"""
+    import pandasai_runner
+    import profiling
+
+    start = time.perf_counter()
+    pandasai_runner.preload()
+    preload_ms = (time.perf_counter() - start) * 1000
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = pandasai_runner.generate_pandas_code(
+            path, query, cli_model_name="stub", cli_api_key="bench", cli_api_base_url=base_url, use_cache=False,
+            load_mode=load_mode)
+        runs.append({
+            'ms': round((time.perf_counter() - start) * 1000, 1),
+            'error': result.get('error'),
+            'dataset_cache': result.get('dataset_cache'),
+            'source': result.get('source'),
+            'timings': result.get('timings'),
+        })
+    return {'preload_ms': round(preload_ms, 1), 'runs': runs, 'peak_rss_mb': profiling.peak_rss_mb()}
+
+
+def measure(file_format, size, path, base_url, repeat, warmup, query, work_dir, env, load_mode="full"):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--cell', path, '--base-url', base_url,
+         '--repeat', str(repeat + warmup), '--query', query, '--load-mode', load_mode],
+        cwd=work_dir, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {'format': file_format, 'size': size, 'error': proc.stderr.strip().splitlines()[-1:]}
+    cell = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    first_ms = cell['runs'][0]['ms']
+    runs = cell['runs'][warmup:]
+    latencies = [run['ms'] for run in runs]
+    errors = [run['error'] for run in cell['runs'] if run['error']]
+    return {
+        'format': file_format,
+        'size': size,
+        'file_bytes': os.path.getsize(path),
+        'runs': len(runs),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'first_ms': first_ms,
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p90_ms': round(percentile(latencies, 90), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'mean_ms': round(sum(latencies) / len(latencies), 1),
+        'throughput_rps': round(len(latencies) / (sum(latencies) / 1000), 2),
+        'peak_rss_mb': cell['peak_rss_mb'],
+        'preload_ms': cell['preload_ms'],
+        'dataset_cache': sorted({run['dataset_cache'] for run in runs if run['dataset_cache']}),
+        'fast_path_hits': sum(1 for run in runs if run.get('source') == 'fast_path'),
+        'stages_p50_ms': median_stages(runs),
+    }
+
+
+# ---- reporting ------------------------------------------------------------
+
+def environment():
+    def version(package):
+        try:
+            return metadata.version(package)
+        except metadata.PackageNotFoundError:
+            return None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+        'packages': {name: version(name) for name in ('pandas', 'pandasai', 'pyarrow', 'openpyxl', 'numpy')},
+    }
+
+
+def print_table(results):
+    header = f"{'format':<8} {'rows':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'req/s':>7} {'RSS MB':>8} {'errors':>6}"
+    print(header, file=sys.stderr)
+    for r in results:
+        if 'p50_ms' not in r:
+            print(f"{r['format']:<8} {r['size']:>8} failed: {r.get('error')}", file=sys.stderr)
+            continue
+        print(f"{r['format']:<8} {r['size']:>8} {r['p50_ms']:>9} {r['p90_ms']:>9} {r['p99_ms']:>9} "
+              f"{r['throughput_rps']:>7} {r['peak_rss_mb']:>8} {r['errors']:>6}", file=sys.stderr)
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """Pairs whose p50 latency or peak RSS grew by more than threshold over the baseline"""
+    previous = {(r['format'], r['size']): r for r in baseline['results'] if 'p50_ms' in r}
+    regressions = []
+    for r in report['results']:
+        old = previous.get((r['format'], r['size']))
+        if old is None or 'p50_ms' not in r:
+            continue
+        for metric in ('p50_ms', 'peak_rss_mb'):
+            if old.get(metric) and r.get(metric) and r[metric] > old[metric] * threshold:
+                regressions.append({'format': r['format'], 'size': r['size'], 'metric': metric,
+                                    'baseline': old[metric], 'current': r[metric],
+                                    'ratio': round(r[metric] / old[metric], 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of generate_pandas_code against a local LLM stub")
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS), help=f"Comma-separated file formats ({', '.join(WRITERS)}).")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated row counts.")
+    parser.add_argument("--repeat", type=int, default=5, help="Measured requests per (format, size).")
+    parser.add_argument("--warmup", type=int, default=1, help="Requests per (format, size) left out of the percentiles.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM latency in seconds.")
+    parser.add_argument("--query", default=DEFAULT_QUERY)
+    parser.add_argument("--data-dir", help="Where synthetic datasets are written and reused (default: a temporary directory).")
+    parser.add_argument("--load-mode", choices=["full", "schema", "auto"], default="full", help="Runner load mode ('auto' reads CSV/JSON Lines schema-first and Parquet/Feather/Arrow column by column).")
+    parser.add_argument("--dataset-cache", choices=["off", "on"], default="off", help="'off' measures a first upload every time; 'on' lets repeated requests hit the dataset cache.")
+    parser.add_argument("--fast-path", choices=["off", "on"], default="off", help="'off' always measures the LLM path; 'on' lets the runner answer simple aggregations without the LLM.")
+    parser.add_argument("--output", help="Write the JSON report here (default: benchmarks/results/e2e-<timestamp>.json).")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="Compare against an earlier report; exit 1 if any pair regressed.")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Regression factor for --compare.")
+    # Internal: run one pair in this process and print its raw measurements
+    parser.add_argument("--cell", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cell:
+        print(json.dumps(run_cell(args.cell, args.base_url, args.repeat, args.query, args.load_mode)))
+        return 0
+
+    formats = [f for f in args.formats.split(",") if f]
+    unknown = [f for f in formats if f not in WRITERS]
+    if unknown:
+        parser.error(f"no synthetic writer for: {', '.join(unknown)}")
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    with tempfile.TemporaryDirectory(prefix="bench-e2e-") as scratch:
+        data_dir = args.data_dir or os.path.join(scratch, "data")
+        print(f"Preparing datasets in {data_dir}", file=sys.stderr)
+        paths = make_datasets(data_dir, formats, sizes)
+
+        # Charts, caches and logs of the measured processes stay out of the repo
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        if args.dataset_cache == "off":
+            env.update(DATASET_CACHE_MEMORY_MB="0", DATASET_CACHE_DISK_MB="0")
+        env['FAST_PATH'] = "1" if args.fast_path == "on" else "0"
+
+        stub = StubLLMServer(latency=args.latency).start()
+        try:
+            results = []
+            for size in sizes:
+                for file_format in formats:
+                    print(f"Measuring {file_format} x {size} rows", file=sys.stderr)
+                    work_dir = os.path.join(scratch, f"work_{file_format}_{size}")
+                    os.makedirs(work_dir)
+                    results.append(measure(file_format, size, paths[(file_format, size)], stub.base_url,
+                                           args.repeat, args.warmup, args.query, work_dir, env, args.load_mode))
+        finally:
+            stub.stop()
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {'formats': formats, 'sizes': sizes, 'repeat': args.repeat, 'warmup': args.warmup, 'latency_s': args.latency,
+                     'query': args.query, 'load_mode': args.load_mode, 'dataset_cache': args.dataset_cache,
+                     'fast_path': args.fast_path},
+        'environment': environment(),
+        'results': results,
+    }
+    print_table(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        print(json.dumps({'regressions': regressions}, indent=2))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
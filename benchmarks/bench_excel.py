@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Benchmark: Excel ingestion paths.
+
+Writes a synthetic multi-sheet workbook and times reading all of its sheets
+the way the runner used to (one pd.read_excel/openpyxl call per sheet), with
+excel_reader (workbook opened once; worker processes per sheet; calamine when
+python-calamine is installed) and from the dataset cache's Feather copies,
+which is what later questions on the same workbook read. Prints the median
+milliseconds per path as JSON.
+
+Usage:
+python benchmarks/bench_excel.py [--rows 20000] [--sheets 4] [--repeat 3] [--processes 4]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import excel_reader  # noqa: E402
+import dataset_cache  # noqa: E402
+from bench_end_to_end import synthetic_frame, percentile  # noqa: E402
+
+
+def write_workbook(path, rows, sheets):
+    import pandas as pd
+
+    with pd.ExcelWriter(path) as writer:
+        for i in range(sheets):
+            synthetic_frame(rows, seed=i).to_excel(writer, sheet_name=f"Sheet{i + 1}", index=False)
+    return [f"Sheet{i + 1}" for i in range(sheets)]
+
+
+def median_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return round(percentile(times, 50), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Excel ingestion paths")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows per sheet.")
+    parser.add_argument("--sheets", type=int, default=4, help="Sheets in the workbook.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per path.")
+    parser.add_argument("--processes", type=int, default=excel_reader.PROCESSES, help="Worker processes for the parallel paths.")
+    parser.add_argument("--output", help="Also write the JSON report here.")
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory(prefix="bench-excel-") as scratch:
+        path = os.path.join(scratch, "workbook.xlsx")
+        sheets = write_workbook(path, args.rows, args.sheets)
+
+        paths = {
+            'openpyxl_per_sheet': lambda: [pd.read_excel(path, sheet_name=sheet) for sheet in sheets],
+            'openpyxl_once': lambda: excel_reader.read_sheets(path, sheets, engine='openpyxl', processes=1),
+        }
+        # The size threshold is for production workbooks; here the pool is always used
+        excel_reader.PARALLEL_MIN_MB = 0
+        if args.processes > 1:
+            paths['openpyxl_parallel'] = lambda: excel_reader.read_sheets(
+                path, sheets, engine='openpyxl', processes=args.processes)
+        if excel_reader.calamine_available():
+            paths['calamine'] = lambda: excel_reader.read_sheets(path, sheets, engine='calamine', processes=1)
+            if args.processes > 1:
+                paths['calamine_parallel'] = lambda: excel_reader.read_sheets(
+                    path, sheets, engine='calamine', processes=args.processes)
+
+        # Later questions: every sheet comes from the Feather copy on disk
+        cache = dataset_cache.DatasetCache(cache_dir=os.path.join(scratch, "cache"), memory_budget_mb=0)
+        digest = dataset_cache.file_digest(path)
+        frames = excel_reader.read_sheets(path, sheets, processes=1)
+        for sheet in sheets:
+            cache.load(path, 'xlsx', lambda _: frames[sheet], digest=digest, variant=f"sheet:{sheet}")
+        paths['dataset_cache'] = lambda: [
+            cache.load(path, 'xlsx', None, digest=digest, variant=f"sheet:{sheet}") for sheet in sheets]
+
+        results = {
+            'rows_per_sheet': args.rows,
+            'sheets': args.sheets,
+            'file_bytes': os.path.getsize(path),
+            'cpus': os.cpu_count(),
+            'processes': args.processes,
+            'calamine': excel_reader.calamine_available(),
+            'median_ms': {name: median_ms(func, args.repeat) for name, func in paths.items()},
+        }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Benchmark: LLM-free fast path (fast_path.py).
+
+Answers a mix of typical questions (English and Chinese; simple aggregations
+the fast path recognizes and questions only the LLM can answer) against a
+synthetic sales CSV, once with the fast path and once without, with the
+local OpenAI-compatible stub (stub_llm_server.py) standing in for the LLM at
+a configurable latency. Reports the hit rate of the mix, the median latency
+of every question both ways and the mean saving per question, as JSON.
+
+Usage:
+python benchmarks/bench_fast_path.py [--rows 10000] [--repeat 3] [--latency 0.5] [--queries queries.txt]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm_server import StubLLMServer  # noqa: E402
+from bench_end_to_end import synthetic_frame, percentile  # noqa: E402
+
+DEFAULT_QUERIES = (
+    "What are the total sales per category?",
+    "average Price",
+    "top 5 Product by Sales",
+    "how many rows",
+    "median Price per Region",
+    "bar chart of total Sales by Region",
+    "各Category的Sales总和",
+    "Sales最高的前3个Product",
+    "Which products sold better in the second half of the year?",
+    "Show Electronics sales in the North region by month",
+    "Sales和Price的相关性是多少？",
+    "Compare the average order value of weekends and weekdays",
+)
+
+
+def timed_runs(query, path, base_url, repeat, use_fast_path):
+    import pandasai_runner
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = pandasai_runner.generate_pandas_code(
+            path, query, cli_model_name="stub", cli_api_key="bench", cli_api_base_url=base_url, use_cache=False,
+            use_fast_path=use_fast_path)
+        runs.append({'ms': (time.perf_counter() - start) * 1000, 'source': result.get('source'),
+                     'error': result.get('error'), 'intent': (result.get('fast_path') or {}).get('intent')})
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM-free fast path against the LLM path")
+    parser.add_argument("--rows", type=int, default=10000, help="Rows of the synthetic sales CSV.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per question and path.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub LLM latency in seconds.")
+    parser.add_argument("--queries", help="Text file with one question per line (default: a built-in mix).")
+    parser.add_argument("--output", help="Also write the JSON report here.")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    if args.queries:
+        with open(args.queries, encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = list(DEFAULT_QUERIES)
+
+    with tempfile.TemporaryDirectory(prefix="bench-fast-path-") as scratch:
+        # Charts and caches of the measured requests stay out of the repo
+        os.chdir(scratch)
+        path = os.path.join(scratch, "sales.csv")
+        synthetic_frame(args.rows).to_csv(path, index=False)
+        import pandasai_runner
+        pandasai_runner.preload()
+
+        stub = StubLLMServer(latency=args.latency).start()
+        try:
+            timed_runs(queries[0], path, stub.base_url, 1, False)  # warm-up: imports, dataset cache
+            per_query = []
+            for query in queries:
+                fast = timed_runs(query, path, stub.base_url, args.repeat, True)
+                llm = timed_runs(query, path, stub.base_url, args.repeat, False)
+                per_query.append({
+                    'query': query,
+                    'fast_path': fast[0]['source'] == 'fast_path',
+                    'intent': fast[0]['intent'],
+                    'errors': sum(1 for run in fast + llm if run['error']),
+                    'p50_ms': round(percentile([run['ms'] for run in fast], 50), 1),
+                    'llm_p50_ms': round(percentile([run['ms'] for run in llm], 50), 1),
+                })
+        finally:
+            stub.stop()
+
+    hits = [q for q in per_query if q['fast_path']]
+    mean = lambda values: round(sum(values) / len(values), 1) if values else None  # noqa: E731
+    results = {
+        'rows': args.rows,
+        'latency_s': args.latency,
+        'repeat': args.repeat,
+        'queries': len(per_query),
+        'hit_rate': round(len(hits) / len(per_query), 3),
+        'mean_ms': mean([q['p50_ms'] for q in per_query]),
+        'llm_mean_ms': mean([q['llm_p50_ms'] for q in per_query]),
+        'hit_mean_ms': mean([q['p50_ms'] for q in hits]),
+        'hit_llm_mean_ms': mean([q['llm_p50_ms'] for q in hits]),
+        'per_query': per_query,
+    }
+    results['saved_ms_per_query'] = round(results['llm_mean_ms'] - results['mean_ms'], 1)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
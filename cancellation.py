@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""
+Cooperative cancellation of a request.
+
+A CancelToken is handed to generate_pandas_code. Every stage of the request
+(see profiling.StageTimer) checks it on entry, so a cancelled request stops at
+the next stage boundary instead of being killed mid-write. The stages that
+can run for long without a boundary, the LLM call and the execution of the
+generated code, are interruptible: when the token is cancelled while one of
+them runs on the main thread, a signal (SIGUSR1) makes that thread raise
+Cancelled at once, which also breaks a blocking socket read or a retry
+sleep. PandasAI and the runner catch Exception, so Cancelled (a
+BaseException) unwinds the whole request; the runner then reports it and
+removes the charts the request had stored.
+
+A token is cancelled by its owner (cancel()), by its deadline, or by a poll
+function checked by watch() - the --serve workers poll a value the pool
+sets, one-shot runs cancel on SIGTERM.
+"""
+
+import sys
+import time
+import signal
+import threading
+from contextlib import contextmanager
+
+# Stages a cancellation interrupts; others finish and stop at the next boundary
+INTERRUPTIBLE_STAGES = ('llm', 'execute', 'wait_full_load')
+INTERRUPT_SIGNAL = getattr(signal, 'SIGUSR1', None)  # None on Windows: boundaries only
+WATCH_INTERVAL = 0.05
+
+_active = None  # the token of the interruptible stage running on the main thread
+_handler_installed = False
+
+
+def debug_print(*args, **kwargs):
+    """Print debug messages to stderr instead of stdout"""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+class Cancelled(BaseException):
+    """The request was cancelled or ran past its deadline"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _interrupt(signum, frame):
+    token = _active
+    if token is not None and token.cancelled:
+        raise Cancelled(token.reason)
+
+
+def _can_interrupt():
+    """Signals are delivered to the main thread only, and only it may install handlers"""
+    global _handler_installed
+    if INTERRUPT_SIGNAL is None or threading.current_thread() is not threading.main_thread():
+        return False
+    if not _handler_installed:
+        if signal.getsignal(INTERRUPT_SIGNAL) not in (signal.SIG_DFL, None):
+            return False  # the host application uses the signal
+        signal.signal(INTERRUPT_SIGNAL, _interrupt)
+        _handler_installed = True
+    return True
+
+
+class CancelToken:
+    """Cancellation state of one request: cancel() from any thread, check() at safe points"""
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline    # time.time() after which the request is cancelled
+        self.reason = None
+        self.request_id = None      # set by the runner, for cleaning up after a cancellation
+        self._event = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._interrupting = False
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.time() >= self.deadline:
+            self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    def cancel(self, reason="cancelled"):
+        """Cancel the request; interrupts the running stage when it is interruptible"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            interrupt = self._interrupting and threading.current_thread() is not threading.main_thread()
+        debug_print(f"Request cancelled: {reason}")
+        if interrupt:
+            signal.pthread_kill(threading.main_thread().ident, INTERRUPT_SIGNAL)
+
+    def check(self):
+        """Raise Cancelled if the request was cancelled"""
+        if self.cancelled:
+            raise Cancelled(self.reason)
+
+    @contextmanager
+    def stage(self, name):
+        """Wrap a request stage: check on entry; interruptible stages may also be stopped midway"""
+        global _active
+        self.check()
+        if name not in INTERRUPTIBLE_STAGES or not _can_interrupt():
+            yield
+            return
+        with self._lock:
+            self._interrupting = True
+        _active = self
+        try:
+            self.check()  # cancelled between the check above and now
+            yield
+        finally:
+            # First, so that a signal arriving from now on is ignored rather than raising here
+            _active = None
+            with self._lock:
+                self._interrupting = False
+
+    def watch(self, poll=None, interval=WATCH_INTERVAL):
+        """
+        Cancel from a background thread once the deadline passes or poll() returns a
+        reason. Runs until close().
+        """
+        def run():
+            while not self._stopped.wait(interval) and not self._event.is_set():
+                reason = poll() if poll is not None else None
+                if reason:
+                    self.cancel(reason)
+                elif self.deadline is not None and time.time() >= self.deadline:
+                    self.cancel("deadline exceeded")
+
+        if poll is not None or self.deadline is not None:
+            threading.Thread(target=run, daemon=True).start()
+        return self
+
+    def close(self):
+        """Stop watching; the request is over"""
+        self._stopped.set()
+
+
+def cancel_on_signal(token, signum):
+    """Cancel token when this process receives signum (e.g. SIGTERM from the backend)"""
+    def handler(received, frame):
+        token.cancel(f"received signal {received}")
+        # The handler runs on the main thread: stop an interruptible stage right here
+        if _active is token:
+            raise Cancelled(token.reason)
+
+    signal.signal(signum, handler)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""
+Content-addressed store for generated charts.
+
+While generated code runs, savefig() calls that target a file are rendered
+into memory instead (capture_figures). Each image is then written once to the
+charts directory as chart_<sha256 prefix>.png, so identical plotting code
+producing identical pixels reuses the existing file. An append-only
+manifest.jsonl records which request produced which chart, letting the Node
+backend name a request's exact chart instead of scanning the directory.
+
+Optional downscaled thumbnails go to charts/thumbs/. Charts not produced or
+reused within the retention period, or beyond the file limit, are removed by
+gc(), which also compacts the manifest.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: manifest writes are best effort
+    fcntl = None
+
+# '' (off), 'webp' or 'png'
+THUMBNAIL_FORMAT = os.getenv("CHART_THUMBNAILS", "").lower()
+THUMBNAIL_SIZE = int(os.getenv("CHART_THUMBNAIL_SIZE", "320"))
+RETENTION_DAYS = float(os.getenv("CHART_RETENTION_DAYS", "30"))
+MAX_FILES = int(os.getenv("CHART_MAX_FILES", "2000"))
+GC_INTERVAL_HOURS = float(os.getenv("CHART_GC_INTERVAL_HOURS", "24"))
+
+MANIFEST_NAME = 'manifest.jsonl'
+THUMBS_DIR_NAME = 'thumbs'
+HASH_PREFIX = 16
+
+
+def debug_print(*args, **kwargs):
+    """Print debug messages to stderr instead of stdout"""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+@contextmanager
+def capture_figures():
+    """
+    Render savefig() calls that target a path into PNG bytes instead of files.
+    Yields the list the images are appended to. Open figures are closed on exit.
+    Patches matplotlib globally, so callers must not run generated code concurrently.
+    """
+    import matplotlib.figure
+    import matplotlib.pyplot as plt
+
+    original = matplotlib.figure.Figure.savefig
+    images = []
+
+    def savefig(figure, fname, *args, **kwargs):
+        if not isinstance(fname, (str, os.PathLike)):
+            return original(figure, fname, *args, **kwargs)
+        buffer = io.BytesIO()
+        kwargs['format'] = 'png'
+        original(figure, buffer, *args, **kwargs)
+        images.append(buffer.getvalue())
+
+    matplotlib.figure.Figure.savefig = savefig
+    try:
+        yield images
+    finally:
+        matplotlib.figure.Figure.savefig = original
+        # Long-lived workers would otherwise accumulate figures
+        plt.close('all')
+
+
+class ChartStore:
+    """Charts directory with content-hash file names, a manifest and retention"""
+
+    def __init__(self, charts_dir, thumbnail_format=THUMBNAIL_FORMAT, thumbnail_size=THUMBNAIL_SIZE,
+                 retention_days=RETENTION_DAYS, max_files=MAX_FILES, gc_interval_hours=GC_INTERVAL_HOURS):
+        self.charts_dir = charts_dir
+        self.thumbnail_format = thumbnail_format if thumbnail_format in ('webp', 'png') else ''
+        self.thumbnail_size = thumbnail_size
+        self.retention_seconds = retention_days * 86400
+        self.max_files = max_files
+        self.gc_interval_seconds = gc_interval_hours * 3600
+        self.manifest_path = os.path.join(charts_dir, MANIFEST_NAME)
+
+    # ---- public API -------------------------------------------------------
+
+    def save(self, image, request_id=None):
+        """
+        Store PNG bytes and record them in the manifest. Returns the manifest
+        entry: chart (file name), thumbnail (path relative to the charts
+        directory, or None), sha256 and reused.
+        """
+        os.makedirs(self.charts_dir, exist_ok=True)
+        sha256 = hashlib.sha256(image).hexdigest()
+        name = f"chart_{sha256[:HASH_PREFIX]}.png"
+        path = os.path.join(self.charts_dir, name)
+
+        reused = os.path.exists(path)
+        if reused:
+            os.utime(path)  # recency for retention
+        else:
+            self._write(path, image)
+            os.chmod(path, 0o644)
+
+        entry = {
+            'request_id': request_id,
+            'chart': name,
+            'thumbnail': self._thumbnail(name, image),
+            'sha256': sha256,
+            'bytes': len(image),
+            'reused': reused,
+            'created': time.time(),
+        }
+        self._append_manifest(entry)
+        self.maybe_gc()
+        return entry
+
+    def reference(self, name, request_id=None):
+        """Record that request_id reuses an already stored chart (e.g. a result cache hit)"""
+        path = os.path.join(self.charts_dir, name)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        thumbnail = self._thumbnail_path(name)
+        entry = {
+            'request_id': request_id,
+            'chart': name,
+            'thumbnail': f"{THUMBS_DIR_NAME}/{os.path.basename(thumbnail)}"
+                         if thumbnail and os.path.exists(thumbnail) else None,
+            'reused': True,
+            'created': time.time(),
+        }
+        self._append_manifest(entry)
+        return entry
+
+    def discard(self, request_id):
+        """
+        Forget the charts of an abandoned (cancelled) request: its manifest entries go, and
+        the files it wrote unless another request produced or reused them too. Returns the
+        number of charts removed.
+        """
+        if not request_id or not os.path.exists(self.manifest_path):
+            return 0
+        with self._manifest_lock():
+            entries = self._read_manifest()
+            own = [e for e in entries if e.get('request_id') == request_id]
+            if not own:
+                return 0
+            kept = [e for e in entries if e.get('request_id') != request_id]
+            shared = {e.get('chart') for e in kept}
+            removed = {e['chart'] for e in own if not e.get('reused') and e['chart'] not in shared}
+            for name in removed:
+                for path in (os.path.join(self.charts_dir, name), self._thumbnail_path(name)):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+            tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(e) + '\n' for e in kept)
+            os.replace(tmp_path, self.manifest_path)
+        return len(removed)
+
+    def lookup(self, request_id):
+        """Manifest entries recorded for request_id, oldest first"""
+        return [e for e in self._read_manifest() if e.get('request_id') == request_id]
+
+    def latest(self):
+        """Most recent manifest entry whose chart still exists, or None"""
+        for entry in reversed(self._read_manifest()):
+            if os.path.exists(os.path.join(self.charts_dir, entry['chart'])):
+                return entry
+        return None
+
+    def info(self):
+        charts = self._charts()
+        return {
+            'charts_dir': self.charts_dir,
+            'charts': len(charts),
+            'bytes': sum(size for _, size, _ in charts),
+            'manifest_entries': len(self._read_manifest()),
+            'retention_days': self.retention_seconds / 86400,
+            'max_files': self.max_files,
+            'thumbnails': self.thumbnail_format or None,
+        }
+
+    def gc(self, now=None):
+        """
+        Remove charts (and their thumbnails) older than the retention period or
+        beyond max_files, oldest first, then drop their manifest entries.
+        Returns the number of charts removed.
+        """
+        now = now or time.time()
+        charts = sorted(self._charts(), key=lambda c: c[2], reverse=True)
+        removed = set()
+        for position, (name, _, mtime) in enumerate(charts):
+            expired = self.retention_seconds and now - mtime > self.retention_seconds
+            if expired or (self.max_files and position >= self.max_files):
+                for path in (os.path.join(self.charts_dir, name), self._thumbnail_path(name)):
+                    if path and os.path.exists(path):
+                        os.remove(path)
+                removed.add(name)
+        if removed:
+            with self._manifest_lock():
+                kept = [e for e in self._read_manifest() if e.get('chart') not in removed]
+                tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.writelines(json.dumps(e) + '\n' for e in kept)
+                os.replace(tmp_path, self.manifest_path)
+        self._touch_gc_stamp(now)
+        return len(removed)
+
+    def maybe_gc(self):
+        """Run gc() if the last run is older than the GC interval (one stat per call otherwise)"""
+        if not self.gc_interval_seconds:
+            return
+        stamp = os.path.join(self.charts_dir, '.gc')
+        try:
+            last = os.path.getmtime(stamp)
+        except OSError:
+            self._touch_gc_stamp()  # first run: start the clock
+            return
+        if time.time() - last >= self.gc_interval_seconds:
+            removed = self.gc()
+            if removed:
+                debug_print(f"Chart GC removed {removed} charts")
+
+    # ---- helpers ----------------------------------------------------------
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # readers never see a partial image
+
+    def _thumbnail_path(self, name):
+        if not self.thumbnail_format:
+            return None
+        stem = os.path.splitext(name)[0]
+        return os.path.join(self.charts_dir, THUMBS_DIR_NAME, f"{stem}.{self.thumbnail_format}")
+
+    def _thumbnail(self, name, image):
+        path = self._thumbnail_path(name)
+        if path is None:
+            return None
+        if not os.path.exists(path):
+            try:
+                from PIL import Image
+                with Image.open(io.BytesIO(image)) as img:
+                    img.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                    buffer = io.BytesIO()
+                    img.save(buffer, format=self.thumbnail_format.upper())
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._write(path, buffer.getvalue())
+            except Exception as e:
+                debug_print(f"Could not create chart thumbnail: {str(e)}")
+                return None
+        return f"{THUMBS_DIR_NAME}/{os.path.basename(path)}"
+
+    def _charts(self):
+        """List of (name, size, mtime) for stored charts"""
+        if not os.path.isdir(self.charts_dir):
+            return []
+        charts = []
+        for name in os.listdir(self.charts_dir):
+            if not (name.startswith('chart_') and name.endswith('.png')):
+                continue
+            try:
+                st = os.stat(os.path.join(self.charts_dir, name))
+            except OSError:
+                continue
+            charts.append((name, st.st_size, st.st_mtime))
+        return charts
+
+    @contextmanager
+    def _manifest_lock(self):
+        os.makedirs(self.charts_dir, exist_ok=True)
+        with open(os.path.join(self.charts_dir, 'manifest.lock'), 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _append_manifest(self, entry):
+        try:
+            with self._manifest_lock():
+                with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            debug_print(f"Could not update chart manifest: {str(e)}")
+
+    def _read_manifest(self):
+        entries = []
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue  # a torn line from a crashed writer
+        except OSError:
+            pass
+        return entries
+
+    def _touch_gc_stamp(self, now=None):
+        stamp = os.path.join(self.charts_dir, '.gc')
+        try:
+            os.makedirs(self.charts_dir, exist_ok=True)
+            with open(stamp, 'a'):
+                pass
+            os.utime(stamp, (now, now) if now else None)
+        except OSError:
+            pass
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+"""
+Post-processing of PandasAI generated code into plain pandas code.
+
+PandasAI code ends with a `result = {"type": ..., "value": ...}` dict that only
+its own pipeline understands. clean_code parses the code with ast, replaces
+each such assignment with a print of its value expression (or plt.show() for
+plots), adds the pandas/numpy/matplotlib imports the code uses but does not
+import, and appends a note. Edits are spliced into the original source, so
+comments and formatting survive.
+
+Cleaned output is memoized by a hash of the source, and the cleaned code is
+compiled once to make sure it is still valid Python; code that does not parse
+falls back to the original line-based cleaning (clean_by_lines).
+"""
+
+import os
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.getenv("CLEAN_CODE_CACHE_SIZE", "512"))
+
+# Module aliases generated code uses, in the order their imports are inserted
+KNOWN_IMPORTS = (
+    ('pd', 'import pandas as pd'),
+    ('np', 'import numpy as np'),
+    ('plt', 'import matplotlib.pyplot as plt'),
+)
+
+DEFAULT_NOTE = "# Note: PandasAI result formatting code has been removed.\n# Above is standard Pandas code that can be run directly in Python."
+STANDARD_PANDAS_NOTE = "# The above is standard Pandas code that can be run directly in Python."
+
+_cache = OrderedDict()  # hash -> (cleaned source, compiled code object)
+_cache_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0, 'fallbacks': 0}
+
+
+def clean_code(code, preference='default'):
+    """Cleaned version of PandasAI generated code; identical inputs are served from the memo"""
+    return clean_and_compile(code, preference)[0]
+
+
+def clean_and_compile(code, preference='default'):
+    """(cleaned source, compiled code object or None) for code, memoized by source hash"""
+    if not code:
+        return code, None
+    key = hashlib.sha256(f"{preference}\0{code}".encode('utf-8')).hexdigest()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            stats['hits'] += 1
+            return entry
+        stats['misses'] += 1
+
+    entry = _clean(code, preference)
+    with _cache_lock:
+        _cache[key] = entry
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return entry
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+        for counter in stats:
+            stats[counter] = 0
+
+
+def _clean(code, preference):
+    try:
+        cleaned = clean_by_ast(code, preference)
+        return cleaned, compile(cleaned, '<generated>', 'exec')
+    except SyntaxError:
+        stats['fallbacks'] += 1
+        cleaned = clean_by_lines(code, preference)
+        try:
+            return cleaned, compile(cleaned, '<generated>', 'exec')
+        except SyntaxError:
+            return cleaned, None
+
+
+# ---- ast-based cleaning ---------------------------------------------------
+
+def _result_value(node):
+    """(type, value expression) if node is `result = {"type": ..., "value": ...}`, else None"""
+    if not (isinstance(node, ast.Assign) and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name) and node.targets[0].id == 'result'
+            and isinstance(node.value, ast.Dict)):
+        return None
+    fields = {}
+    for key, value in zip(node.value.keys, node.value.values):
+        if isinstance(key, ast.Constant) and isinstance(key.value, str):
+            fields[key.value] = value
+    if 'type' not in fields or 'value' not in fields:
+        return None
+    result_type = fields['type'].value if isinstance(fields['type'], ast.Constant) else None
+    return result_type, fields['value']
+
+
+def _position(lines, offsets, lineno, col_offset):
+    """String index of an ast (lineno, col_offset); ast columns count UTF-8 bytes"""
+    line = lines[lineno - 1]
+    return offsets[lineno - 1] + len(line.encode('utf-8')[:col_offset].decode('utf-8', errors='ignore'))
+
+
+def _bound_names(tree):
+    """Names bound by imports anywhere in the code"""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add(alias.asname or alias.name.split('.')[0])
+    return names
+
+
+def _used_names(tree):
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)}
+
+
+def _shows_plot(tree):
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'show':
+            return True
+    return False
+
+
+def clean_by_ast(code, preference='default'):
+    """
+    Replace result-dict assignments with prints of their values, add missing
+    imports and the preference note. Raises SyntaxError if code does not parse.
+    Code without a result dict is returned unchanged.
+    """
+    source = code.replace('\r\n', '\n')
+    tree = ast.parse(source)
+    # ast counts lines by '\n' only (str.splitlines would also split on form feeds etc.)
+    lines = source.split('\n')
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+
+    edits = []  # (start, end, replacement)
+    plots = False
+    # A plot the code already shows needs no extra plt.show()
+    shown = _shows_plot(tree)
+    last_top_level = tree.body[-1] if tree.body else None
+    for node in ast.walk(tree):
+        found = _result_value(node)
+        if found is None:
+            continue
+        result_type, value = found
+        start = _position(lines, offsets, node.lineno, node.col_offset)
+        end = _position(lines, offsets, node.end_lineno, node.end_col_offset)
+        if result_type == 'plot':
+            plots = True
+            replacement = "pass" if shown else "plt.show()"
+        else:
+            replacement = f"print({ast.get_source_segment(source, value)})"
+        if node is last_top_level:
+            replacement = "" if replacement == "pass" else f"\n# Print result\n{replacement}"
+        edits.append((start, end, replacement))
+
+    if not edits:
+        return code
+
+    cleaned = source
+    for start, end, replacement in sorted(edits, reverse=True):
+        cleaned = cleaned[:start] + replacement + cleaned[end:]
+    cleaned = cleaned.rstrip()
+
+    if preference == 'standard_pandas':
+        cleaned += "\n\n" + STANDARD_PANDAS_NOTE
+    else:
+        cleaned += "\n\n" + DEFAULT_NOTE
+
+    used = _used_names(tree) | ({'plt'} if plots else set())
+    bound = _bound_names(tree)
+    missing = [statement for alias, statement in KNOWN_IMPORTS if alias in used and alias not in bound]
+    if missing:
+        cleaned = _insert_imports(cleaned, tree, missing)
+
+    return cleaned.strip()
+
+
+def _insert_imports(cleaned, tree, statements):
+    """Put import statements after the code's leading docstring and imports"""
+    insert_after = 0
+    for position, node in enumerate(tree.body):
+        is_docstring = position == 0 and isinstance(node, ast.Expr) \
+            and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+        if not (is_docstring or isinstance(node, (ast.Import, ast.ImportFrom))):
+            break
+        insert_after = node.end_lineno
+    lines = cleaned.split('\n')
+    # A blank line separates imports from code when nothing was imported before
+    block = statements + ([''] if insert_after == 0 else [])
+    return '\n'.join(lines[:insert_after] + block + lines[insert_after:])
+
+
+# ---- original line-based cleaning ----------------------------------------
+
+def clean_by_lines(code, preference='default'):
+    """
+    Clean PandasAI generated code by removing result formatting parts.
+    Line-based fallback for code that does not parse.
+    """
+    if not code:
+        return code
+
+    # Standard code cleaning
+    if "result = {" in code:
+        lines = code.split("\n")
+        result_line_index = -1
+
+        # Find the line with result dictionary
+        for i, line in enumerate(lines):
+            if "result = {" in line:
+                result_line_index = i
+                break
+
+        if result_line_index >= 0:
+            # Keep code before result line
+            cleaned_code = "\n".join(lines[:result_line_index])
+
+            # If the last line is data processing logic, add print statement
+            last_line = cleaned_code.strip().split("\n")[-1]
+
+            # Check if the last line contains a variable assignment we can print
+            if "=" in last_line and not last_line.strip().startswith("#") and not any(keyword in last_line for keyword in ["if", "for", "while", "def", "class"]):
+                var_name = last_line.split("=")[0].strip()
+                if var_name and not var_name.startswith("#"):
+                    cleaned_code += f"\n\n# Print result\nprint({var_name})"
+
+            # Add appropriate note based on preference
+            if preference == 'standard_pandas':
+                cleaned_code += "\n\n" + STANDARD_PANDAS_NOTE
+            else:
+                cleaned_code += "\n\n" + DEFAULT_NOTE
+
+            # Ensure standard pandas imports
+            if preference == 'standard_pandas' and 'import pandas' not in cleaned_code:
+                cleaned_code = "import pandas as pd\n\n" + cleaned_code
+
+            # Check for matplotlib code and ensure imports
+            if 'plt.' in cleaned_code and 'import matplotlib' not in cleaned_code:
+                cleaned_code = "import matplotlib.pyplot as plt\n" + cleaned_code
+
+            return cleaned_code.strip()
+
+    # If no result dictionary found, return original code
+    return code
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+"""
+Column-projected reads of Parquet, Feather and Arrow IPC files.
+
+These formats store each column separately and keep the schema in the file
+metadata, so the runner does not have to load a whole file before the LLM has
+written its code: the prompt is built from the metadata plus a few rows, and
+afterwards only the columns the generated code refers to are read. Feather and
+Arrow files are memory-mapped, so the pages of unread columns are never
+touched; Parquet decodes the selected column chunks only.
+
+referenced_columns finds those columns by walking the code's AST. It is
+conservative: as soon as the frame flows into something that may look at every
+column (a whole-frame aggregate, printing or returning it, passing it to a
+function, positional access) it gives up and all columns are read. A column it
+still misses is loaded lazily: the runner reads the remaining columns and runs
+the code again when it fails on the projected frame.
+"""
+
+import ast
+import re
+
+COLUMNAR_EXTS = ('parquet', 'feather', 'arrow')
+
+# Methods whose result still has every column of the frame they are called on
+ROW_METHODS = {
+    'query', 'sort_values', 'sort_index', 'dropna', 'drop_duplicates', 'head', 'tail',
+    'nlargest', 'nsmallest', 'copy', 'reset_index', 'set_index', 'sample', 'fillna',
+    'rename', 'assign', 'astype',
+}
+# Attributes that do not depend on which columns are present
+NEUTRAL_ATTRIBUTES = {'index', 'empty'}
+# Methods whose string arguments are expressions over column names
+EXPRESSION_METHODS = {'query', 'eval'}
+
+
+def _pyarrow():
+    import pyarrow
+    import pyarrow.ipc  # noqa: F401
+    return pyarrow
+
+
+def _open_ipc(file_path):
+    """Memory-mapped reader for an Arrow IPC file (or stream)"""
+    pa = _pyarrow()
+    try:
+        return pa.ipc.open_file(pa.memory_map(file_path, 'r'))
+    except pa.ArrowInvalid:
+        return pa.ipc.open_stream(pa.memory_map(file_path, 'r'))
+
+
+def read_schema(file_path, file_ext):
+    """The file's pyarrow schema, read from its metadata only"""
+    if file_ext == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(file_path, memory_map=True)
+    return _open_ipc(file_path).schema
+
+
+def read_sample(file_path, file_ext, nrows):
+    """The first nrows rows of every column as a DataFrame"""
+    pa = _pyarrow()
+    if file_ext == 'parquet':
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(file_path, memory_map=True).iter_batches(batch_size=nrows)
+        first = next(batches, None)
+        table = pa.Table.from_batches([first]) if first is not None else read_schema(file_path, file_ext).empty_table()
+        return table.to_pandas()
+
+    reader = _open_ipc(file_path)
+    batches, rows = [], 0
+    if isinstance(reader, pa.ipc.RecordBatchFileReader):
+        source = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    else:
+        source = reader
+    for batch in source:
+        if rows >= nrows:
+            break
+        batches.append(batch.slice(0, nrows - rows))
+        rows += len(batches[-1])
+    return pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+
+
+def read_columns(file_path, file_ext, columns=None):
+    """DataFrame of the given columns (all when None), memory-mapped where the format allows"""
+    if file_ext == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(file_path, columns=columns, memory_map=True, use_pandas_metadata=True).to_pandas()
+    if file_ext == 'feather':
+        import pyarrow.feather as feather
+        return feather.read_table(file_path, columns=columns, memory_map=True).to_pandas()
+    table = _open_ipc(file_path).read_all()
+    return (table.select(columns) if columns is not None else table).to_pandas()
+
+
+def read_arrow(file_path):
+    """Whole Arrow IPC (.arrow) file as a DataFrame"""
+    return read_columns(file_path, 'arrow')
+
+
+class _AllColumns(Exception):
+    """The code may use columns it does not name"""
+
+
+def _is_column_selector(node):
+    """df['a'] or df[['a', 'b']]"""
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, str)
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return bool(node.elts) and all(isinstance(e, ast.Constant) and isinstance(e.value, str) for e in node.elts)
+    return False
+
+
+def _is_row_filter(node):
+    """df[mask] or df[1:5]: keeps every column"""
+    return isinstance(node, (ast.Compare, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Call, ast.Subscript, ast.Slice))
+
+
+class _FrameUses:
+    """Follows frame-valued expressions of a module up its AST"""
+
+    def __init__(self, tree, columns):
+        self.columns = columns
+        self.parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+
+    def follow(self, node):
+        """Names the frame at node gets assigned to; raises _AllColumns if it escapes"""
+        parent = self.parents.get(node)
+        if isinstance(parent, ast.Subscript) and parent.value is node:
+            if _is_column_selector(parent.slice):
+                return []
+            if _is_row_filter(parent.slice):
+                return self.follow(parent)
+        elif isinstance(parent, ast.Attribute) and parent.value is node:
+            return self._attribute(parent)
+        elif isinstance(parent, ast.Assign) and parent.value is node and all(isinstance(t, ast.Name) for t in parent.targets):
+            return [t.id for t in parent.targets]
+        elif isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) and parent.func.id == 'len':
+            return []
+        raise _AllColumns()
+
+    def _attribute(self, attribute):
+        if attribute.attr in self.columns or attribute.attr in NEUTRAL_ATTRIBUTES:
+            return []
+        parent = self.parents.get(attribute)
+        if attribute.attr == 'shape' and isinstance(parent, ast.Subscript) \
+                and isinstance(parent.slice, ast.Constant) and parent.slice.value == 0:
+            return []
+        if attribute.attr == 'loc' and isinstance(parent, ast.Subscript):
+            if isinstance(parent.slice, ast.Tuple) and len(parent.slice.elts) == 2 and _is_column_selector(parent.slice.elts[1]):
+                return []
+            if not isinstance(parent.slice, ast.Tuple):
+                return self.follow(parent)
+        called = isinstance(parent, ast.Call) and parent.func is attribute
+        if called and attribute.attr in ROW_METHODS:
+            return self.follow(parent)
+        if called and attribute.attr == 'groupby':
+            return self._grouped(parent)
+        raise _AllColumns()
+
+    def _grouped(self, call):
+        """A groupby only reads the grouping keys and the columns selected from it"""
+        parent = self.parents.get(call)
+        if isinstance(parent, ast.Subscript) and parent.value is call and _is_column_selector(parent.slice):
+            return []
+        if isinstance(parent, ast.Attribute) and parent.value is call:
+            if parent.attr in self.columns or parent.attr == 'size':
+                return []
+            caller = self.parents.get(parent)
+            if parent.attr in ('agg', 'aggregate') and isinstance(caller, ast.Call) and caller.func is parent \
+                    and len(caller.args) == 1 and isinstance(caller.args[0], ast.Dict):
+                return []
+        raise _AllColumns()
+
+
+def referenced_columns(code, columns):
+    """
+    The columns (in file order) the code reads from dfs[0], or None when it may
+    read columns it does not name and everything has to be loaded.
+    """
+    columns = [c for c in columns if isinstance(c, str)]
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    uses = _FrameUses(tree, set(columns))
+
+    try:
+        # Frame variables: dfs[i] and everything a frame expression is assigned to
+        frames, pending = set(), set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and node.id == 'dfs' and isinstance(node.ctx, ast.Load):
+                parent = uses.parents.get(node)
+                if not (isinstance(parent, ast.Subscript) and isinstance(parent.slice, ast.Constant)
+                        and isinstance(parent.slice.value, int)):
+                    raise _AllColumns()
+                pending.update(uses.follow(parent))
+        while pending:
+            name = pending.pop()
+            frames.add(name)
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Name) and node.id == name and isinstance(node.ctx, ast.Load):
+                    pending.update(n for n in uses.follow(node) if n not in frames)
+    except _AllColumns:
+        return None
+
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and node.value in uses.columns:
+            used.add(node.value)
+        elif isinstance(node, ast.Attribute) and node.attr in uses.columns:
+            used.add(node.attr)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in EXPRESSION_METHODS:
+            text = " ".join(a.value for a in node.args if isinstance(a, ast.Constant) and isinstance(a.value, str))
+            used.update(c for c in columns if re.search(rf"(?<![\w`]){re.escape(c)}(?![\w`])|`{re.escape(c)}`", text))
+    # At least one column, so the frame keeps its row count
+    return [c for c in columns if c in used] or columns[:1]
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+测试公共夹具：每个测试使用各自临时目录下的进程级缓存，不读写仓库中的 cache/、charts/ 等目录
+子进程 (命令行调用、服务模式的worker) 通过环境变量和工作目录得到同样的隔离
+"""
+
+import pytest
+
+import dataset_cache
+import dataset_profile
+import dataset_registry
+import pandasai_runner
+import result_cache
+import sessions
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """把图表目录、数据集缓存、结果缓存、数据集画像、数据集注册表和会话存储都指向 tmp_path"""
+    monkeypatch.setenv("DATASET_CACHE_DIR", str(tmp_path / "cache" / "datasets"))
+    monkeypatch.setenv("RESULT_CACHE_PATH", str(tmp_path / "cache" / "results.sqlite3"))
+    monkeypatch.setenv("DATASET_PROFILE_DIR", str(tmp_path / "cache" / "profiles"))
+    monkeypatch.setenv("DATASET_REGISTRY_DIR", str(tmp_path / "registry"))
+    # worker进程的图表目录和日志目录取自工作目录
+    monkeypatch.chdir(tmp_path)
+
+    monkeypatch.setattr(pandasai_runner, "CHARTS_DIR", str(tmp_path / "charts"))
+    monkeypatch.setattr(dataset_cache, "_default_cache",
+                        dataset_cache.DatasetCache(cache_dir=str(tmp_path / "cache" / "datasets")))
+    monkeypatch.setattr(result_cache, "_default_cache",
+                        result_cache.ResultCache(path=str(tmp_path / "cache" / "results.sqlite3")))
+    monkeypatch.setattr(dataset_profile, "_default_cache",
+                        dataset_profile.ProfileCache(profile_dir=str(tmp_path / "cache" / "profiles")))
+    monkeypatch.setattr(dataset_registry, "_default_registry",
+                        dataset_registry.DatasetRegistry(str(tmp_path / "registry")))
+    monkeypatch.setattr(sessions, "_default_store", sessions.SessionStore(snapshot_dir=str(tmp_path / "sessions")))
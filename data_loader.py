@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+"""
+Loading helpers for the runner.
+
+Schema-first, chunked loading for CSV and JSON Lines files: the LLM only needs
+column names, dtypes and a few rows to write code, so the runner can build its
+prompt from a bounded sample while the full frame is streamed in chunks in the
+background. With OPTIMIZE_CATEGORIES=1, string columns that look categorical
+in the sample are read as categoricals chunk by chunk, which keeps the frame
+(and the peak while concatenating) much smaller than object columns.
+
+optimize_dtypes shrinks a loaded frame: datetimes for date-like strings and,
+where enabled, categoricals for low-cardinality strings, smaller integer
+types, float32 (where values fit exactly) and pyarrow-backed strings. Only
+the date conversion is on by default: the others change what generated code
+computes (integer overflow, observed=False groupbys, string arithmetic on
+categoricals), so they are opt-in.
+
+stratified_sample and dtype_mock build the small frames generated code is
+validated on when the runner does not execute it on the full data.
+
+Parquet, Feather and Arrow files get a columnar counterpart of schema-first
+loading (see columnar.py): metadata and a few rows first, then only the
+columns the generated code reads.
+
+list_tables expands the files of a request into tables (one per file, one
+per sheet of a multi-sheet workbook) with stable, unique names; the runner
+loads them concurrently.
+"""
+
+import os
+import re
+import json
+import zipfile
+import threading
+from xml.etree import ElementTree
+
+import numpy as np
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import columnar
+
+SCHEMA_SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", "1000"))
+LOAD_CHUNK_ROWS = int(os.getenv("LOAD_CHUNK_ROWS", "100000"))
+# --load-mode auto switches to schema-first loading above this file size
+SCHEMA_FIRST_MIN_MB = float(os.getenv("SCHEMA_FIRST_MIN_MB", "20"))
+
+# A sampled string column is read as a categorical when it has at most this
+# share of distinct values
+CATEGORY_MAX_RATIO = 0.5
+# Categoricals group with observed=False in pandas 1.x (a filtered groupby reports
+# empty groups as zeros) and reject string concatenation, so they are opt-in
+CATEGORIZE_STRINGS = os.getenv("OPTIMIZE_CATEGORIES", "0") == "1"
+
+# Smaller integers overflow silently in generated arithmetic (3_000_000 * 1000
+# wraps around in int32), so integer downcasting is opt-in. Even then integers
+# are not downcast below this type, which only makes such overflows rarer
+DOWNCAST_INTS = os.getenv("OPTIMIZE_INTS", "0") == "1"
+MIN_INT_DTYPE = os.getenv("OPTIMIZE_MIN_INT_DTYPE", "int32")
+# float32 columns make sums and means less precise even when every value fits,
+# so float downcasting is opt-in
+DOWNCAST_FLOATS = os.getenv("OPTIMIZE_FLOAT32", "0") == "1"
+DATE_PATTERN = re.compile(r"^\s*(\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{4})([ T]\d{1,2}:\d{2}(:\d{2})?)?\s*$")
+DATE_SAMPLE_SIZE = 200
+
+# --execution sample runs generated code on at most this many rows
+VALIDATION_SAMPLE_ROWS = int(os.getenv("VALIDATION_SAMPLE_ROWS", "1000"))
+MOCK_ROWS = 5
+
+# Tables (files or workbook sheets) of one request read at once
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "4"))
+EXCEL_EXTS = ('xlsx', 'xls')
+# The Node backend stores uploads as <timestamp>-<random>-<original name>
+UPLOAD_PREFIX = re.compile(r"^\d+-\d+-")
+XLSX_NAMESPACE = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+JSON_LINES_EXTS = ('jsonl', 'ndjson')
+LOAD_MODES = ('full', 'schema', 'auto')
+EXECUTION_MODES = ('full', 'sample', 'mock')
+
+
+def is_json_lines(file_path):
+    """True if the first line of a .json file is a complete JSON object on its own"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        first = f.readline().strip()
+        second = f.readline().strip()
+    if not first.startswith('{') or not second:
+        return False
+    try:
+        json.loads(first)
+        return True
+    except ValueError:
+        return False
+
+
+def stream_format(file_path, file_ext):
+    """'csv' or 'jsonl' if the file can be read in chunks, otherwise None"""
+    if file_ext == 'csv':
+        return 'csv'
+    if file_ext in JSON_LINES_EXTS or (file_ext == 'json' and is_json_lines(file_path)):
+        return 'jsonl'
+    return None
+
+
+def resolve_load_mode(load_mode, file_path, file_ext):
+    """Pick 'schema', 'columnar' or 'full' for this file"""
+    if load_mode in ('schema', 'auto') and file_ext in columnar.COLUMNAR_EXTS:
+        # Reading the metadata of a columnar file is cheap whatever its size
+        return 'columnar'
+    if load_mode not in ('schema', 'auto') or stream_format(file_path, file_ext) is None:
+        return 'full'
+    if load_mode == 'auto' and os.path.getsize(file_path) < SCHEMA_FIRST_MIN_MB * 1024 * 1024:
+        return 'full'
+    return 'schema'
+
+
+def read_sample(file_path, file_ext, nrows=SCHEMA_SAMPLE_ROWS):
+    """Header plus the first nrows rows, with dtypes inferred from them"""
+    if stream_format(file_path, file_ext) == 'jsonl':
+        return pd.read_json(file_path, lines=True, nrows=nrows)
+    return pd.read_csv(file_path, nrows=nrows)
+
+
+def category_columns(sample, max_ratio=CATEGORY_MAX_RATIO):
+    """String columns of the sample with few distinct values"""
+    columns = []
+    for column in sample.select_dtypes(include=['object']).columns:
+        values = sample[column].dropna()
+        if len(values) and values.nunique() <= max_ratio * len(values):
+            columns.append(column)
+    return columns
+
+
+def iter_chunks(file_path, file_ext, categories=(), chunksize=LOAD_CHUNK_ROWS):
+    """Yield the file as DataFrames of at most chunksize rows"""
+    if stream_format(file_path, file_ext) == 'jsonl':
+        with pd.read_json(file_path, lines=True, chunksize=chunksize) as reader:
+            for chunk in reader:
+                for column in categories:
+                    if column in chunk:
+                        chunk[column] = chunk[column].astype('category')
+                yield chunk
+    else:
+        dtype = {column: 'category' for column in categories}
+        with pd.read_csv(file_path, chunksize=chunksize, dtype=dtype) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+def concat_chunks(chunks, categories=()):
+    """Concatenate chunks, aligning per-chunk categories so columns stay categorical"""
+    if not chunks:
+        return pd.DataFrame()
+    for column in categories:
+        if not all(column in c and isinstance(c[column].dtype, pd.CategoricalDtype) for c in chunks):
+            continue
+        merged = union_categoricals([c[column] for c in chunks], ignore_order=True).categories
+        for chunk in chunks:
+            chunk[column] = chunk[column].cat.set_categories(merged)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_chunked(file_path, file_ext, sample=None, chunksize=LOAD_CHUNK_ROWS, categorize=None):
+    """Full frame built from typed chunks; dtypes are planned from sample"""
+    if sample is None:
+        sample = read_sample(file_path, file_ext)
+    categorize = CATEGORIZE_STRINGS if categorize is None else categorize
+    categories = category_columns(sample) if categorize else []
+    chunks = list(iter_chunks(file_path, file_ext, categories, chunksize))
+    return concat_chunks(chunks, categories)
+
+
+class BackgroundLoad:
+    """Run a loader in a thread so parsing overlaps the LLM call"""
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._value = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._value = self._loader()
+        except Exception as e:
+            self._error = e
+
+    def result(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def frame_memory(df):
+    """Deep memory usage of a DataFrame in bytes"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _looks_like_dates(values):
+    sample = values.head(DATE_SAMPLE_SIZE)
+    return len(sample) > 0 and all(isinstance(v, str) and DATE_PATTERN.match(v) for v in sample)
+
+
+def _downcast_int(series):
+    downcast = pd.to_numeric(series, downcast='integer')
+    if np.dtype(downcast.dtype).itemsize < np.dtype(MIN_INT_DTYPE).itemsize:
+        return series.astype(MIN_INT_DTYPE)
+    return downcast
+
+
+def _downcast_float(series):
+    # Only when every value survives the round trip through float32
+    smaller = series.astype('float32')
+    if np.array_equal(smaller.astype('float64').to_numpy(), series.to_numpy(), equal_nan=True):
+        return smaller
+    return series
+
+
+def optimize_dtypes(df, arrow_strings=False, categorize=None, downcast_ints=None):
+    """
+    Shrink df's memory footprint. Returns (df, report) where report has the
+    before/after sizes and the dtype change of every converted column.
+    categorize and downcast_ints default to OPTIMIZE_CATEGORIES and OPTIMIZE_INTS.
+    """
+    categorize = CATEGORIZE_STRINGS if categorize is None else categorize
+    downcast_ints = DOWNCAST_INTS if downcast_ints is None else downcast_ints
+    before = frame_memory(df)
+    changes = {}
+    optimized = {}
+    categories = set(category_columns(df)) if categorize else set()
+
+    # Positional access keeps duplicate column names working
+    for position, column in enumerate(df.columns):
+        series = df.iloc[:, position]
+        new = series
+        if series.dtype == object:
+            values = series.dropna()
+            if _looks_like_dates(values):
+                parsed = pd.to_datetime(series, errors='coerce')
+                # Keep the strings if anything beyond the original nulls failed to parse
+                if parsed.isna().sum() == series.isna().sum():
+                    new = parsed
+            if new is series and column in categories:
+                new = series.astype('category')
+            elif new is series and arrow_strings and all(isinstance(v, str) for v in values):
+                new = series.astype('string[pyarrow]')
+        elif series.dtype.kind in 'iu' and downcast_ints:
+            new = _downcast_int(series)
+        elif series.dtype.kind == 'f' and DOWNCAST_FLOATS:
+            new = _downcast_float(series)
+
+        if new.dtype != series.dtype:
+            optimized[position] = new
+            changes[str(column)] = f"{series.dtype}->{new.dtype}"
+
+    after = before
+    if optimized:
+        df = df.copy(deep=False)
+        for position, values in optimized.items():
+            df.isetitem(position, values)
+        after = frame_memory(df)
+
+    return df, {
+        'before_bytes': before,
+        'after_bytes': after,
+        'saved_pct': round(100.0 * (before - after) / before, 1) if before else 0.0,
+        'columns': changes,
+    }
+
+
+def _strata_column(df, nrows):
+    """Lowest-cardinality categorical column with few enough groups to all fit in the sample"""
+    if not df.columns.is_unique:
+        return None
+    candidates = list(df.select_dtypes(include=['category']).columns) + category_columns(df)
+    best, best_groups = None, None
+    for column in candidates:
+        groups = df[column].nunique(dropna=False)
+        if 1 < groups <= nrows // 10 and (best_groups is None or groups < best_groups):
+            best, best_groups = column, groups
+    return best
+
+
+def stratified_sample(df, nrows=VALIDATION_SAMPLE_ROWS, random_state=0):
+    """
+    At most nrows rows of df in their original order. Rows are drawn
+    proportionally from each value of a low-cardinality column, and every value
+    keeps at least one row, so filters and groupbys see all groups.
+    """
+    if len(df) <= nrows:
+        return df
+    column = _strata_column(df, nrows)
+    if column is None:
+        return df.sample(n=nrows, random_state=random_state).sort_index()
+    # Group by factorized codes on a RangeIndex so duplicate index labels are harmless
+    codes = pd.Series(pd.factorize(df[column])[0])
+    firsts = codes.drop_duplicates().index.to_numpy()
+    # Leave room for one guaranteed row per group
+    fraction = (nrows - len(firsts)) / len(df)
+    picked = codes.groupby(codes).sample(frac=fraction, random_state=random_state).index.to_numpy()
+    positions = np.union1d(picked, firsts)
+    return df.iloc[positions]
+
+
+def _mock_values(name, dtype, nrows):
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = list(dtype.categories[:nrows])
+        values = [categories[i % len(categories)] for i in range(nrows)] if categories else [None] * nrows
+        return pd.Categorical(values, dtype=dtype)
+    if dtype.kind == 'b':
+        return pd.Series([i % 2 == 0 for i in range(nrows)], dtype=dtype)
+    if dtype.kind in 'iu':
+        return pd.Series(np.arange(1, nrows + 1), dtype=dtype)
+    if dtype.kind == 'f':
+        return pd.Series(np.arange(1, nrows + 1) * 1.5, dtype=dtype)
+    if dtype.kind == 'M':
+        return pd.Series(pd.date_range('2024-01-01', periods=nrows, freq='D', tz=getattr(dtype, 'tz', None)))
+    if dtype.kind == 'm':
+        return pd.Series(pd.to_timedelta(np.arange(nrows), unit='D'))
+    values = [f"{name}_{i}" for i in range(nrows)]
+    try:
+        return pd.Series(values, dtype=dtype)
+    except (TypeError, ValueError):
+        return pd.Series(values, dtype=object)
+
+
+def dtype_mock(df, nrows=MOCK_ROWS):
+    """Synthetic frame with df's column names and dtypes but none of its values"""
+    columns = [_mock_values(column, dtype, nrows) for column, dtype in zip(df.columns, df.dtypes)]
+    mock = pd.concat([pd.Series(values).reset_index(drop=True) for values in columns], axis=1) if columns \
+        else pd.DataFrame(index=range(nrows))
+    mock.columns = df.columns
+    return mock
+
+
+def file_extension(file_path):
+    return os.path.splitext(file_path)[1][1:].lower()
+
+
+def excel_sheets(file_path):
+    """Sheet names of a workbook in workbook order (xlsx: read from the workbook part only)"""
+    if file_extension(file_path) == 'xlsx':
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                root = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+            return [sheet.get('name') for sheet in root.iterfind('m:sheets/m:sheet', XLSX_NAMESPACE)]
+        except (KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+            pass  # unusual packaging: let pandas work it out
+    with pd.ExcelFile(file_path) as workbook:
+        return list(workbook.sheet_names)
+
+
+def table_name(file_path, sheet=None):
+    """Identifier-like name from the file name (without upload prefix) and sheet"""
+    stem = UPLOAD_PREFIX.sub('', os.path.splitext(os.path.basename(file_path))[0])
+    name = f"{stem}_{sheet}" if sheet is not None else stem
+    return re.sub(r"\W+", "_", name).strip("_") or "table"
+
+
+def list_tables(file_paths):
+    """
+    (name, file_path, sheet) for every table in file_paths, in order: one per file and
+    one per sheet of a workbook with several sheets (sheet is None otherwise).
+    Names are unique; repeats get a _2, _3, ... suffix.
+    """
+    tables = []
+    for file_path in file_paths:
+        sheets = excel_sheets(file_path) if file_extension(file_path) in EXCEL_EXTS else []
+        for sheet in (sheets if len(sheets) > 1 else [None]):
+            tables.append((table_name(file_path, sheet), file_path, sheet))
+
+    seen = {}
+    unique = []
+    for name, file_path, sheet in tables:
+        seen[name] = seen.get(name, 0) + 1
+        unique.append((name if seen[name] == 1 else f"{name}_{seen[name]}", file_path, sheet))
+    return unique
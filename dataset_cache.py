@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""
+Content-addressed cache of parsed DataFrames.
+
+An uploaded file is identified by the SHA-256 of its bytes. The first parse is
+stored as Feather under the cache directory; later loads of the same bytes
+read the Feather file instead of parsing CSV/Excel again. Inside a long-lived
+process (pandasai_runner.py --serve) an in-memory LRU layer bounded by a byte
+budget sits in front of the disk layer.
+
+Hit/miss/eviction counters are kept in stats.json next to the cached files so
+they add up across runner processes.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: stats updates are best effort
+    fcntl = None
+
+CACHE_DIR = os.getenv("DATASET_CACHE_DIR", os.path.join(os.getcwd(), 'cache', 'datasets'))
+MEMORY_BUDGET_MB = int(os.getenv("DATASET_CACHE_MEMORY_MB", "256"))
+DISK_BUDGET_MB = int(os.getenv("DATASET_CACHE_DISK_MB", "2048"))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+STAT_KEYS = ('memory_hits', 'disk_hits', 'misses', 'memory_evictions', 'disk_evictions', 'disk_write_skipped')
+
+
+def debug_print(*args, **kwargs):
+    """Print debug messages to stderr instead of stdout"""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def file_digest(file_path):
+    """SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def frame_nbytes(df):
+    """Approximate in-memory size of a DataFrame in bytes"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class DatasetCache:
+    """Two-level (memory LRU + Feather on disk) cache of parsed DataFrames"""
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_budget_mb=MEMORY_BUDGET_MB, disk_budget_mb=DISK_BUDGET_MB):
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.disk_budget = disk_budget_mb * 1024 * 1024
+        self._memory = OrderedDict()  # key -> (DataFrame, nbytes)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(digest, file_ext, variant=None):
+        # The extension and loader variant pick the reader, so the same bytes read
+        # differently get their own entry. The key names the Feather file, and variants
+        # such as "sheet:<name>" hold characters that are not valid in file names everywhere
+        key = f"{digest}-{file_ext or 'csv'}"
+        if not variant:
+            return key
+        return f"{key}-{hashlib.sha256(variant.encode('utf-8')).hexdigest()[:16]}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.feather")
+
+    # ---- public API -------------------------------------------------------
+
+    def load(self, file_path, file_ext, reader_func, digest=None, variant=None):
+        """
+        Return (df, status, digest) for file_path.
+        status is 'memory', 'disk' or 'miss'; on a miss reader_func parses the file
+        and the result is stored in both layers. variant separates entries produced
+        by a different loader for the same bytes (e.g. chunked loading).
+        """
+        digest = digest or file_digest(file_path)
+        key = self.make_key(digest, file_ext, variant)
+
+        df = self._memory_get(key)
+        if df is not None:
+            self._bump('memory_hits')
+            return df.copy(), 'memory', digest
+
+        path = self._path(key)
+        if os.path.exists(path):
+            try:
+                df = pd.read_feather(path)
+                os.utime(path)  # recency for disk eviction
+                self._memory_put(key, df)
+                self._bump('disk_hits')
+                return df.copy(), 'disk', digest
+            except Exception as e:
+                debug_print(f"Dataset cache: unreadable entry {path}: {str(e)}")
+
+        self._bump('misses')
+        df = reader_func(file_path)
+        self._disk_put(key, df)
+        self._memory_put(key, df)
+        # Callers (and the code PandasAI runs) may modify the frame in place
+        return df.copy(), 'miss', digest
+
+    def has(self, digest, file_ext, variant=None):
+        """Whether load() of these bytes would be a hit (in memory or on disk)"""
+        key = self.make_key(digest, file_ext, variant)
+        with self._lock:
+            if key in self._memory:
+                return True
+        return os.path.exists(self._path(key))
+
+    def info(self):
+        """Counters plus current occupancy of both layers"""
+        entries = self._disk_entries()
+        stats = self._read_stats()
+        stats.update({
+            'cache_dir': self.cache_dir,
+            'disk_entries': len(entries),
+            'disk_bytes': sum(size for _, size, _ in entries),
+            'disk_budget_bytes': self.disk_budget,
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_bytes,
+            'memory_budget_bytes': self.memory_budget,
+        })
+        return stats
+
+    def purge(self):
+        """Delete every cached dataset and reset the counters; returns number of files removed"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        removed = 0
+        for path, _, _ in self._disk_entries():
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        stats_path = os.path.join(self.cache_dir, 'stats.json')
+        if os.path.exists(stats_path):
+            os.remove(stats_path)
+        return removed
+
+    # ---- memory layer -----------------------------------------------------
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            self._memory.move_to_end(key)
+            return entry[0]
+
+    def _memory_put(self, key, df):
+        nbytes = frame_nbytes(df)
+        if nbytes > self.memory_budget:
+            return
+        evicted = 0
+        with self._lock:
+            if key in self._memory:
+                self._memory_bytes -= self._memory.pop(key)[1]
+            self._memory[key] = (df, nbytes)
+            self._memory_bytes += nbytes
+            while self._memory_bytes > self.memory_budget:
+                _, (_, size) = self._memory.popitem(last=False)
+                self._memory_bytes -= size
+                evicted += 1
+        if evicted:
+            self._bump('memory_evictions', evicted)
+
+    # ---- disk layer -------------------------------------------------------
+
+    def _disk_put(self, key, df):
+        # Feather needs a default index and string column names
+        if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1 \
+                or not all(isinstance(c, str) for c in df.columns):
+            debug_print("Dataset cache: frame has a custom index or non-string columns, not stored on disk")
+            self._bump('disk_write_skipped')
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            df.to_feather(tmp_path)
+            os.replace(tmp_path, path)  # readers never see a partial file
+        except Exception as e:
+            debug_print(f"Dataset cache: could not store {key}: {str(e)}")
+            self._bump('disk_write_skipped')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._enforce_disk_budget()
+
+    def _disk_entries(self):
+        """List of (path, size, last_used) for cached Feather files"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.feather'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def _enforce_disk_budget(self):
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= self.disk_budget:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                evicted += 1
+            except OSError:
+                pass
+        if evicted:
+            self._bump('disk_evictions', evicted)
+
+    # ---- counters ---------------------------------------------------------
+
+    def _read_stats(self):
+        stats = dict.fromkeys(STAT_KEYS, 0)
+        try:
+            with open(os.path.join(self.cache_dir, 'stats.json')) as f:
+                stats.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        return stats
+
+    def _bump(self, counter, amount=1):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(os.path.join(self.cache_dir, 'stats.lock'), 'w') as lock:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                stats = self._read_stats()
+                stats[counter] = stats.get(counter, 0) + amount
+                stats['updated'] = time.time()
+                stats_path = os.path.join(self.cache_dir, 'stats.json')
+                with open(f"{stats_path}.tmp", 'w') as f:
+                    json.dump(stats, f)
+                os.replace(f"{stats_path}.tmp", stats_path)
+        except OSError as e:
+            debug_print(f"Dataset cache: could not update stats: {str(e)}")
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Process-wide DatasetCache, so --serve workers keep their memory layer between requests"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = DatasetCache()
+    return _default_cache
@@ -0,0 +1,430 @@
+#!/usr/bin/env python
+"""
+Precomputed dataset profiles: per-column statistics cached by dataset hash.
+
+A profile records for every column its dtype, non-null and null counts,
+cardinality, min/max/mean and quartiles (numeric and datetime columns) and
+the most frequent values (text, categorical and boolean columns). The runner
+returns it with the result and, by default, shows it to the LLM as the
+dataframe description in place of sample rows (see describe()).
+
+Statistics are kept in a mergeable state and folded over chunks of
+PROFILE_CHUNK_ROWS rows with vectorized pandas/numpy operations:
+- counts, sums and min/max merge exactly;
+- value counts are exact up to MAX_TRACKED_VALUES distinct values per column
+  (past that, text columns keep the most frequent ones and numeric columns
+  drop them);
+- cardinality beyond that is estimated from the K smallest value hashes (KMV);
+- quartiles come from a row sample chosen by a hash of the row position, so
+  the sample of a table is the same however it was chunked.
+Because of this, a CSV or JSON Lines upload that only appends rows to a file
+profiled before (its first bytes hash to the earlier digest) is profiled by
+folding just the new rows into the stored state.
+
+Profiles are stored as JSON in PROFILE_DIR (DATASET_PROFILE_DIR); the oldest
+files are removed past PROFILE_MAX_FILES.
+"""
+
+import os
+import sys
+import json
+import glob
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+PROFILE_DIR = os.getenv("DATASET_PROFILE_DIR", os.path.join(os.getcwd(), 'cache', 'profiles'))
+PROFILE_CHUNK_ROWS = int(os.getenv("PROFILE_CHUNK_ROWS", "200000"))
+PROFILE_MAX_FILES = int(os.getenv("DATASET_PROFILE_MAX_FILES", "2000"))
+
+MAX_TRACKED_VALUES = 1000
+HASH_SKETCH_SIZE = 256
+QUANTILE_SAMPLE_SIZE = 2048
+TOP_VALUES = 5
+# Profiles kept in memory by a long-running process
+MEMORY_ENTRIES = 64
+# Files an upload may have been extended from, by appending lines
+APPENDABLE_EXTS = ('csv', 'tsv', 'txt', 'jsonl', 'ndjson')
+# Fibonacci hashing of row positions (wraps modulo 2**64)
+POSITION_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+MAX_VALUE_CHARS = 20
+# Sample rows the prompt still shows next to the profile (value formats)
+HEAD_ROWS = 1
+VERSION = 1
+
+
+def debug_print(*args, **kwargs):
+    """Print debug messages to stderr instead of stdout"""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def column_kind(series):
+    """'numeric', 'datetime' or 'text' (strings, categories, booleans, mixed objects)"""
+    import pandas as pd
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return 'text'
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return 'numeric'
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return 'datetime'
+    return 'text'
+
+
+def _plain(value):
+    """JSON-friendly scalar"""
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    return value
+
+
+def _column_state(series, kind, offset):
+    """Mergeable statistics of one chunk of a column starting at row offset"""
+    import pandas as pd
+    mask = series.notna().to_numpy()
+    values = series[mask]
+    state = {'kind': kind, 'count': int(mask.sum()), 'nulls': int(len(series) - mask.sum())}
+
+    if kind == 'datetime':
+        numbers = pd.DatetimeIndex(values).asi8
+    elif kind == 'numeric':
+        # Nullable integer columns have no NA left here and convert to plain numpy
+        numbers = values.to_numpy(dtype=getattr(values.dtype, 'numpy_dtype', values.dtype))
+    else:
+        numbers = None
+
+    if numbers is not None and len(numbers):
+        state['min'] = _plain(numbers.min())
+        state['max'] = _plain(numbers.max())
+        state['sum'] = float(numbers.sum(dtype='float64'))
+        positions = (np.arange(offset, offset + len(series), dtype=np.uint64)[mask]) * POSITION_MULTIPLIER
+        sample = numbers
+        if len(positions) > QUANTILE_SAMPLE_SIZE:
+            keep = np.argpartition(positions, QUANTILE_SAMPLE_SIZE)[:QUANTILE_SAMPLE_SIZE]
+            positions, sample = positions[keep], numbers[keep]
+        state['sample_keys'] = positions.tolist()
+        state['sample_values'] = [_plain(v) for v in sample]
+
+    if kind == 'text':
+        text = values.astype(str)
+        counts = text.value_counts(sort=False)
+        state['values'] = {str(k): int(v) for k, v in counts.items()}
+        if len(counts) > MAX_TRACKED_VALUES:
+            state['values'] = dict(sorted(state['values'].items(), key=lambda kv: -kv[1])[:MAX_TRACKED_VALUES])
+            state['values_truncated'] = True
+        hashed = text.to_numpy(dtype=object)
+    elif kind == 'numeric':
+        # As floats, so that a column read as int in one version and float in the next still merges
+        hashed = numbers.astype('float64')
+        counts = pd.Series(hashed).value_counts(sort=False)
+        state['values'] = {str(k): int(v) for k, v in counts.items()} if len(counts) <= MAX_TRACKED_VALUES else None
+    else:
+        state['values'] = None
+        hashed = numbers
+    if hashed is not None and len(hashed):
+        state['hashes'] = np.unique(pd.util.hash_array(hashed))[:HASH_SKETCH_SIZE].tolist()
+    return state
+
+
+def _merge_column(a, b):
+    merged = {'kind': a['kind'], 'count': a['count'] + b['count'], 'nulls': a['nulls'] + b['nulls']}
+    if 'min' in a and 'min' in b:
+        merged['min'] = min(a['min'], b['min'])
+        merged['max'] = max(a['max'], b['max'])
+        merged['sum'] = a['sum'] + b['sum']
+        keys = np.array(a['sample_keys'] + b['sample_keys'], dtype=np.uint64)
+        values = a['sample_values'] + b['sample_values']
+        order = np.argsort(keys, kind='stable')[:QUANTILE_SAMPLE_SIZE]
+        merged['sample_keys'] = keys[order].tolist()
+        merged['sample_values'] = [values[i] for i in order]
+    else:
+        for field in ('min', 'max', 'sum', 'sample_keys', 'sample_values'):
+            if field in a or field in b:
+                merged[field] = a.get(field, b.get(field))
+
+    if a.get('values') is None or b.get('values') is None:
+        merged['values'] = None
+    else:
+        values = dict(a['values'])
+        for value, count in b['values'].items():
+            values[value] = values.get(value, 0) + count
+        truncated = a.get('values_truncated') or b.get('values_truncated')
+        if len(values) > MAX_TRACKED_VALUES:
+            if a['kind'] != 'text':
+                values = None
+            else:
+                values = dict(sorted(values.items(), key=lambda kv: -kv[1])[:MAX_TRACKED_VALUES])
+                truncated = True
+        merged['values'] = values
+        if truncated and values is not None:
+            merged['values_truncated'] = True
+
+    hashes = np.union1d(np.array(a.get('hashes', []), dtype=np.uint64), np.array(b.get('hashes', []), dtype=np.uint64))
+    if len(hashes):
+        merged['hashes'] = hashes[:HASH_SKETCH_SIZE].tolist()
+    return merged
+
+
+def fold(df, state=None, offset=0, chunk_rows=PROFILE_CHUNK_ROWS):
+    """
+    Fold the rows of df (row offset onwards in the table) into state, chunk by chunk.
+    state is None or an earlier result of fold over the same columns.
+    """
+    columns = _kinds_fingerprint(df)
+    if state is None:
+        state = {'rows': 0, 'columns': [{'name': name, 'kind': kind, 'count': 0, 'nulls': 0,
+                                         'values': None if kind == 'datetime' else {}} for name, kind in columns]}
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        for i, (name, kind) in enumerate(columns):
+            chunk_state = _column_state(chunk.iloc[:, i], kind, offset + start)
+            state['columns'][i] = dict(_merge_column(state['columns'][i], chunk_state), name=name)
+        state['rows'] += len(chunk)
+    return state
+
+
+def _format(value, kind):
+    if value is None:
+        return None
+    if kind == 'datetime':
+        import pandas as pd
+        return str(pd.Timestamp(int(value)))
+    if isinstance(value, float):
+        return round(value, 4)
+    return value
+
+
+def summarize(state, dtypes=None):
+    """The profile (what results and prompts show) of a folded state"""
+    columns = {}
+    for column in state['columns']:
+        kind = column.get('kind', 'text')
+        hashes = column.get('hashes', [])
+        values = column.get('values')
+        if values is not None and not column.get('values_truncated'):
+            distinct, estimated = len(values), False
+        elif len(hashes) < HASH_SKETCH_SIZE:
+            distinct, estimated = len(hashes), False
+        else:
+            distinct, estimated = int((HASH_SKETCH_SIZE - 1) * 2.0 ** 64 / (hashes[HASH_SKETCH_SIZE - 1] + 1)), True
+        entry = {
+            'dtype': (dtypes or {}).get(column['name'], kind),
+            'count': column.get('count', 0),
+            'nulls': column.get('nulls', 0),
+            'distinct': distinct,
+        }
+        if estimated:
+            entry['distinct_estimated'] = True
+        if 'min' in column:
+            sample = np.array(column['sample_values'], dtype='float64')
+            entry['min'] = _format(column['min'], kind)
+            entry['max'] = _format(column['max'], kind)
+            if kind == 'numeric':
+                entry['mean'] = _format(column['sum'] / column['count'], kind)
+            entry['quantiles'] = {
+                f"p{int(q * 100)}": _format(float(np.quantile(sample, q)) if kind == 'numeric' else int(np.quantile(sample, q)), kind)
+                for q in (0.25, 0.5, 0.75)
+            }
+        if kind == 'text' and values:
+            top = sorted(values.items(), key=lambda kv: (-kv[1], kv[0]))[:TOP_VALUES]
+            entry['top'] = [{'value': value, 'count': count} for value, count in top]
+        columns[column['name']] = entry
+    return {'rows': state['rows'], 'columns': columns}
+
+
+def _short(value):
+    text = str(value).replace('"', "'").replace('\n', ' ')
+    return text[:MAX_VALUE_CHARS - 3] + "..." if len(text) > MAX_VALUE_CHARS else text
+
+
+def describe(profile):
+    """Compact one-line text of a profile, for the dataframe description in the prompt"""
+    return "; ".join(describe_columns(profile))
+
+
+def describe_columns(profile):
+    """One short line per column of a profile"""
+    parts = []
+    for name, column in profile['columns'].items():
+        facts = []
+        if column.get('nulls'):
+            facts.append(f"{column['nulls']} nulls")
+        if 'min' in column:
+            quantiles = column['quantiles']
+            if column['dtype'].startswith('datetime'):
+                facts.append(f"{_short(column['min'])} to {_short(column['max'])}")
+            else:
+                facts.append(f"min {column['min']}, median {quantiles['p50']}, max {column['max']}, mean {column['mean']}")
+        if 'top' in column:
+            approx = "~" if column.get('distinct_estimated') else ""
+            if column['top'][0]['count'] > 1:
+                shown = ", ".join(f"{_short(t['value'])} ({t['count']})" for t in column['top'])
+            else:  # (nearly) unique values: examples, not counts
+                shown = "e.g. " + ", ".join(_short(t['value']) for t in column['top'][:3])
+            more = column['distinct'] - len(column['top'])
+            facts.append(f"{approx}{column['distinct']} distinct: {shown}" + (" ..." if more > 0 else ""))
+        parts.append(f"{_short(name)} ({column['dtype']})" + (": " + ", ".join(facts) if facts else ""))
+    return parts
+
+
+def _kinds_fingerprint(df):
+    return [(str(name), column_kind(df.iloc[:, i])) for i, name in enumerate(df.columns)]
+
+
+def _hash(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _prefix_digest(file_path, size):
+    digest = hashlib.sha256()
+    remaining = size
+    with open(file_path, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def _ends_with_newline(file_path):
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+class ProfileCache:
+    """Profiles by (dataset hash, table), in memory and as JSON on disk"""
+
+    def __init__(self, profile_dir=PROFILE_DIR, max_files=PROFILE_MAX_FILES):
+        self.profile_dir = profile_dir
+        self.max_files = max_files
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, dataset_hash, name, df):
+        """The stored profile of table name of a dataset (df only provides the columns), or None"""
+        kinds = _kinds_fingerprint(df)
+        source, key = _hash(name, kinds)[:16], _hash(dataset_hash, name, kinds)[:32]
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        entry = self._read(os.path.join(self.profile_dir, f"{source}__{key}.json"))
+        if entry is None:
+            return None
+        self._remember(key, entry['profile'])
+        return entry['profile']
+
+    def profile(self, df, dataset_hash, name, file_path=None):
+        """
+        (profile, status) of table name of a dataset with its full frame df. status is
+        'memory' or 'disk' for a stored profile, 'incremental' when only rows appended to
+        an earlier version of file_path were profiled, else 'computed'. file_path is the
+        single file the table was read from, if dataset_hash is that file's digest.
+        """
+        kinds = _kinds_fingerprint(df)
+        source, key = _hash(name, kinds)[:16], _hash(dataset_hash, name, kinds)[:32]
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key], 'memory'
+        path = os.path.join(self.profile_dir, f"{source}__{key}.json")
+        entry = self._read(path)
+        if entry is not None:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            self._remember(key, entry['profile'])
+            return entry['profile'], 'disk'
+
+        file_info = None
+        if file_path and os.path.splitext(file_path)[1].lower().lstrip('.') in APPENDABLE_EXTS:
+            file_info = {'bytes': os.path.getsize(file_path), 'digest': dataset_hash,
+                         'ends_with_newline': _ends_with_newline(file_path)}
+        state, status = None, 'computed'
+        previous = self._previous_version(source, file_path, file_info, len(df)) if file_info else None
+        if previous is not None:
+            state, status = previous['state'], 'incremental'
+            debug_print(f"Profiling {len(df) - state['rows']} appended rows of {name}")
+            state = fold(df.iloc[state['rows']:], state, offset=state['rows'])
+        else:
+            state = fold(df)
+        profile = summarize(state, {str(c): str(t) for c, t in df.dtypes.items()})
+        self._write(path, {'version': VERSION, 'name': name, 'file': file_info, 'state': state, 'profile': profile})
+        self._remember(key, profile)
+        return profile, status
+
+    def _previous_version(self, source, file_path, file_info, rows):
+        """The stored entry of a file that file_path extends by appending whole lines, or None"""
+        candidates = []
+        for path in glob.glob(os.path.join(self.profile_dir, f"{source}__*.json")):
+            entry = self._read(path)
+            earlier = entry and entry.get('file')
+            if earlier and earlier['ends_with_newline'] and earlier['bytes'] < file_info['bytes'] \
+                    and entry['state']['rows'] <= rows:
+                candidates.append((earlier['bytes'], entry))
+        # The longest matching prefix leaves the fewest rows to profile
+        for size, entry in sorted(candidates, key=lambda c: -c[0]):
+            if _prefix_digest(file_path, size) == entry['file']['digest']:
+                return entry
+        return None
+
+    def _remember(self, key, profile):
+        with self._lock:
+            self._memory[key] = profile
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('version') == VERSION else None
+
+    def _write(self, path, entry):
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._enforce_limit()
+        except (OSError, ValueError) as e:
+            debug_print(f"Could not store dataset profile: {str(e)}")
+
+    def _enforce_limit(self):
+        if not self.max_files:
+            return
+        files = glob.glob(os.path.join(self.profile_dir, "*.json"))
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda p: os.path.getmtime(p))
+        for path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Process-wide profile cache (configured from the environment)"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ProfileCache()
+    return _default_cache
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+"""
+Persistent registry of ingested datasets.
+
+The Node backend deletes an upload after each request, so without a registry
+every follow-up question uploads and parses the same file again. Ingesting a
+file (pandasai_runner.py --ingest) parses it once, stores each of its tables
+as Feather with the optimized dtypes, and returns a dataset id; the runner
+accepts that id in place of a file path and only reads the Feather files.
+
+A dataset is one directory under the registry directory holding its tables
+and a meta.json with the schema, row counts and source file names. Ids are
+derived from the content, so ingesting the same bytes again returns the same
+id. meta.json's mtime records the last use; gc() removes datasets unused for
+longer than the maximum age and then the least recently used ones until the
+registry fits its size quota. gc() runs after every ingest.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+
+REGISTRY_DIR = os.getenv("DATASET_REGISTRY_DIR", os.path.join(os.getcwd(), 'data', 'datasets'))
+QUOTA_MB = int(os.getenv("DATASET_REGISTRY_MB", "2048"))
+MAX_AGE_DAYS = float(os.getenv("DATASET_REGISTRY_MAX_AGE_DAYS", "7"))
+
+ID_PATTERN = re.compile(r"^ds_[0-9a-f]{20}$")
+META_NAME = 'meta.json'
+
+
+def debug_print(*args, **kwargs):
+    """Print debug messages to stderr instead of stdout"""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def is_dataset_id(value):
+    return isinstance(value, str) and bool(ID_PATTERN.match(value))
+
+
+def dataset_id(dataset_hash):
+    return f"ds_{dataset_hash[:20]}"
+
+
+def _table_file(position, df):
+    # Feather needs a default index and string column names; anything else is pickled
+    import pandas as pd
+    if isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1 \
+            and all(isinstance(c, str) for c in df.columns):
+        return f"table_{position}.feather"
+    return f"table_{position}.pkl"
+
+
+def write_table(directory, position, df):
+    """Store df as the position-th table in directory; returns its file name"""
+    file_name = _table_file(position, df)
+    path = os.path.join(directory, file_name)
+    if file_name.endswith('.feather'):
+        df.to_feather(path)
+    else:
+        df.to_pickle(path)
+    return file_name
+
+
+def read_table(directory, file_name):
+    """A table stored by write_table"""
+    import pandas as pd
+    path = os.path.join(directory, file_name)
+    return pd.read_feather(path) if file_name.endswith('.feather') else pd.read_pickle(path)
+
+
+class DatasetRegistry:
+    """Ingested datasets on disk, by dataset id"""
+
+    def __init__(self, registry_dir=REGISTRY_DIR, quota_mb=QUOTA_MB, max_age_days=MAX_AGE_DAYS):
+        self.registry_dir = registry_dir
+        self.quota_bytes = quota_mb * 1024 * 1024
+        self.max_age_seconds = max_age_days * 86400
+
+    def register(self, tables, dataset_hash, files, optimized=True):
+        """
+        Store the (name, df) tables of a parsed dataset. Returns its metadata, with
+        'status' 'created', or 'existing' when the same content was ingested before.
+        """
+        key = dataset_id(dataset_hash)
+        existing = self.get(key)
+        if existing is not None:
+            self._touch(key)
+            return dict(existing, status='existing')
+
+        os.makedirs(self.registry_dir, exist_ok=True)
+        tmp_dir = os.path.join(self.registry_dir, f"{key}.{os.getpid()}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        entries = []
+        for position, (name, df) in enumerate(tables):
+            file_name = write_table(tmp_dir, position, df)
+            entries.append({
+                'name': name,
+                'file': file_name,
+                'rows': int(df.shape[0]),
+                'columns': int(df.shape[1]),
+                'schema': {str(column): str(dtype) for column, dtype in df.dtypes.items()},
+                'bytes': os.path.getsize(os.path.join(tmp_dir, file_name)),
+            })
+        meta = {
+            'dataset_id': key,
+            'dataset_hash': dataset_hash,
+            'files': [os.path.basename(f) for f in files],
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'optimized': optimized,
+            'tables': entries,
+            'bytes': sum(e['bytes'] for e in entries),
+        }
+        with open(os.path.join(tmp_dir, META_NAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        try:
+            os.replace(tmp_dir, self._dir(key))  # readers never see a partial dataset
+        except OSError:
+            # Another process ingested the same content first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return dict(self.get(key) or meta, status='existing')
+
+        removed = self.gc(keep=key)
+        if removed:
+            debug_print(f"Dataset registry evicted {len(removed)} datasets: {', '.join(removed)}")
+        return dict(meta, status='created')
+
+    def get(self, key):
+        """Metadata of a dataset, or None"""
+        if not is_dataset_id(key):
+            return None
+        try:
+            with open(self._meta_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, key):
+        """(tables, meta) of a dataset; raises FileNotFoundError for unknown or evicted ids"""
+        meta = self.get(key)
+        if meta is None:
+            raise FileNotFoundError(f"Unknown or expired dataset: {key}")
+        tables = [(entry['name'], read_table(self._dir(key), entry['file'])) for entry in meta['tables']]
+        self._touch(key)
+        return tables, meta
+
+    def list(self):
+        """Metadata of every dataset with its 'last_used' time, most recently used first"""
+        datasets = []
+        for key, _, last_used in self._entries():
+            meta = self.get(key)
+            if meta is not None:
+                meta['last_used'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(last_used))
+                datasets.append(meta)
+        return datasets
+
+    def delete(self, key):
+        """Remove a dataset; returns whether it existed"""
+        if self.get(key) is None:
+            return False
+        shutil.rmtree(self._dir(key), ignore_errors=True)
+        return True
+
+    def info(self):
+        entries = self._entries()
+        return {
+            'registry_dir': self.registry_dir,
+            'datasets': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'quota_bytes': self.quota_bytes,
+            'max_age_days': self.max_age_seconds / 86400,
+        }
+
+    def gc(self, now=None, keep=None):
+        """
+        Remove datasets unused for longer than the maximum age, then the least
+        recently used ones while the registry exceeds its quota (never keep).
+        Returns the removed ids.
+        """
+        now = now or time.time()
+        entries = sorted(self._entries(), key=lambda e: e[2], reverse=True)
+        total = sum(size for _, size, _ in entries)
+        removed = []
+        for key, size, last_used in reversed(entries):
+            if key == keep:
+                continue
+            expired = self.max_age_seconds and now - last_used > self.max_age_seconds
+            if expired or (self.quota_bytes and total > self.quota_bytes):
+                shutil.rmtree(self._dir(key), ignore_errors=True)
+                total -= size
+                removed.append(key)
+        return removed
+
+    # ---- helpers ----------------------------------------------------------
+
+    def _dir(self, key):
+        return os.path.join(self.registry_dir, key)
+
+    def _meta_path(self, key):
+        return os.path.join(self._dir(key), META_NAME)
+
+    def _touch(self, key):
+        try:
+            os.utime(self._meta_path(key))
+        except OSError:
+            pass
+
+    def _entries(self):
+        """List of (dataset_id, bytes, last_used) for complete datasets"""
+        if not os.path.isdir(self.registry_dir):
+            return []
+        entries = []
+        for key in os.listdir(self.registry_dir):
+            if not is_dataset_id(key):
+                continue
+            try:
+                last_used = os.path.getmtime(self._meta_path(key))
+                size = sum(os.path.getsize(os.path.join(self._dir(key), name)) for name in os.listdir(self._dir(key)))
+            except OSError:
+                continue
+            entries.append((key, size, last_used))
+        return entries
+
+
+_default_registry = None
+
+
+def get_registry():
+    """Process-wide registry (configured from the environment)"""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = DatasetRegistry()
+    return _default_registry
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Faster Excel ingestion for the runner.
+
+pd.read_excel with openpyxl builds a Python object per cell and is by far the
+slowest loader. This module reads workbooks with python-calamine (a Rust
+parser, optional) when it is installed and falls back to pandas/openpyxl
+otherwise; cells go through pandas' TextParser either way, so both engines
+produce the same dtypes.
+
+read_sheets parses several sheets of one workbook at once. Sheet parsing holds
+the GIL, so for large workbooks the sheets are spread over worker processes.
+The runner stores every sheet in the dataset cache (Feather) the first time a
+workbook is parsed, which turns later questions on any of its sheets into
+columnar reads.
+
+EXCEL_ENGINE picks 'calamine', 'openpyxl' or 'auto' (calamine if installed).
+"""
+
+import os
+from itertools import repeat
+
+ENGINES = ('auto', 'calamine', 'openpyxl')
+ENGINE = os.getenv("EXCEL_ENGINE", "auto")
+# Worker processes for the sheets of one workbook (1 = parse in the calling thread)
+PROCESSES = int(os.getenv("EXCEL_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# Starting worker processes only pays off for workbooks at least this large
+PARALLEL_MIN_MB = float(os.getenv("EXCEL_PARALLEL_MIN_MB", "5"))
+
+
+def calamine_available():
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def engine_name(engine=ENGINE):
+    """The engine that will actually be used for engine"""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown Excel engine: {engine}. Choose from: {', '.join(ENGINES)}")
+    if engine == 'auto':
+        return 'calamine' if calamine_available() else 'openpyxl'
+    return engine
+
+
+def _calamine_value(value):
+    # Excel stores every number as a float; whole numbers read as ints, as with openpyxl
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _calamine_frame(workbook, sheet):
+    from pandas.io.parsers import TextParser
+    name = workbook.sheet_names[0] if sheet is None else sheet
+    rows = workbook.get_sheet_by_name(name).to_python(skip_empty_area=False)
+    if not rows:
+        import pandas as pd
+        return pd.DataFrame()
+    return TextParser([[_calamine_value(v) for v in row] for row in rows], header=0).read()
+
+
+def read_sheet(file_path, sheet=None, engine=ENGINE):
+    """One sheet (the first when sheet is None) as a DataFrame"""
+    if engine_name(engine) == 'calamine':
+        from python_calamine import CalamineWorkbook
+        return _calamine_frame(CalamineWorkbook.from_path(file_path), sheet)
+    import pandas as pd
+    return pd.read_excel(file_path, sheet_name=0 if sheet is None else sheet)
+
+
+def read_sheets(file_path, sheets, engine=ENGINE, processes=PROCESSES):
+    """
+    {sheet: DataFrame} for the named sheets of one workbook. Large workbooks are
+    parsed one sheet per worker process; otherwise the workbook is opened once.
+    """
+    engine = engine_name(engine)
+    sheets = list(sheets)
+    if processes > 1 and len(sheets) > 1 and os.path.getsize(file_path) >= PARALLEL_MIN_MB * 1024 * 1024:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # spawn: the runner has threads running, which fork does not copy safely
+        with ProcessPoolExecutor(max_workers=min(processes, len(sheets)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            return dict(zip(sheets, pool.map(read_sheet, repeat(file_path), sheets, repeat(engine))))
+
+    if engine == 'calamine':
+        from python_calamine import CalamineWorkbook
+        workbook = CalamineWorkbook.from_path(file_path)
+        return {sheet: _calamine_frame(workbook, sheet) for sheet in sheets}
+    import pandas as pd
+    return pd.read_excel(file_path, sheet_name=sheets)
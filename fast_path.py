@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+"""
+LLM-free answers for common aggregation questions.
+
+Questions such as "total Sales by Category", "average Price", "top 5 Product
+by Sales", "how many rows" or "各Category的Sales总和" do not need a model:
+match() resolves the column names the question mentions against the loaded
+frame, reads the remaining words (English or Chinese) as an aggregation,
+grouping, ranking, count or chart request and writes the pandas code, in the
+same form PandasAI's code takes, so the runner cleans, executes and charts it
+as usual without an LLM round trip.
+
+Matching is deliberately strict. Every word of the question has to be
+either a column name or part of the known vocabulary; anything else (a
+filter value, a second aggregation, a join) means the question is left to
+the Agent. The confidence is 1.0 for exact column names and lower for
+inexact ones (a plural form, a column that is both numeric candidates of a
+ranking); answers below FAST_PATH_MIN_CONFIDENCE are left to the Agent too.
+
+FAST_PATH=0 turns the fast path off.
+"""
+
+import os
+import re
+
+ENABLED = os.getenv("FAST_PATH", "1") != "0"
+MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.8"))
+
+DEFAULT_TOP_N = 5
+CHART_PATH = 'temp_chart.png'
+# Column names matched in another grammatical number ("sale" for "Sales")
+INEXACT_NAME = 0.9
+# Rankings between two numeric columns, where the value column is a guess
+AMBIGUOUS_RANKING = 0.7
+
+AGG_TITLES = {'sum': 'Total', 'mean': 'Average', 'median': 'Median', 'max': 'Maximum', 'min': 'Minimum'}
+
+# word -> (role, value). Roles: agg (aggregation), sup (superlative: max/min, or the
+# direction of a ranking), top (ranking), group (the next column groups), count, rows,
+# count_rows, distinct, freq (most frequent values), chart, which, number, stop
+ENGLISH = {
+    'total': ('agg', 'sum'), 'totals': ('agg', 'sum'), 'sum': ('agg', 'sum'), 'sums': ('agg', 'sum'),
+    'average': ('agg', 'mean'), 'avg': ('agg', 'mean'), 'mean': ('agg', 'mean'), 'median': ('agg', 'median'),
+    'maximum': ('agg', 'max'), 'max': ('agg', 'max'), 'minimum': ('agg', 'min'), 'min': ('agg', 'min'),
+    'highest': ('sup', 'desc'), 'largest': ('sup', 'desc'), 'biggest': ('sup', 'desc'), 'greatest': ('sup', 'desc'),
+    'most': ('sup', 'desc'), 'best': ('sup', 'desc'),
+    'lowest': ('sup', 'asc'), 'smallest': ('sup', 'asc'), 'least': ('sup', 'asc'), 'fewest': ('sup', 'asc'),
+    'worst': ('sup', 'asc'),
+    'top': ('top', 'desc'), 'bottom': ('top', 'asc'),
+    'by': ('group', None), 'per': ('group', None), 'each': ('group', None), 'every': ('group', None),
+    'count': ('count', None), 'number': ('count', None), 'many': ('count', None), 'how': ('count', None),
+    'rows': ('rows', None), 'row': ('rows', None), 'records': ('rows', None), 'record': ('rows', None),
+    'entries': ('rows', None), 'lines': ('rows', None),
+    'unique': ('distinct', None), 'distinct': ('distinct', None), 'different': ('distinct', None),
+    'common': ('freq', None), 'frequent': ('freq', None), 'popular': ('freq', None),
+    'plot': ('chart', None), 'chart': ('chart', None), 'graph': ('chart', None), 'visualize': ('chart', None),
+    'visualise': ('chart', None), 'draw': ('chart', None),
+    'bar': ('chart', 'bar'), 'line': ('chart', 'line'), 'pie': ('chart', 'pie'),
+    'which': ('which', None),
+}
+ENGLISH_STOP = {
+    'the', 'a', 'an', 'of', 'is', 'are', 'was', 'were', 'show', 'me', 'give', 'get', 'find', 'list', 'tell',
+    'display', 'compute', 'calculate', 'please', 'for', 'in', 'all', 'there', 'do', 'does', 'we', 'have', 'has',
+    'with', 'what', 'value', 'values', 'data', 'dataset', 'table', 'overall', 'on', 'to', 'us', 'can', 'you', 'i',
+    'want', 'see', 'group', 'grouped', 'broken', 'down', 'split', 'it', 's', 'and', 'their', 'its',
+}
+ENGLISH_NUMBERS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8,
+                   'nine': 9, 'ten': 10, 'twenty': 20}
+
+CHINESE = {
+    '总和': ('agg', 'sum'), '总计': ('agg', 'sum'), '合计': ('agg', 'sum'), '总额': ('agg', 'sum'),
+    '之和': ('agg', 'sum'), '求和': ('agg', 'sum'), '总量': ('agg', 'sum'), '汇总': ('agg', 'sum'), '总': ('agg', 'sum'),
+    '平均值': ('agg', 'mean'), '平均数': ('agg', 'mean'), '平均': ('agg', 'mean'), '均值': ('agg', 'mean'),
+    '中位数': ('agg', 'median'), '最大值': ('agg', 'max'), '最小值': ('agg', 'min'),
+    '最大': ('sup', 'desc'), '最高': ('sup', 'desc'), '最多': ('sup', 'desc'),
+    '最小': ('sup', 'asc'), '最低': ('sup', 'asc'), '最少': ('sup', 'asc'),
+    '前': ('top', 'desc'), '后': ('top', 'asc'),
+    '按照': ('group', None), '按': ('group', None), '每一个': ('group', None), '每个': ('group', None),
+    '每种': ('group', None), '每': ('group', None), '各个': ('group', None), '各种': ('group', None), '各': ('group', None),
+    '数量': ('count', None), '个数': ('count', None), '计数': ('count', None), '多少': ('count', None), '几': ('count', None),
+    '行数': ('count_rows', None), '条数': ('count_rows', None), '记录数': ('count_rows', None),
+    '总行数': ('count_rows', None), '数据量': ('count_rows', None),
+    '行': ('rows', None), '条': ('rows', None), '记录': ('rows', None),
+    '不同': ('distinct', None), '唯一': ('distinct', None), '去重': ('distinct', None), '种': ('distinct', None),
+    '最常见': ('freq', 'most'), '出现次数': ('freq', None), '次数': ('freq', None), '出现': ('freq', None), '常见': ('freq', None),
+    '柱状图': ('chart', 'bar'), '条形图': ('chart', 'bar'), '折线图': ('chart', 'line'), '饼图': ('chart', 'pie'),
+    '图表': ('chart', None), '可视化': ('chart', None), '绘制': ('chart', None), '画': ('chart', None),
+    '作图': ('chart', None), '图': ('chart', None),
+    '哪一个': ('which', None), '哪个': ('which', None), '哪些': ('which', None), '哪': ('which', None),
+    '什么': ('which', None),
+}
+CHINESE_STOP = [
+    '的', '是', '请', '给出', '给我', '显示', '展示', '计算', '求', '统计', '查询', '查看', '一下', '所有', '全部',
+    '数据', '表', '中', '里', '有', '一共', '共', '总共', '分别', '列出', '出', '为', '看看', '看', '帮我', '帮',
+    '我', '吗', '呢', '了', '值', '数值', '排名', '排行', '名', '个', '位', '项', '一张', '张', '用', '来', '对',
+]
+CHINESE_NUMBERS = {'一': 1, '两': 2, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9, '十': 10}
+
+CHINESE_WORDS = dict(CHINESE, **{word: ('stop', None) for word in CHINESE_STOP},
+                     **{word: ('number', n) for word, n in CHINESE_NUMBERS.items()})
+CHINESE_MAX_WORD = max(len(word) for word in CHINESE_WORDS)
+CJK = re.compile(r"[一-鿿]")
+TOKEN = re.compile(r"\x00(\d+)\x00|[a-z]+|\d+|[一-鿿]+|\S")
+
+# Roles each kind of question may contain besides columns and stop words
+ALLOWED = {
+    'aggregate': {'agg', 'sup', 'group', 'chart'},
+    'count': {'count', 'rows', 'count_rows', 'distinct', 'group', 'chart', 'which'},
+    'top': {'top', 'sup', 'which', 'number', 'group', 'agg', 'chart', 'freq', 'rows'},
+}
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", re.sub(r"[_\-]+", " ", str(text).lower())).strip()
+
+
+def _name_forms(column):
+    """(surface form, confidence) of a column name in a normalized question"""
+    name = _normalize(column)
+    forms = [(name, 1.0)]
+    if name.isascii() and name[-1:].isalpha():
+        if name.endswith('s'):
+            forms.append((name[:-1], INEXACT_NAME))
+        elif name.endswith('y'):
+            forms += [(name + 's', INEXACT_NAME), (name[:-1] + 'ies', INEXACT_NAME)]
+        else:
+            forms += [(name + 's', INEXACT_NAME), (name + 'es', INEXACT_NAME)]
+    return [(form, confidence) for form, confidence in forms if form]
+
+
+def find_columns(query, columns):
+    """
+    The question with each column mention replaced by a \\x00<position>\\x00 marker, and the
+    lowest confidence of the mentions (1.0 without any). None when a mention is ambiguous.
+    """
+    text = _normalize(query)
+    forms = sorted(((form, confidence, position) for position, column in enumerate(columns)
+                    for form, confidence in _name_forms(column)), key=lambda f: (-len(f[0]), -f[1]))
+    spans = []  # (start, end, position, confidence)
+    for form, confidence, position in forms:
+        if form.isascii():
+            pattern = re.compile(r"(?<![a-z0-9])" + re.escape(form) + r"(?![a-z0-9])")
+        else:
+            pattern = re.compile(re.escape(form))
+        for found in pattern.finditer(text):
+            start, end = found.span()
+            same = [s for s in spans if s[0] == start and s[1] == end]
+            if any(s[2] != position and s[3] == confidence for s in same):
+                return None  # two columns with the same name ("A B" and "A_B")
+            if any(s[0] < end and start < s[1] for s in spans):
+                continue
+            spans.append((start, end, position, confidence))
+    confidence = min([s[3] for s in spans], default=1.0)
+    for start, end, position, _ in sorted(spans, reverse=True):
+        text = f"{text[:start]} \x00{position}\x00 {text[end:]}"
+    return text, confidence
+
+
+def _chinese_words(run):
+    words, start = [], 0
+    while start < len(run):
+        for size in range(min(CHINESE_MAX_WORD, len(run) - start), 0, -1):
+            word = run[start:start + size]
+            if word in CHINESE_WORDS:
+                words.append(CHINESE_WORDS[word])
+                start += size
+                break
+        else:
+            return None
+    return words
+
+
+def tokenize(text):
+    """(role, value) tokens of a question whose columns are markers; None if a word is unknown"""
+    tokens = []
+    for found in TOKEN.finditer(text):
+        word = found.group(0)
+        if found.group(1) is not None:
+            tokens.append(('col', int(found.group(1))))
+        elif word.isdigit():
+            tokens.append(('number', int(word)))
+        elif CJK.match(word):
+            words = _chinese_words(word)
+            if words is None:
+                return None
+            tokens += words
+        elif word.isalpha():
+            if word in ENGLISH:
+                tokens.append(ENGLISH[word])
+            elif word in ENGLISH_NUMBERS:
+                tokens.append(('number', ENGLISH_NUMBERS[word]))
+            elif word in ENGLISH_STOP:
+                tokens.append(('stop', None))
+            else:
+                return None
+        elif word not in "?？,，.。!！:：'\"“”‘’()（）":
+            return None
+    return [token for token in tokens if token[0] != 'stop']
+
+
+def _first(tokens, role):
+    return next((value for r, value in tokens if r == role), None)
+
+
+def _grouped(tokens):
+    """Columns right after a grouping word"""
+    return [tokens[i + 1][1] for i in range(len(tokens) - 1) if tokens[i][0] == 'group' and tokens[i + 1][0] == 'col']
+
+
+def match(query, df):
+    """
+    The fast-path answer to query on df: a dict with the 'intent', its parameters, the
+    'confidence' and the PandasAI-style 'code', or None when the Agent should answer.
+    """
+    import pandas as pd
+
+    columns = list(df.columns)
+    if not query or not columns or len(set(map(str, columns))) != len(columns):
+        return None
+    found = find_columns(query, [str(c) for c in columns])
+    if found is None:
+        return None
+    text, confidence = found
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+
+    roles = {role for role, _ in tokens} - {'col'}
+    mentioned = list(dict.fromkeys(value for role, value in tokens if role == 'col'))
+    grouped = _grouped(tokens)
+    numeric = {i for i in mentioned if pd.api.types.is_numeric_dtype(df.dtypes.iloc[i])
+               and not pd.api.types.is_bool_dtype(df.dtypes.iloc[i])}
+    chart = 'chart' in roles
+    chart_kind = _first([t for t in tokens if t[1] is not None], 'chart') or 'bar'
+
+    ranking = roles & {'top', 'freq'} or ('sup' in roles and roles & {'which', 'number'})
+    if ranking:
+        intent = _ranking(tokens, mentioned, grouped, numeric, roles)
+    elif roles & {'count', 'count_rows'} and 'agg' not in roles and 'sup' not in roles:
+        intent = _count(mentioned, grouped, roles)
+    elif roles & {'agg', 'sup'} or (chart and grouped):
+        intent = _aggregate(tokens, df, mentioned, grouped, numeric, roles)
+    else:
+        return None
+    if intent is None or roles - {'col'} - ALLOWED[intent['kind']]:
+        return None
+    if chart and intent.get('by') is None:
+        return None  # a single number is not charted
+
+    intent['confidence'] = round(min(confidence, intent.pop('confidence', 1.0)), 2)
+    if intent['confidence'] < MIN_CONFIDENCE:
+        return None
+    intent['chart'] = chart_kind if chart else None
+    names = {key: columns[intent[key]] for key in ('value', 'by') if intent.get(key) is not None}
+    intent.update(names)
+    intent['code'] = build_code(intent)
+    return intent
+
+
+def _ranking(tokens, mentioned, grouped, numeric, roles):
+    direction = _first(tokens, 'top') or _first(tokens, 'sup') or 'desc'
+    if 'freq' in roles:
+        # "most common Product": how often each value occurs (all values without "most"/"top")
+        ranked = roles & {'top', 'sup'} or _first(tokens, 'freq') == 'most'
+        n = _first(tokens, 'number') or (DEFAULT_TOP_N if ranked else None)
+        if len(mentioned) != 1:
+            return None
+        return {'kind': 'top', 'intent': 'most_frequent', 'by': mentioned[0], 'value': None, 'agg': 'count',
+                'n': n, 'ascending': direction == 'asc'}
+    n = _first(tokens, 'number') or (DEFAULT_TOP_N if 'top' in roles else 1)
+    if 'count' in roles or len(mentioned) not in (1, 2):
+        return None
+    confidence = 1.0
+    if len(mentioned) == 1:
+        if mentioned[0] not in numeric:
+            return None
+        value, entity = mentioned[0], None
+    else:
+        candidates = [c for c in mentioned if c in numeric]
+        if not candidates:
+            return None
+        if len(candidates) == 2:
+            # "top 5 Price by Sales": the value is the column after "by"
+            by_value = [c for c in candidates if c in grouped]
+            value = by_value[0] if len(by_value) == 1 else candidates[-1]
+            confidence = AMBIGUOUS_RANKING if len(by_value) != 1 else 1.0
+        else:
+            value = candidates[0]
+        entity = next(c for c in mentioned if c != value)
+    return {'kind': 'top', 'intent': 'top_n', 'by': entity, 'value': value, 'agg': _first(tokens, 'agg') or 'sum',
+            'n': n, 'ascending': direction == 'asc', 'confidence': confidence}
+
+
+def _count(mentioned, grouped, roles):
+    by = grouped[0] if len(grouped) == 1 else None
+    others = [c for c in mentioned if c != by]
+    if 'distinct' in roles:
+        if len(others) != 1 or len(grouped) > 1:
+            return None
+        return {'kind': 'count', 'intent': 'count_distinct', 'value': others[0], 'by': by, 'agg': 'nunique'}
+    if others or len(grouped) > 1:
+        return None  # "number of Product" could mean rows or distinct values
+    if by is None and not roles & {'rows', 'count_rows'}:
+        return None
+    return {'kind': 'count', 'intent': 'count_rows', 'value': None, 'by': by, 'agg': 'size'}
+
+
+def _aggregate(tokens, df, mentioned, grouped, numeric, roles):
+    import pandas as pd
+
+    agg = _first(tokens, 'agg')
+    if agg is None and 'sup' in roles:
+        agg = 'max' if _first(tokens, 'sup') == 'desc' else 'min'
+    elif agg is None:
+        agg = 'sum'  # "pie chart of Sales by Category"
+    elif 'sup' in roles:
+        return None
+    if len(grouped) > 1 or len([t for t in tokens if t[0] == 'agg']) > 1:
+        return None
+    by = grouped[0] if grouped else None
+    values = [c for c in mentioned if c != by]
+    if len(values) != 1:
+        return None
+    value = values[0]
+    is_datetime = pd.api.types.is_datetime64_any_dtype(df.dtypes.iloc[value])
+    if value not in numeric and not (is_datetime and agg in ('max', 'min')):
+        return None
+    return {'kind': 'aggregate', 'intent': 'aggregate', 'value': value, 'by': by, 'agg': agg}
+
+
+def _series_expression(intent):
+    """Expression of the answer as a Series indexed by the grouping (or entity) column"""
+    by, value, agg, n = intent.get('by'), intent.get('value'), intent['agg'], intent.get('n')
+    if intent['intent'] == 'most_frequent':
+        expression = f"df[{by!r}].value_counts()"
+        if n is None:
+            return expression
+        return expression + (f".sort_values().head({n})" if intent['ascending'] else f".head({n})")
+    if intent['intent'] == 'count_rows':
+        return f"df.groupby({by!r}).size()"
+    if intent['intent'] == 'count_distinct':
+        return f"df.groupby({by!r})[{value!r}].nunique()"
+    if intent['intent'] == 'top_n':
+        pick = 'nsmallest' if intent['ascending'] else 'nlargest'
+        if by is None:
+            return f"df[{value!r}].{pick}({n})"
+        return f"df.groupby({by!r})[{value!r}].{agg}().{pick}({n})"
+    return f"df.groupby({by!r})[{value!r}].{agg}()"
+
+
+def _title(intent):
+    by, value, agg = intent.get('by'), intent.get('value'), intent['agg']
+    if intent['intent'] == 'most_frequent':
+        return f"Most frequent {by}" if intent['n'] else f"Frequency of {by}"
+    if intent['intent'] == 'count_rows':
+        return f"Rows by {by}"
+    if intent['intent'] == 'count_distinct':
+        return f"Distinct {value} by {by}"
+    if intent['intent'] == 'top_n':
+        side = 'Bottom' if intent['ascending'] else 'Top'
+        return f"{side} {intent['n']} {by} by {value}" if by is not None else f"{side} {intent['n']} {value}"
+    return f"{AGG_TITLES[agg]} {value} by {by}"
+
+
+def build_code(intent):
+    """PandasAI-style code (declaring `result`) for a matched intent"""
+    lines = ["import pandas as pd"]
+    if intent['chart']:
+        lines.append("import matplotlib.pyplot as plt")
+    lines.append("df = dfs[0]")
+    by, value = intent.get('by'), intent.get('value')
+
+    if intent['intent'] == 'count_rows' and by is None:
+        lines += ["value = len(df)", "result = {'type': 'number', 'value': value}"]
+    elif intent['intent'] == 'count_distinct' and by is None:
+        lines += [f"value = df[{value!r}].nunique()", "result = {'type': 'number', 'value': value}"]
+    elif intent['intent'] == 'aggregate' and by is None:
+        lines += [f"value = df[{value!r}].{intent['agg']}()", "result = {'type': 'number', 'value': value}"]
+    elif intent['chart']:
+        lines.append(f"data = {_series_expression(intent)}")
+        if intent['chart'] == 'pie':
+            lines += ["data.plot(kind='pie', autopct='%1.1f%%')", "plt.ylabel('')"]
+        else:
+            lines.append(f"data.plot(kind={intent['chart']!r})")
+            if by is not None:
+                lines.append(f"plt.xlabel({str(by)!r})")
+            lines.append(f"plt.ylabel({str(value) if value is not None else 'count'!r})")
+        lines += [f"plt.title({_title(intent)!r})", "plt.tight_layout()", f"plt.savefig({CHART_PATH!r})",
+                  f"result = {{'type': 'plot', 'value': {CHART_PATH!r}}}"]
+    else:
+        if intent['intent'] == 'top_n' and by is None:
+            lines.append(f"summary = df.{'nsmallest' if intent['ascending'] else 'nlargest'}({intent['n']}, {value!r})")
+        elif intent['intent'] == 'most_frequent':
+            # value_counts() names its index and values differently across pandas versions
+            lines.append(f"summary = {_series_expression(intent)}.rename_axis({by!r}).reset_index(name='count')")
+        else:
+            name = value if value is not None else 'count'
+            lines.append(f"summary = {_series_expression(intent)}.reset_index(name={name!r})")
+        lines.append("result = {'type': 'dataframe', 'value': summary}")
+    return "\n".join(lines) + "\n"
+
+
+def run(code, frames):
+    """Execute fast-path code against frames (the dfs it refers to); returns its result dict"""
+    namespace = {'dfs': frames}
+    exec(compile(code, '<fast_path>', 'exec'), namespace)
+    return namespace['result']
@@ -50,6 +50,12 @@ const storage = multer.diskStorage({
   }
 });
 
+// Runner deadline, below the 60s kill of the runner process
+const RUNNER_DEADLINE_SECONDS = parseFloat(process.env.RUNNER_DEADLINE_SECONDS || '55');
+
+// Files accepted per request
+const MAX_UPLOAD_FILES = parseInt(process.env.MAX_UPLOAD_FILES || '10', 10);
+
 const upload = multer({
   storage: storage,
   limits: {
@@ -375,8 +381,46 @@ function saveHistory(history) {
   }
 }
 
+// Chart manifest written by the runner, one JSON entry per line (newest last)
+const chartManifestPath = path.join(chartsDir, 'manifest.jsonl');
+const MANIFEST_TAIL_BYTES = 64 * 1024;
+
+// Helper function to read the most recent chart from the manifest without scanning the directory
+function latestManifestChart() {
+  let fd;
+  try {
+    fd = fs.openSync(chartManifestPath, 'r');
+    const size = fs.fstatSync(fd).size;
+    const length = Math.min(size, MANIFEST_TAIL_BYTES);
+    const buffer = Buffer.alloc(length);
+    fs.readSync(fd, buffer, 0, length, size - length);
+    const lines = buffer.toString('utf8').trim().split('\n').reverse();
+    for (const line of lines) {
+      try {
+        const entry = JSON.parse(line);
+        if (entry.chart && fs.existsSync(path.join(chartsDir, entry.chart))) {
+          return entry.chart;
+        }
+      } catch (e) {
+        // Partial first line of the tail, or a torn write
+      }
+    }
+  } catch (error) {
+    if (error.code !== 'ENOENT') {
+      logToFile(`Error reading chart manifest: ${error.message}`, 'error');
+    }
+  } finally {
+    if (fd !== undefined) fs.closeSync(fd);
+  }
+  return null;
+}
+
 // Helper function to find the most recent chart file
 function findLatestChartFile() {
+  const manifestChart = latestManifestChart();
+  if (manifestChart) return manifestChart;
+  
+  // Charts saved before the manifest existed
   try {
     const chartFiles = fs.readdirSync(chartsDir).filter(file => 
       file.endsWith('.png') || file.endsWith('.jpg')
@@ -409,11 +453,79 @@ app.get('/api/health', (req, res) => {
   });
 });
 
-app.post('/api/generate', upload.single('csv_file'), (req, res) => {
-  const { model, query, preference } = req.body;
-  const filePath = req.file ? req.file.path : null;
+// Run a runner subcommand that prints one JSON object and exits
+function runRunnerJson(args, callback) {
+  const pythonProcess = spawn('python', [path.join(__dirname, 'pandasai_runner.py'), ...args]);
+  let output = '';
+  pythonProcess.stdout.on('data', (data) => {
+    output += data.toString();
+  });
+  pythonProcess.stderr.on('data', (data) => {
+    logToFile(`Python debug: ${data.toString().trim()}`, 'info');
+  });
+  pythonProcess.on('close', (code) => {
+    try {
+      callback(code === 0 ? null : new Error(`进程退出码 ${code}`), code === 0 ? JSON.parse(output) : null);
+    } catch (e) {
+      callback(e, null);
+    }
+  });
+}
+
+// Ingest uploaded files once into the dataset registry; later questions pass the returned dataset_id
+app.post('/api/datasets', upload.array('csv_file', MAX_UPLOAD_FILES), (req, res) => {
+  const filePaths = (req.files || []).map(file => file.path);
+  if (!filePaths.length) {
+    return res.status(400).json({ error: 'Missing required parameter: csv_file' });
+  }
+  logToFile(`Ingesting dataset: ${filePaths.join(', ')}`);
+  runRunnerJson(['--ingest', ...filePaths], (err, result) => {
+    // The registry keeps its own copy, so the uploads can go
+    filePaths.forEach(uploadedPath => {
+      if (fs.existsSync(uploadedPath)) {
+        fs.unlinkSync(uploadedPath);
+      }
+    });
+    if (err || result.error) {
+      const message = err ? `导入数据集错误: ${err.message}` : result.error;
+      logToFile(message, 'error');
+      return res.status(500).json({ error: message });
+    }
+    logToFile(`Dataset ${result.dataset_id} ${result.status}`);
+    res.json(result);
+  });
+});
+
+app.get('/api/datasets', (req, res) => {
+  runRunnerJson(['--registry', 'list'], (err, datasets) => {
+    if (err) {
+      logToFile(`Error listing datasets: ${err.message}`, 'error');
+      return res.json([]);
+    }
+    res.json(datasets);
+  });
+});
+
+app.delete('/api/datasets/:id', (req, res) => {
+  if (!/^ds_[0-9a-f]{20}$/.test(req.params.id)) {
+    return res.status(400).json({ error: 'Invalid dataset_id' });
+  }
+  runRunnerJson(['--delete-dataset', req.params.id], (err, result) => {
+    if (err) {
+      logToFile(`Error deleting dataset: ${err.message}`, 'error');
+      return res.status(500).json({ error: '删除数据集失败' });
+    }
+    res.status(result.deleted ? 200 : 404).json(result);
+  });
+});
+
+app.post('/api/generate', upload.array('csv_file', MAX_UPLOAD_FILES), (req, res) => {
+  const { model, query, preference, dataset_id: datasetId } = req.body;
+  // Several files (or one workbook with several sheets) become separate named dataframes
+  const filePaths = (req.files || []).map(file => file.path);
+  const filePath = filePaths.length ? filePaths[0] : null;
   
-  logToFile(`Processing request: Query=${query}, File=${filePath || 'None'}, Preference=${preference || 'None'}`);
+  logToFile(`Processing request: Query=${query}, File=${filePaths.join(', ') || datasetId || 'None'}, Preference=${preference || 'None'}`);
 
   const allConfigs = loadAllAiConfigs();
   const activeConfig = allConfigs.configurations.find(c => c.id === allConfigs.activeConfigId);
@@ -435,15 +547,26 @@ app.post('/api/generate', upload.single('csv_file'), (req, res) => {
     return res.status(400).json({ error: 'Missing required parameter: query' });
   }
   
+  // Only registry ids reach the runner, never arbitrary server paths
+  if (datasetId && !/^ds_[0-9a-f]{20}$/.test(datasetId)) {
+    logToFile(`Invalid dataset_id: ${datasetId}`, 'error');
+    return res.status(400).json({ error: 'Invalid dataset_id' });
+  }
+  
   // Prepare arguments for Python script
   const pythonArgs = [
     path.join(__dirname, 'pandasai_runner.py'),
     query,
-    filePath || 'none',
+    // A registered dataset is read from the registry: no upload, no parsing
+    ...(filePaths.length ? filePaths : [datasetId || 'none']),
     '--model-name', modelNameToUse,
     '--preference', preference || 'default',
     '--api-key', activeConfig.apiKey,
-    '--api-base-url', activeConfig.apiBaseUrl
+    '--api-base-url', activeConfig.apiBaseUrl,
+    // The runner gives up cleanly (and removes its charts) before the kill below
+    '--deadline', String(RUNNER_DEADLINE_SECONDS),
+    // Progress events as JSON lines, the result last (a 'done' event)
+    '--stream'
   ];
   
   // Mask API key for logging
@@ -457,11 +580,57 @@ app.post('/api/generate', upload.single('csv_file'), (req, res) => {
 
   const pythonProcess = spawn('python', pythonArgs);
 
-  let scriptOutput = '';
+  // ?stream=1 (or Accept: application/x-ndjson) forwards the runner's progress events
+  // as they come; the last line is the usual response with "event": "done"
+  const streamResponse = req.query.stream === '1' || (req.get('Accept') || '').includes('application/x-ndjson');
+  const respond = (status, body) => {
+    if (!streamResponse) {
+      return res.status(status).json(body);
+    }
+    if (!res.headersSent) {
+      res.status(status).type('application/x-ndjson');
+    }
+    res.end(JSON.stringify({ event: 'done', ...body }) + '\n');
+  };
+  
+  const chartUrl = (name) => `${req.protocol}://${req.get('host')}/charts/${name}`;
+  
+  let pendingOutput = '';
+  let doneEvent = null;
   let errorLogs = '';
   
+  const handleLine = (line) => {
+    if (!line.trim()) {
+      return;
+    }
+    let event;
+    try {
+      event = JSON.parse(line);
+    } catch (e) {
+      logToFile(`Unexpected runner output: ${line.substring(0, 200)}`, 'error');
+      return;
+    }
+    if (event.event === 'done') {
+      doneEvent = event;
+      return;
+    }
+    logToFile(`Runner progress: ${event.event} after ${event.elapsed_ms} ms`);
+    if (streamResponse && !res.writableEnded) {
+      if (event.event === 'chart') {
+        event.chartUrl = chartUrl(event.chart);
+      }
+      if (!res.headersSent) {
+        res.status(200).type('application/x-ndjson');
+      }
+      res.write(JSON.stringify(event) + '\n');
+    }
+  };
+  
   pythonProcess.stdout.on('data', (data) => {
-    scriptOutput += data.toString();
+    // Parse line by line as the runner writes, instead of buffering all of stdout
+    const lines = (pendingOutput + data.toString()).split('\n');
+    pendingOutput = lines.pop();
+    lines.forEach(handleLine);
   });
   
   pythonProcess.stderr.on('data', (data) => {
@@ -475,32 +644,47 @@ app.post('/api/generate', upload.single('csv_file'), (req, res) => {
   const timeout = setTimeout(() => {
     pythonProcess.kill();
     logToFile('Python process timed out after 60 seconds', 'error');
-    return res.status(500).json({ error: '代码生成超时，请稍后重试' });
+    return respond(500, { error: '代码生成超时，请稍后重试' });
   }, 60000); // 60秒超时
   
   pythonProcess.on('close', (code) => {
     clearTimeout(timeout);
     logToFile(`Python process exited with code ${code}`);
     
-    // Clean up uploaded file
-    if (filePath && fs.existsSync(filePath)) {
-      fs.unlinkSync(filePath);
+    // Clean up uploaded files
+    filePaths.forEach(uploadedPath => {
+      if (fs.existsSync(uploadedPath)) {
+        fs.unlinkSync(uploadedPath);
+      }
+    });
+    
+    if (res.writableEnded) {
+      return; // already answered by the timeout
     }
     
+    handleLine(pendingOutput);
+    
     if (code !== 0) {
-      return res.status(500).json({ 
+      return respond(500, { 
         error: `代码生成错误: 进程退出码 ${code}` 
       });
     }
     
     try {
-      // Attempt to parse the JSON result
-      const resultObj = JSON.parse(scriptOutput);
+      if (!doneEvent) {
+        throw new Error('the runner printed no result');
+      }
+      const { event, ...resultObj } = doneEvent;
+      
+      // Per-stage timings from the runner, next to the total time logged per request
+      if (resultObj.timings) {
+        logToFile(`Runner timings: ${JSON.stringify(resultObj.timings)}, peak RSS ${resultObj.peak_rss_mb} MB`);
+      }
       
       // If the parsed object contains an error from Python, return it
       if (resultObj.error) {
         logToFile(`Error from Python: ${resultObj.error}`, 'error');
-        return res.status(500).json({ 
+        return respond(500, { 
           error: resultObj.error
         });
       }
@@ -554,20 +738,23 @@ plt.show()`;
       history.unshift(resultObj);
       saveHistory(history);
         
-      // Check for new chart file
-      latestChartFile = findLatestChartFile();
-      if (latestChartFile) {
-        logToFile(`New chart file detected: ${latestChartFile}`);
+      // The runner names the exact chart this request produced (see chart_store.py)
+      if (resultObj.chart) {
+        latestChartFile = resultObj.chart;
+        logToFile(`Chart for this request: ${latestChartFile}`);
         
         // 添加图表URL到响应中
-        resultObj.chartUrl = `${req.protocol}://${req.get('host')}/charts/${latestChartFile}`;
+        resultObj.chartUrl = chartUrl(resultObj.chart);
+        if (resultObj.chart_thumbnail) {
+          resultObj.thumbnailUrl = chartUrl(resultObj.chart_thumbnail);
+        }
       }
       
-      res.json(resultObj);
+      respond(200, resultObj);
     } catch (e) {
       logToFile(`Error parsing result: ${e.message}`, 'error');
-      logToFile(`Raw result was: ${scriptOutput.substring(0, 200)}...`, 'error');
-      res.status(500).json({ 
+      logToFile(`Last runner output was: ${pendingOutput.substring(0, 200)}...`, 'error');
+      respond(500, { 
         error: `解析结果错误: ${e.message}`
       });
     }
@@ -624,7 +811,7 @@ app.post('/api/clear_history', (req, res) => {
 
 app.get('/api/supported_formats', (req, res) => {
   // List of supported file formats
-  const formats = ['csv', 'xlsx', 'xls', 'json', 'parquet', 'feather', 'pickle', 'pkl'];
+  const formats = ['csv', 'xlsx', 'xls', 'json', 'jsonl', 'ndjson', 'parquet', 'feather', 'arrow', 'pickle', 'pkl'];
   res.json(formats);
 });
 
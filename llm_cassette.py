@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Record/replay cassette for LLM calls.
+
+In 'record' mode every completion PooledLLM receives is appended to a JSON
+Lines cassette file, keyed by a fingerprint of the model and the prompt
+messages. In 'replay' mode completions are served from the cassette without
+any network call (a prompt that was never recorded is an error); 'auto'
+replays what it has and records the rest. Replays take no time unless the
+recorded latency is simulated.
+
+This makes reruns of the runner and the helper deterministic and free, so the
+pandas and chart side can be profiled alone and production incidents can be
+replayed offline from a recorded cassette.
+
+The cassette is chosen with LLM_CASSETTE (path), LLM_CASSETTE_MODE and
+LLM_CASSETTE_SIMULATE_LATENCY, or with configure() (the runner's --cassette).
+"""
+
+import os
+import sys
+import re
+import json
+import time
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent recorders may interleave lines
+    fcntl = None
+
+MODES = ('record', 'replay', 'auto')
+CASSETTE_PATH = os.getenv("LLM_CASSETTE", "")
+CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "replay")
+SIMULATE_LATENCY = os.getenv("LLM_CASSETTE_SIMULATE_LATENCY", "").lower() in ("1", "true", "yes")
+
+# PandasAI fills the sample rows of each <dataframe> block with randomly drawn
+# values, so fingerprints keep only the shape and header line of the block
+SAMPLE_ROWS_PATTERN = re.compile(r"(<dataframe[^>]*>\ndfs\[\d+\]:\d+x\d+\n[^\n]*\n).*?(</dataframe>)", re.S)
+
+
+def debug_print(*args, **kwargs):
+    """Print debug messages to stderr instead of stdout"""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+class CassetteMiss(Exception):
+    """Replay mode got a prompt the cassette has no recording for"""
+
+
+def fingerprint(model, messages):
+    """Stable hash of the model and the role/content of each prompt message (sample rows left out)"""
+    payload = {
+        'model': model,
+        'messages': [{'role': m.get('role'), 'content': SAMPLE_ROWS_PATTERN.sub(r"\1\2", m.get('content') or '')}
+                     for m in messages],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """Recorded completions of one cassette file, by prompt fingerprint"""
+
+    def __init__(self, path, mode=CASSETTE_MODE, simulate_latency=SIMULATE_LATENCY):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}. Choose from: {', '.join(MODES)}")
+        self.path = path
+        self.mode = mode
+        self.simulate_latency = simulate_latency
+        self._entries = {}  # fingerprint -> recordings, oldest first
+        self._served = {}   # fingerprint -> replays so far
+        self._lock = threading.Lock()
+        self._load()
+
+    def lookup(self, key):
+        """
+        The recording to replay for a fingerprint, or None. A prompt recorded several
+        times replays its recordings in order, then keeps repeating the last one.
+        """
+        with self._lock:
+            recordings = self._entries.get(key)
+            if not recordings:
+                return None
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            return recordings[min(served, len(recordings) - 1)]
+
+    def record(self, key, model, messages, response, latency_ms, usage=None):
+        entry = {
+            'fingerprint': key,
+            'model': model,
+            'messages': messages,
+            'response': response,
+            'latency_ms': latency_ms,
+            'usage': usage or {},
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(line)
+        return entry
+
+    def info(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'mode': self.mode,
+                'prompts': len(self._entries),
+                'recordings': sum(len(r) for r in self._entries.values()),
+                'simulate_latency': self.simulate_latency,
+            }
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a torn line from a crashed recorder
+                    # Keyed afresh, so older cassettes follow changes to the fingerprint rules
+                    key = fingerprint(entry.get('model'), entry.get('messages') or [])
+                    self._entries.setdefault(key, []).append(entry)
+        except FileNotFoundError:
+            if self.mode == 'replay':
+                debug_print(f"LLM cassette {self.path} does not exist, every call will miss")
+
+
+_default_cassette = None
+_configured = False
+_default_lock = threading.Lock()
+
+
+def get_cassette():
+    """The process-wide cassette (from LLM_CASSETTE unless configure() was called), or None"""
+    global _default_cassette, _configured
+    with _default_lock:
+        if not _configured:
+            _default_cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE, SIMULATE_LATENCY) if CASSETTE_PATH else None
+            _configured = True
+        return _default_cassette
+
+
+def configure(path, mode=CASSETTE_MODE, simulate_latency=SIMULATE_LATENCY):
+    """
+    Use the cassette at path (None turns the cassette off) for this process and,
+    through the environment, for worker processes it starts.
+    """
+    global _default_cassette, _configured
+    with _default_lock:
+        _default_cassette = Cassette(path, mode, simulate_latency) if path else None
+        _configured = True
+    if path:
+        os.environ.update(LLM_CASSETTE=path, LLM_CASSETTE_MODE=mode,
+                          LLM_CASSETTE_SIMULATE_LATENCY="1" if simulate_latency else "")
+    else:
+        os.environ.pop("LLM_CASSETTE", None)
+    return _default_cassette
+
+
+def replaying():
+    """True when LLM calls are served from a cassette only (no API key needed)"""
+    cassette = get_cassette()
+    return cassette is not None and cassette.mode == 'replay'
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+"""
+Shared client layer for the OpenAI-compatible (DeepSeek) endpoint.
+
+PooledLLM is a drop-in replacement for PandasAI's LocalLLM:
+
+- one keep-alive connection pool per (base URL, API key) per process, so
+  --serve workers, batch queries and repeated calls skip the TCP/TLS handshake
+- exponential-backoff retries on 429, 5xx and connection errors
+- a per-call deadline (default 50s) that stays below the Node backend's 60s kill
+- optional hedging: when an attempt is still running after LLM_HEDGE_AFTER_SECONDS
+  a second identical request is sent and whichever answers first wins
+- latency, attempts and token usage of every call, for the runner's result;
+  prompt and completion are also counted locally (prompt_budget.count_tokens)
+  since some compatible endpoints report no usage
+- an optional record/replay cassette (llm_cassette.py) that serves recorded
+  completions without network calls
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+import httpx
+import openai
+from openai import OpenAI
+from pandasai.llm.local_llm import LocalLLM
+
+import prompt_budget
+import llm_cassette
+
+DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "50"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.5"))
+# 0 disables hedging
+HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+POOL_CONNECTIONS = int(os.getenv("LLM_POOL_CONNECTIONS", "10"))
+KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+USAGE_FIELDS = ('prompt_tokens', 'completion_tokens', 'total_tokens')
+# Counted with the local tokenizer
+COUNTED_FIELDS = ('counted_prompt_tokens', 'counted_completion_tokens')
+
+
+def debug_print(*args, **kwargs):
+    """Print debug messages to stderr instead of stdout"""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+class LLMDeadlineError(Exception):
+    """The call did not succeed within its deadline"""
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_base, api_key):
+    """Process-wide OpenAI client with a keep-alive connection pool for this endpoint"""
+    key = (api_base, api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=POOL_CONNECTIONS, max_keepalive_connections=POOL_CONNECTIONS,
+                                    keepalive_expiry=KEEPALIVE_SECONDS),
+                timeout=DEADLINE_SECONDS,
+            )
+            # Retries are handled here, so they count against our deadline
+            client = OpenAI(base_url=api_base, api_key=api_key, max_retries=0, http_client=http_client)
+            _clients[key] = client
+        return client
+
+
+def run_in_thread(func, **kwargs):
+    """Future for func(**kwargs) run on a daemon thread, so a losing hedge never delays exit"""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(func(**kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def is_retryable(error):
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRY_STATUSES
+
+
+def summarize_calls(calls):
+    """Totals over a list of call records, plus the records themselves"""
+    summary = {'calls': len(calls), 'latency_ms': round(sum(c['latency_ms'] for c in calls), 1)}
+    for field in USAGE_FIELDS + COUNTED_FIELDS:
+        values = [c[field] for c in calls if c.get(field) is not None]
+        summary[field] = sum(values) if values else None
+    summary['details'] = calls
+    return summary
+
+
+class PooledLLM(LocalLLM):
+    """LocalLLM over the shared connection pool, with retries, a deadline and optional hedging"""
+
+    def __init__(self, api_base, model="", api_key="", deadline=DEADLINE_SECONDS, max_retries=MAX_RETRIES,
+                 backoff=RETRY_BACKOFF_SECONDS, hedge_after=HEDGE_AFTER_SECONDS, cassette=None, **kwargs):
+        if not api_key:
+            api_key = "dummy"
+
+        self.model = model
+        self.client = get_client(api_base, api_key).chat.completions
+        self._invocation_params = kwargs
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        # The process-wide cassette unless one is given
+        self.cassette = cassette if cassette is not None else llm_cassette.get_cassette()
+        self.calls = []
+
+    def chat_completion(self, value, memory):
+        messages = memory.to_openai_messages() if memory else []
+
+        # adding current prompt as latest query message
+        messages.append(
+            {
+                "role": "user",
+                "content": value,
+            }
+        )
+
+        params = {"model": self.model, "messages": messages, **self._invocation_params}
+        cassette = self.cassette
+        if cassette is None:
+            return self._create(params).choices[0].message.content
+
+        key = llm_cassette.fingerprint(self.model, messages)
+        if cassette.mode != 'record':
+            entry = cassette.lookup(key)
+            if entry is not None:
+                return self._replay(entry, messages)
+            if cassette.mode == 'replay':
+                raise llm_cassette.CassetteMiss(f"No recording for this prompt in {cassette.path} ({key[:12]})")
+
+        content = self._create(params).choices[0].message.content
+        record = self.calls[-1]
+        record['cassette'] = 'recorded'
+        cassette.record(key, self.model, messages, content, record['latency_ms'],
+                        {field: record.get(field) for field in USAGE_FIELDS})
+        return content
+
+    def take_calls(self):
+        """Call records since the last take_calls(), oldest first"""
+        calls, self.calls = self.calls, []
+        return calls
+
+    def _replay(self, entry, messages):
+        """A recorded completion, after the recorded latency if it is simulated"""
+        start = time.monotonic()
+        if self.cassette.simulate_latency:
+            time.sleep(entry['latency_ms'] / 1000)
+        record = {
+            'attempts': 0,
+            'retries': 0,
+            'hedged': False,
+            'cassette': 'replayed',
+            'latency_ms': round((time.monotonic() - start) * 1000, 1),
+            'counted_prompt_tokens': sum(prompt_budget.count_tokens(m.get('content')) for m in messages),
+            'counted_completion_tokens': prompt_budget.count_tokens(entry['response']),
+        }
+        for field in USAGE_FIELDS:
+            record[field] = entry['usage'].get(field)
+        self.calls.append(record)
+        return entry['response']
+
+    def _create(self, params):
+        start = time.monotonic()
+        deadline_at = start + self.deadline
+        record = {'attempts': 0, 'retries': 0, 'hedged': False,
+                  'counted_prompt_tokens': sum(prompt_budget.count_tokens(m.get('content'))
+                                               for m in params.get('messages', []))}
+        try:
+            for retry in range(self.max_retries + 1):
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    raise LLMDeadlineError(f"LLM call exceeded the {self.deadline:g}s deadline")
+                record['retries'] = retry
+                try:
+                    response = self._attempt(params, remaining, record)
+                    break
+                except Exception as e:
+                    if isinstance(e, openai.APITimeoutError) and time.monotonic() >= deadline_at - 0.05:
+                        raise LLMDeadlineError(f"LLM call exceeded the {self.deadline:g}s deadline") from e
+                    if not is_retryable(e) or retry == self.max_retries:
+                        raise
+                    delay = self._retry_delay(e, retry)
+                    if time.monotonic() + delay >= deadline_at:
+                        raise
+                    debug_print(f"LLM call failed ({str(e)}), retrying in {delay:.2f}s")
+                    time.sleep(delay)
+        except Exception as e:
+            record['error'] = str(e)
+            raise
+        finally:
+            record['latency_ms'] = round((time.monotonic() - start) * 1000, 1)
+            self.calls.append(record)
+
+        usage = getattr(response, 'usage', None)
+        for field in USAGE_FIELDS:
+            record[field] = getattr(usage, field, None)
+        record['counted_completion_tokens'] = prompt_budget.count_tokens(response.choices[0].message.content)
+        return response
+
+    def _retry_delay(self, error, retry):
+        # Honour Retry-After on 429s, otherwise exponential backoff with jitter
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            if retry_after is not None:
+                return float(retry_after)
+        except ValueError:
+            pass
+        return self.backoff * (2 ** retry) * (0.5 + random.random())
+
+    def _attempt(self, params, timeout, record):
+        """One request, or a primary plus a hedge when the primary is slow"""
+        if self.hedge_after <= 0 or self.hedge_after >= timeout:
+            record['attempts'] += 1
+            return self.client.create(timeout=timeout, **params)
+
+        started = time.monotonic()
+        record['attempts'] += 1
+        pending = {run_in_thread(self.client.create, timeout=timeout, **params)}
+        done, _ = wait(pending, timeout=self.hedge_after)
+        if not done:
+            debug_print(f"LLM call slower than {self.hedge_after:g}s, sending hedge request")
+            record['attempts'] += 1
+            record['hedged'] = True
+            hedge_timeout = timeout - (time.monotonic() - started)
+            pending.add(run_in_thread(self.client.create, timeout=hedge_timeout, **params))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The loser finishes in the background and returns its connection to the pool
+                    return future.result()
+                error = future.exception()
+        raise error
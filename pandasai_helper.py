@@ -6,25 +6,35 @@ PandasAI 数据处理助手
 
 使用方法:
 python pandasai_helper.py -f 数据文件.csv -q "你的自然语言查询"
+python pandasai_helper.py -f 数据文件.csv -q "你的自然语言查询" --cassette llm.jsonl --cassette-mode replay
+
+批量模式 (目录或通配符下的所有文件 × 查询文件中的所有查询):
+python pandasai_helper.py --batch data/ --queries queries.txt
+python pandasai_helper.py --batch "reports/*.csv" --queries queries.txt --workers 4 --format both
 """
 
 import os
 import sys
+import glob
+import json
+import time
 import argparse
-import pandas as pd
-import matplotlib.pyplot as plt
-from pandasai import Agent
-from pandasai.llm.local_llm import LocalLLM
 from dotenv import load_dotenv
-import matplotlib
+import llm_cassette
 
-# 设置中文字体支持
-matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'Microsoft YaHei', 'WenQuanYi Micro Hei']
-matplotlib.rcParams['axes.unicode_minus'] = False  # 正确显示负号
+# pandas、PandasAI和matplotlib在通过参数检查后才导入（见load_pandasai），
+# 缺少API密钥等错误可以立即返回
 
 # 加载环境变量
 load_dotenv()
 
+# 批量模式的进程数（默认为CPU核数）
+BATCH_WORKERS = int(os.getenv("HELPER_BATCH_WORKERS", "0")) or os.cpu_count() or 1
+BATCH_MODEL = "deepseek-chat"
+BATCH_FORMATS = ('jsonl', 'parquet', 'both')
+# Parquet输出中每个回答的字段（完整结果在JSONL中）
+PARQUET_FIELDS = ('index', 'id', 'query', 'source', 'error', 'code', 'chart', 'tokens', 'result_cache')
+
 # 定义颜色配置
 COLORS = {
     'primary': '#3498db',
@@ -35,6 +45,18 @@ COLORS = {
     'info': '#1abc9c'
 }
 
+def load_pandasai():
+    """导入pandas和PandasAI并设置matplotlib中文字体，返回 (pd, Agent, PooledLLM)"""
+    import matplotlib
+    # 设置中文字体支持
+    matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'Microsoft YaHei', 'WenQuanYi Micro Hei']
+    matplotlib.rcParams['axes.unicode_minus'] = False  # 正确显示负号
+
+    import pandas as pd
+    from pandasai import Agent
+    from llm_client import PooledLLM
+    return pd, Agent, PooledLLM
+
 def setup_directories():
     """创建必要的目录"""
     directories = ["charts", "output", "logs"]
@@ -54,25 +76,40 @@ def print_colored(text, color='primary'):
     }
     print(f"{colors.get(color, colors['primary'])}{text}{colors['end']}")
 
-def process_csv(file_path, query, output_dir="output", charts_dir="charts"):
-    """处理CSV文件并执行查询"""
-    
-    if not os.path.exists(file_path):
-        print_colored(f"错误: 文件 '{file_path}' 不存在", 'error')
-        return False
-    
+def api_settings():
+    """从环境变量读取 (API_KEY, API_BASE)；未配置时打印错误并返回None"""
     API_KEY = os.getenv("DEEPSEEK_API_KEY")
     API_BASE = os.getenv("DEEPSEEK_API_BASE")
     
+    # 回放录制的LLM响应时不访问网络，不需要API密钥
+    if llm_cassette.replaying():
+        API_KEY = API_KEY or "cassette-replay"
+        API_BASE = API_BASE or "http://replay.invalid/v1"
+    
     if not API_KEY or API_KEY == "your-deepseek-api-key":
         print_colored("错误: 请在.env文件中设置DEEPSEEK_API_KEY", 'error')
-        return False
+        return None
         
     if not API_BASE:
         print_colored("错误: 请在.env文件中设置DEEPSEEK_API_BASE", 'error')
+        return None
+    return API_KEY, API_BASE
+
+def process_csv(file_path, query, output_dir="output", charts_dir="charts"):
+    """处理CSV文件并执行查询"""
+    
+    if not os.path.exists(file_path):
+        print_colored(f"错误: 文件 '{file_path}' 不存在", 'error')
         return False
+    
+    settings = api_settings()
+    if settings is None:
+        return False
+    API_KEY, API_BASE = settings
 
     try:
+        pd, Agent, PooledLLM = load_pandasai()
+
         # 读取CSV文件
         print_colored(f"正在读取文件: {file_path}", 'info')
         df = pd.read_csv(file_path)
@@ -81,12 +118,19 @@ def process_csv(file_path, query, output_dir="output", charts_dir="charts"):
         # 显示数据概览
         print_colored("\n数据概览:", 'primary')
         print(df.head(5))
-        print_colored("\n数据类型:", 'primary')
-        print(df.dtypes)
+        # 按列统计（按文件内容缓存，再次分析同一文件时不重新计算，见dataset_profile.py）
+        import dataset_cache
+        import dataset_profile
+        from data_loader import table_name
+        profile, _ = dataset_profile.get_cache().profile(df, dataset_cache.file_digest(file_path), table_name(file_path),
+                                                         file_path=file_path)
+        print_colored("\n数据画像:", 'primary')
+        for line in dataset_profile.describe_columns(profile):
+            print(line)
         
-        # 初始化LLM
+        # 初始化LLM（连接复用、失败重试和超时见llm_client.py）
         print_colored("\n初始化PandasAI...", 'info')
-        llm = LocalLLM(
+        llm = PooledLLM(
             api_key=API_KEY,
             api_base=API_BASE,
             model="deepseek-chat",
@@ -116,6 +160,12 @@ def process_csv(file_path, query, output_dir="output", charts_dir="charts"):
         print_colored("\n查询结果:", 'secondary')
         print(response)
         
+        # 显示LLM调用耗时和token用量
+        for call in llm.take_calls():
+            source = "回放" if call.get('cassette') == 'replayed' else f"尝试{call['attempts']}次"
+            print_colored(f"LLM调用: {call['latency_ms']}ms, {source}, "
+                          f"tokens: {call.get('total_tokens')}", 'info')
+        
         # 保存结果
         output_path = os.path.join(output_dir, "query_result.txt")
         with open(output_path, "w") as f:
@@ -131,18 +181,194 @@ def process_csv(file_path, query, output_dir="output", charts_dir="charts"):
         print(traceback.format_exc())
         return False
 
+def find_batch_files(pattern):
+    """批量模式的数据文件：目录下的所有CSV文件，或通配符匹配的文件，按文件名排序"""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.csv")
+    return sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+
+def output_names(files):
+    """每个数据文件的输出文件名；不同目录下的同名文件依次加 _2、_3 等后缀，并跳过已被占用的名字"""
+    from data_loader import table_name
+    names, used, counters = {}, set(), {}
+    for path in files:
+        base = name = table_name(path)
+        while name in used:
+            counters[base] = counters.get(base, 1) + 1
+            name = f"{base}_{counters[base]}"
+        used.add(name)
+        names[path] = name
+    return names
+
+def read_queries(path):
+    """查询文件：每行一个查询，纯文本或与 pandasai_runner.py --batch 相同的JSON行；#开头的行为注释"""
+    import pandasai_runner
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+    return pandasai_runner.read_batch_queries(line if line[0] in '{"' else json.dumps(line) for line in lines)
+
+def _init_batch_worker(cassette, charts_dir):
+    """批量模式worker进程的初始化：每个进程只导入一次pandas/PandasAI"""
+    if cassette:
+        llm_cassette.configure(*cassette)
+    import pandasai_runner
+    pandasai_runner.CHARTS_DIR = charts_dir
+    pandasai_runner.preload()
+
+def _answer_file(file_path, requests, api_key, api_base, concurrency, use_cache):
+    """在worker进程中加载一次文件并回答所有查询，返回 (按输入顺序的结果, 耗时毫秒)"""
+    import pandasai_runner
+    start = time.perf_counter()
+    results = pandasai_runner.run_batch(file_path, requests, cli_model_name=BATCH_MODEL, cli_api_key=api_key,
+                                        cli_api_base_url=api_base, concurrency=concurrency, use_cache=use_cache)
+    return results, round((time.perf_counter() - start) * 1000, 1)
+
+def write_file_results(run_dir, name, file_path, results, output_format):
+    """写入一个数据文件的结果：<name>.jsonl（完整结果）和/或 <name>.parquet（每个回答一行），返回写入的路径"""
+    paths = []
+    if output_format in ('jsonl', 'both'):
+        path = os.path.join(run_dir, f"{name}.jsonl")
+        with open(path, 'w', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(dict(result, file=file_path), ensure_ascii=False, default=str) + "\n")
+        paths.append(path)
+    if output_format in ('parquet', 'both'):
+        import pandas as pd
+        rows = [dict({field: result.get(field) for field in PARQUET_FIELDS}, file=file_path,
+                     id=None if result.get('id') is None else str(result['id']),
+                     total_ms=(result.get('timings') or {}).get('total_ms'),
+                     llm_ms=(result.get('timings') or {}).get('llm_ms')) for result in results]
+        path = os.path.join(run_dir, f"{name}.parquet")
+        pd.DataFrame(rows).to_parquet(path, index=False)
+        paths.append(path)
+    return paths
+
+def run_batch_mode(pattern, queries_path, output_dir="output", charts_dir="charts", workers=BATCH_WORKERS,
+                   concurrency=None, output_format='jsonl', use_cache=True, cassette=None):
+    """
+    批量模式：对每个数据文件回答查询文件中的所有查询。文件分配到进程池（默认每个CPU核一个进程），
+    每个进程只加载一次文件，文件内的LLM调用并发进行（见pandasai_runner.run_batch）。
+    结果写入本次运行的目录 output/batch-<时间>-<pid>/，每个文件一个JSONL和/或Parquet文件，
+    另有 summary.json 记录吞吐量和失败的查询。返回summary，参数错误时返回None。
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    import multiprocessing
+    import pandasai_runner
+    
+    files = find_batch_files(pattern)
+    if not files:
+        print_colored(f"错误: '{pattern}' 下没有找到数据文件", 'error')
+        return None
+    if not os.path.exists(queries_path):
+        print_colored(f"错误: 查询文件 '{queries_path}' 不存在", 'error')
+        return None
+    requests = read_queries(queries_path)
+    if not requests:
+        print_colored(f"错误: 查询文件 '{queries_path}' 中没有查询", 'error')
+        return None
+    settings = api_settings()
+    if settings is None:
+        return None
+    
+    run_dir = os.path.join(output_dir, f"batch-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    os.makedirs(run_dir, exist_ok=True)
+    names = output_names(files)
+    
+    workers = max(1, min(workers, len(files)))
+    concurrency = concurrency or pandasai_runner.BATCH_CONCURRENCY
+    print_colored(f"批量模式: {len(files)}个文件 × {len(requests)}个查询, {workers}个进程, "
+                  f"每个文件{concurrency}个并发LLM调用", 'info')
+    
+    start = time.perf_counter()
+    per_file = []
+    failures = []
+    # 与常驻worker池一样使用spawn：进程不继承父进程的线程和锁
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_batch_worker, initargs=(cassette, os.path.abspath(charts_dir))) as executor:
+        # 大文件先开始，避免最后只剩一个大文件在跑
+        futures = {
+            executor.submit(_answer_file, path, requests, settings[0], settings[1], concurrency, use_cache): path
+            for path in sorted(files, key=os.path.getsize, reverse=True)
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results, elapsed_ms = future.result()
+            except Exception as e:
+                # worker进程异常退出：该文件的所有查询都记为失败
+                results = [{'index': index, 'id': request.get('id'), 'query': request.get('query'),
+                            'error': f"Worker error: {str(e)}"} for index, request in enumerate(requests)]
+                elapsed_ms = None
+            outputs = write_file_results(run_dir, names[path], path, results, output_format)
+            failed = [result for result in results if result.get('error')]
+            failures.extend({'file': path, 'index': result.get('index'), 'query': result.get('query'),
+                             'error': result['error']} for result in failed)
+            per_file.append({'file': path, 'outputs': outputs, 'answers': len(results), 'failed': len(failed),
+                             'wall_ms': elapsed_ms})
+            print_colored(f"{path}: {len(results) - len(failed)}/{len(results)} 成功"
+                          f"{f', {elapsed_ms / 1000:.1f}s' if elapsed_ms is not None else ''}",
+                          'error' if failed else 'secondary')
+    wall_s = time.perf_counter() - start
+    
+    answers = sum(entry['answers'] for entry in per_file)
+    summary = {
+        'run_dir': run_dir,
+        'files': len(files),
+        'queries': len(requests),
+        'answers': answers,
+        'succeeded': answers - len(failures),
+        'failed': len(failures),
+        'workers': workers,
+        'concurrency': concurrency,
+        'wall_s': round(wall_s, 2),
+        'answers_per_s': round(answers / wall_s, 2) if wall_s else None,
+        'per_file': sorted(per_file, key=lambda entry: entry['file']),
+        'failures': failures,
+    }
+    with open(os.path.join(run_dir, "summary.json"), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    
+    print_colored(f"\n{summary['succeeded']}/{answers} 个查询成功, 用时{summary['wall_s']}s "
+                  f"({summary['answers_per_s']} 个/秒)", 'error' if failures else 'secondary')
+    print_colored(f"结果已保存至: {run_dir}", 'secondary')
+    return summary
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="PandasAI 数据处理助手")
-    parser.add_argument("-f", "--file", help="CSV数据文件路径", required=True)
-    parser.add_argument("-q", "--query", help="自然语言查询", required=True)
+    parser.add_argument("-f", "--file", help="CSV数据文件路径")
+    parser.add_argument("-q", "--query", help="自然语言查询")
     parser.add_argument("-o", "--output", help="输出目录", default="output")
     parser.add_argument("-c", "--charts", help="图表输出目录", default="charts")
+    parser.add_argument("--cassette", help="LLM响应录制文件（JSONL）")
+    parser.add_argument("--cassette-mode", choices=list(llm_cassette.MODES), default=llm_cassette.CASSETTE_MODE,
+                        help="record: 调用LLM并录制；replay: 只回放录制的响应；auto: 有录制就回放，否则调用并录制")
+    parser.add_argument("--replay-latency", action="store_true", help="回放时按录制时的耗时等待")
+    parser.add_argument("--batch", metavar="DIR_OR_GLOB", help="批量模式：目录（其中的所有CSV文件）或通配符匹配的数据文件")
+    parser.add_argument("--queries", help="批量模式的查询文件，每行一个查询（纯文本或JSON行）")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="批量模式的进程数，默认为CPU核数")
+    parser.add_argument("--concurrency", type=int, help="批量模式中每个文件同时进行的LLM调用数（默认BATCH_CONCURRENCY）")
+    parser.add_argument("--format", choices=list(BATCH_FORMATS), default="jsonl", help="批量模式的结果格式")
+    parser.add_argument("--no-cache", action="store_true", help="批量模式中忽略结果缓存，总是调用LLM")
     
     args = parser.parse_args()
+    if args.batch is None and not (args.file and args.query):
+        parser.error("需要 -f/--file 和 -q/--query，或批量模式的 --batch 和 --queries")
+    if args.batch is not None and not args.queries:
+        parser.error("--batch 需要 --queries")
+    
+    cassette = None
+    if args.cassette:
+        cassette = (args.cassette, args.cassette_mode, args.replay_latency or llm_cassette.SIMULATE_LATENCY)
+        llm_cassette.configure(*cassette)
     
     setup_directories()
     
+    if args.batch is not None:
+        summary = run_batch_mode(args.batch, args.queries, args.output, args.charts, args.workers, args.concurrency,
+                                 args.format, not args.no_cache, cassette)
+        sys.exit(0 if summary is not None and not summary['failed'] else 1)
+    
     print_colored("=" * 60, 'info')
     print_colored("PandasAI 数据处理助手", 'primary')
     print_colored("=" * 60, 'info')
@@ -7,170 +7,244 @@ This script is called by the Node.js backend.
 import os
 import sys
 import json
-import pandas as pd
+import time
 import uuid
-import shutil
+import argparse
+import threading
 from datetime import datetime
+from contextlib import contextmanager, nullcontext
 from dotenv import load_dotenv
-from pandasai import Agent
-from pandasai.llm.local_llm import LocalLLM
-import argparse
+import result_cache
+import chart_store
+import code_cleaner
+import prompt_budget
+import profiling
+import llm_cassette
+import columnar
+import excel_reader
+import dataset_registry
+import sessions
+import dataset_profile
+import fast_path
+import cancellation
+
+# pandas, PandasAI and matplotlib are imported on first use (see load_pandasai),
+# so error paths such as a missing API key never pay for them
 
 # Redirect print to stderr to avoid interfering with JSON output
 def debug_print(*args, **kwargs):
     """Print debug messages to stderr instead of stdout"""
     print(*args, file=sys.stderr, **kwargs)
 
-# Use non-interactive matplotlib backend
-import matplotlib
-matplotlib.use('Agg')
-
-# Configure matplotlib for Chinese text support
-matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'Microsoft YaHei', 'WenQuanYi Micro Hei']
-matplotlib.rcParams['axes.unicode_minus'] = False
-
 # Load environment variables
 load_dotenv(override=True)
 # API_KEY = os.getenv("DEEPSEEK_API_KEY") # Will be set based on args or env
 # API_BASE = os.getenv("DEEPSEEK_API_BASE") # Will be set based on args or env
 
+def _pandas_reader(name, **kwargs):
+    """File reader that imports pandas when it is first called"""
+    def read(file_path):
+        import pandas as pd
+        return getattr(pd, name)(file_path, **kwargs)
+    return read
+
 # Dictionary of file readers for different formats
 FILE_READERS = {
-    'csv': pd.read_csv,
-    'xlsx': pd.read_excel,
-    'xls': pd.read_excel,
-    'json': pd.read_json,
-    'parquet': pd.read_parquet,
-    'feather': pd.read_feather,
-    'pickle': lambda f: pd.read_pickle(f),
-    'pkl': lambda f: pd.read_pickle(f)
+    'csv': _pandas_reader('read_csv'),
+    'xlsx': excel_reader.read_sheet,
+    'xls': excel_reader.read_sheet,
+    'json': _pandas_reader('read_json'),
+    'parquet': _pandas_reader('read_parquet'),
+    'feather': _pandas_reader('read_feather'),
+    'arrow': columnar.read_arrow,
+    'jsonl': _pandas_reader('read_json', lines=True),
+    'ndjson': _pandas_reader('read_json', lines=True),
+    'pickle': _pandas_reader('read_pickle'),
+    'pkl': _pandas_reader('read_pickle')
 }
 
-# Chart path
+# Modules reported by --import-profile, in import order
+PROFILED_IMPORTS = ('pandasai_runner', 'numpy', 'pandas', 'pyarrow', 'matplotlib.pyplot', 'openai', 'pandasai', 'pandasai.llm.local_llm', 'llm_client')
+
+_matplotlib_ready = False
+
+def setup_matplotlib():
+    """Select the non-interactive backend and Chinese fonts, once per process"""
+    global _matplotlib_ready
+    if _matplotlib_ready:
+        return
+    # Use non-interactive matplotlib backend
+    import matplotlib
+    matplotlib.use('Agg')
+    
+    # Configure matplotlib for Chinese text support
+    matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'Microsoft YaHei', 'WenQuanYi Micro Hei']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    _matplotlib_ready = True
+
+def load_pandasai():
+    """Import PandasAI on first use; returns (Agent, PooledLLM)"""
+    # PandasAI imports pyplot itself, so the backend has to be chosen first
+    setup_matplotlib()
+    from pandasai import Agent
+    from llm_client import PooledLLM
+    return Agent, PooledLLM
+
+def preload():
+    """Import everything a request needs up front (used by warm --serve workers)"""
+    load_pandasai()
+    import dataset_cache  # noqa: F401
+    import data_loader  # noqa: F401
+
+def import_profile(modules=PROFILED_IMPORTS):
+    """
+    Cold import time of each module, measured in a fresh interpreter with -X importtime.
+    Each module's time only counts what earlier modules in the list did not already import.
+    """
+    import subprocess
+    code = "; ".join(f"import {module}" for module in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    top_level = []
+    slowest = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = [part for part in line.replace("import time:", "|", 1).split("|")]
+        entry = {'module': name.strip(), 'self_ms': int(self_us) / 1000.0, 'cumulative_ms': int(cumulative_us) / 1000.0}
+        slowest.append(entry)
+        if not name.startswith("   "):  # nesting is shown by two extra spaces per level
+            top_level.append(entry)
+    slowest.sort(key=lambda e: e['self_ms'], reverse=True)
+    return {
+        'python': sys.version.split()[0],
+        'total_ms': round(sum(e['cumulative_ms'] for e in top_level), 1),
+        'modules': [e for e in top_level if e['module'] in modules],
+        'slowest_self': slowest[:15],
+        'error': proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 else None
+    }
+
+# PandasAI's own cache is a single DuckDB file that only one process can lock;
+# the worker pool (pandasai_server.py) turns it off in its workers
+AGENT_CACHE_ENABLED = True
+
+# What the prompt shows of each table: 'profile' (column statistics, see dataset_profile.py)
+# or 'rows' (PandasAI's sample rows only)
+PROMPT_CONTEXTS = ('profile', 'rows')
+PROMPT_CONTEXT = os.getenv("PROMPT_CONTEXT", "profile")
+
+# Queries answered at once by --batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Chart path (created when a request first needs it)
 CHARTS_DIR = os.path.join(os.getcwd(), 'charts')
-if not os.path.exists(CHARTS_DIR):
-    os.makedirs(CHARTS_DIR, exist_ok=True)
 
 def clean_pandasai_code(code, preference='default'):
     """
     Clean PandasAI generated code by removing result formatting parts.
+    See code_cleaner; identical code is cleaned only once per process.
     """
-    if not code:
-        return code
-    
-    # Standard code cleaning
-    if "result = {" in code:
-        lines = code.split("\n")
-        result_line_index = -1
-        
-        # Find the line with result dictionary
-        for i, line in enumerate(lines):
-            if "result = {" in line:
-                result_line_index = i
-                break
-        
-        if result_line_index >= 0:
-            # Keep code before result line
-            cleaned_code = "\n".join(lines[:result_line_index])
-            
-            # If the last line is data processing logic, add print statement
-            last_line = cleaned_code.strip().split("\n")[-1]
-            
-            # Check if the last line contains a variable assignment we can print
-            if "=" in last_line and not last_line.strip().startswith("#") and not any(keyword in last_line for keyword in ["if", "for", "while", "def", "class"]):
-                var_name = last_line.split("=")[0].strip()
-                if var_name and not var_name.startswith("#"):
-                    cleaned_code += f"\n\n# Print result\nprint({var_name})"
-            
-            # Add appropriate note based on preference
-            if preference == 'standard_pandas':
-                cleaned_code += "\n\n# The above is standard Pandas code that can be run directly in Python."
-            else:
-                cleaned_code += "\n\n# Note: PandasAI result formatting code has been removed.\n# Above is standard Pandas code that can be run directly in Python."
-            
-            # Ensure standard pandas imports
-            if preference == 'standard_pandas' and 'import pandas' not in cleaned_code:
-                cleaned_code = "import pandas as pd\n\n" + cleaned_code
-            
-            # Check for matplotlib code and ensure imports
-            if 'plt.' in cleaned_code and 'import matplotlib' not in cleaned_code:
-                cleaned_code = "import matplotlib.pyplot as plt\n" + cleaned_code
-            
-            return cleaned_code.strip()
-    
-    # If no result dictionary found, return original code
-    return code
-
-# Class to capture matplotlib plots
-class PlotCapture:
-    def __init__(self):
-        self.has_plot = False
-        self.chart_path = None
-    
-    def on_plot_generated(self, chart_path):
-        self.has_plot = True
-        # Copy the chart to our charts directory with a timestamped filename
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        new_filename = f"chart_{timestamp}_{unique_id}.png"
-        self.chart_path = os.path.join(CHARTS_DIR, new_filename)
-        
-        try:
-            # 确保chart_path存在且可以读取
-            if not os.path.exists(chart_path):
-                debug_print(f"Error: Source chart path does not exist: {chart_path}")
-                return
-            
-            # 使用shutil.copy2复制文件，保留元数据
-            shutil.copy2(chart_path, self.chart_path)
-            debug_print(f"Chart saved to {self.chart_path}")
-            
-            # 确认文件已成功复制
-            if not os.path.exists(self.chart_path):
-                debug_print("Error: Chart could not be copied to destination")
-                self.chart_path = None
-            else:
-                # 设置适当的文件权限
-                os.chmod(self.chart_path, 0o644)
-        except Exception as e:
-            debug_print(f"Error copying chart: {str(e)}")
-            self.chart_path = None
+    return code_cleaner.clean_code(code, preference)
+
+def store_charts(result, images):
+    """Write captured chart images to the chart store and name them in result"""
+    if not images:
+        return
+    store = chart_store.ChartStore(CHARTS_DIR)
+    entries = [store.save(image, request_id=result['request_id']) for image in images]
+    # The last saved figure is the one PandasAI returns as the plot
+    result['chart'] = entries[-1]['chart']
+    if entries[-1]['thumbnail']:
+        result['chart_thumbnail'] = entries[-1]['thumbnail']
+    if len(entries) > 1:
+        result['charts'] = [e['chart'] for e in entries]
+    debug_print(f"Generated chart: {result['chart']}{' (reused)' if entries[-1]['reused'] else ''}")
 
-def generate_pandas_code(file_path, query, cli_model_name=None, preference="default", cli_api_key=None, cli_api_base_url=None):
+def emit_event(emit, result, timer, event, **fields):
+    """Report a progress event of the request to emit (streaming output); no-op without emit"""
+    if emit is None:
+        return
+    emit({'event': event, 'request_id': result['request_id'], 'elapsed_ms': timer.elapsed_ms(), **fields})
+
+def resolve_config(cli_model_name=None, cli_api_key=None, cli_api_base_url=None):
     """
-    Generate pandas code using PandasAI.
-    Preference can be 'default' or 'standard_pandas'
+    Determine the active API key, base URL and model (CLI arguments first, then environment).
+    Returns (config, error); error is None when the configuration is usable.
     """
-    # Determine active configuration
-    active_api_key = cli_api_key if cli_api_key else os.getenv("DEEPSEEK_API_KEY")
-    active_api_base = cli_api_base_url if cli_api_base_url else os.getenv("DEEPSEEK_API_BASE")
-    active_model_name = cli_model_name if cli_model_name else "deepseek-chat" # Default if nothing is passed
+    config = {
+        'api_key': cli_api_key if cli_api_key else os.getenv("DEEPSEEK_API_KEY"),
+        'api_base': cli_api_base_url if cli_api_base_url else os.getenv("DEEPSEEK_API_BASE"),
+        'model': cli_model_name if cli_model_name else "deepseek-chat", # Default if nothing is passed
+        'source': 'cli' if cli_api_key or cli_api_base_url or cli_model_name else 'env'
+    }
+    
+    # Validate model name (can be dynamic based on provider, for now keep existing validation or make it more flexible)
+    # For now, we assume the model passed via CLI is valid for the given custom provider.
+    # If using environment variables, stick to a predefined list.
+    if not cli_model_name and config['model'] not in ["deepseek-chat", "deepseek-r1"]: # Keep old validation if using env defaults
+        return config, "Invalid environment default model name. Choose from: deepseek-chat, deepseek-r1"
+    
+    # Replaying a cassette makes no network calls, so no credentials are needed
+    if llm_cassette.replaying():
+        config['api_key'] = config['api_key'] or "cassette-replay"
+        config['api_base'] = config['api_base'] or "http://replay.invalid/v1"
+    
+    # Check API keys if they are supposed to come from env (i.e., not overridden by CLI)
+    if not config['api_key'] or not config['api_base']:
+        return config, "API key or base URL not found. Provide them via CLI arguments or environment variables."
+    
+    return config, None
 
-    result = {
+def new_result(query, config, preference):
+    """Result dict returned for every request"""
+    return {
         'timestamp': datetime.now().isoformat(),
+        'request_id': uuid.uuid4().hex,
         'code': None,
         'error': None,
         'tokens': 0,
         'query': query,
-        'model': active_model_name, # Use active model name
+        'model': config['model'], # Use active model name
         'preference': preference,
-        'config_source': 'cli' if cli_api_key or cli_api_base_url or cli_model_name else 'env'
+        'config_source': config['source']
     }
+
+def split_paths(file_path):
+    """The data files of a request: file_path is one path or a list of paths"""
+    if isinstance(file_path, (list, tuple)):
+        return [path for path in file_path if path]
+    return [file_path]
+
+def reader_for(file_ext, sheet=None):
+    """Reader for a file extension (one sheet of a workbook when sheet is given), or None if unknown"""
+    if sheet is not None:
+        return lambda file_path: excel_reader.read_sheet(file_path, sheet)
+    return FILE_READERS.get(file_ext)
+
+def load_dataset(file_path, result, load_mode="full", optimize_dtypes=True, arrow_dtypes=False):
+    """
+    Load the DataFrames for a request and record how they were loaded in result.
+    file_path may be a list of paths; several files or the sheets of a multi-sheet workbook
+    become one named table each (see load_tables). It may also be the id of an ingested
+    dataset (see ingest_dataset), whose stored tables are read instead.
+    Returns (tables, dataset_hash, load_full_frame) with tables a list of (name, df). In 'schema'
+    and 'columnar' mode the single df is only a sample and load_full_frame(code=None) returns
+    (full_df, cache_status, memory_report); otherwise it is None. A columnar file is then read
+    with just the columns code refers to (all columns without code).
+    Raises if a file cannot be read.
+    """
+    import pandas as pd
+    import dataset_cache
+    import data_loader
     
-    # Validate model name (can be dynamic based on provider, for now keep existing validation or make it more flexible)
-    # For now, we assume the model passed via CLI is valid for the given custom provider.
-    # If using environment variables, stick to a predefined list.
-    if not cli_model_name and active_model_name not in ["deepseek-chat", "deepseek-r1"]: # Keep old validation if using env defaults
-         result['error'] = f"Invalid environment default model name. Choose from: deepseek-chat, deepseek-r1"
-         return result
-    
-    # Check API keys if they are supposed to come from env (i.e., not overridden by CLI)
-    if not active_api_key or not active_api_base:
-        result['error'] = "API key or base URL not found. Provide them via CLI arguments or environment variables."
-        return result
+    paths = split_paths(file_path)
+    if len(paths) == 1 and dataset_registry.is_dataset_id(paths[0]) and not os.path.exists(paths[0]):
+        return load_registered(paths[0], result, optimize_dtypes, arrow_dtypes)
     
     # Use sample data if no file is provided
-    if file_path == 'none' or not os.path.exists(file_path):
+    if len(paths) == 1 and (paths[0] == 'none' or not os.path.exists(paths[0])):
         debug_print("Using sample dataset")
         # Create a sample dataset
         sample_df_data = {
@@ -179,130 +253,1112 @@ def generate_pandas_code(file_path, query, cli_model_name=None, preference="defa
             "Price": [5000, 3000, 2000, 1500, 500, 2500, 1800],
             "Category": ["Electronics", "Electronics", "Electronics", "Wearable", "Audio", "Gaming", "Electronics"]
         }
-        df = pd.DataFrame(sample_df_data)
+        result['load_mode'] = 'full'
+        return [('sample', pd.DataFrame(sample_df_data))], 'sample', None
+    
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"File not found: {', '.join(missing)}")
+    
+    table_list = data_loader.list_tables(paths)
+    if len(table_list) > 1:
+        # Several tables are read concurrently and in full
+        result['load_mode'] = 'full'
+        tables, dataset_hash = load_tables(table_list, result, optimize_dtypes, arrow_dtypes)
+        return tables, dataset_hash, None
+    name, file_path, _ = table_list[0]
+    
+    # Load data based on file extension
+    file_ext = data_loader.file_extension(file_path)
+    
+    reader_func = reader_for(file_ext)
+    if reader_func is not None:
+        debug_print(f"Reading file with {file_ext} format")
+    else:
+        # Default to CSV if extension not recognized
+        debug_print(f"Unknown file format '{file_ext}', trying as CSV")
+        reader_func = pd.read_csv
+    
+    load_mode = data_loader.resolve_load_mode(load_mode, file_path, file_ext)
+    result['load_mode'] = load_mode
+    if load_mode == 'columnar':
+        return load_columnar(file_path, file_ext, name, result, optimize_dtypes, arrow_dtypes)
+    if load_mode != 'schema':
+        # Same bytes as an earlier upload skip parsing entirely
+        df, cache_status, dataset_hash = dataset_cache.get_cache().load(file_path, file_ext, reader_func)
+        result['dataset_cache'] = cache_status
+        debug_print(f"Successfully loaded data: {df.shape[0]} rows, {df.shape[1]} columns (dataset cache: {cache_status})")
+        if optimize_dtypes:
+            df, result['memory'] = data_loader.optimize_dtypes(df, arrow_strings=arrow_dtypes)
+            debug_print(f"Optimized dtypes: {result['memory']['before_bytes']} -> {result['memory']['after_bytes']} bytes")
+        return [(name, df)], dataset_hash, None
+    
+    # Only the header and a bounded sample are parsed before the LLM call
+    dataset_hash = dataset_cache.file_digest(file_path)
+    sample = data_loader.read_sample(file_path, file_ext)
+    if optimize_dtypes:
+        # The prompt should show the dtypes the code will run against
+        sample, _ = data_loader.optimize_dtypes(sample, arrow_strings=arrow_dtypes)
+    debug_print(f"Loaded schema sample: {sample.shape[0]} rows, {sample.shape[1]} columns")
+    
+    def load_full_frame(code=None):
+        full_df, cache_status, _ = dataset_cache.get_cache().load(
+            file_path, file_ext, lambda path: data_loader.read_chunked(path, file_ext, sample=sample),
+            digest=dataset_hash, variant='chunked')
+        report = None
+        if optimize_dtypes:
+            full_df, report = data_loader.optimize_dtypes(full_df, arrow_strings=arrow_dtypes)
+        return full_df, cache_status, report
+    
+    return [(name, sample)], dataset_hash, load_full_frame
+
+def load_registered(dataset_id, result, optimize_dtypes=True, arrow_dtypes=False):
+    """The stored tables of an ingested dataset: no upload and no parsing"""
+    import data_loader
+    
+    tables, meta = dataset_registry.get_registry().load(dataset_id)
+    if optimize_dtypes and not meta['optimized']:
+        tables = [(name, data_loader.optimize_dtypes(df, arrow_strings=arrow_dtypes)[0]) for name, df in tables]
+    result['load_mode'] = 'full'
+    result['dataset_id'] = dataset_id
+    result['dataset_cache'] = 'registry'
+    if len(tables) > 1:
+        result['tables'] = [{k: e[k] for k in ('name', 'rows', 'columns')} for e in meta['tables']]
+    debug_print(f"Loaded dataset {dataset_id}: " + ", ".join(f"{e['name']} {e['rows']}x{e['columns']}" for e in meta['tables']))
+    return tables, meta['dataset_hash'], None
+
+def ingest_dataset(file_path, optimize_dtypes=True, arrow_dtypes=False):
+    """
+    Parse file_path (one path or a list) once and store it in the dataset registry.
+    Returns a dict with the 'dataset_id' later requests can pass in place of a file path,
+    the tables' schema and row counts, or an 'error'.
+    """
+    paths = split_paths(file_path)
+    missing = [path for path in paths if not os.path.exists(path)]
+    if not paths or missing:
+        return {'dataset_id': None, 'error': f"File not found: {', '.join(missing) or 'none'}"}
+    load_result = {}
+    try:
+        tables, dataset_hash, _ = load_dataset(paths, load_result, "full", optimize_dtypes, arrow_dtypes)
+        meta = dataset_registry.get_registry().register(tables, dataset_hash, paths, optimized=optimize_dtypes)
+    except Exception as e:
+        return {'dataset_id': None, 'error': f"Error ingesting file: {str(e)}"}
+    debug_print(f"Dataset {meta['dataset_id']} {meta['status']}: {meta['bytes']} bytes")
+    return dict(meta, dataset_cache=load_result.get('dataset_cache'), error=None)
+
+def load_columnar(file_path, file_ext, name, result, optimize_dtypes=True, arrow_dtypes=False):
+    """
+    Columnar counterpart of schema-first loading for Parquet, Feather and Arrow files: the
+    schema and a few rows now, the columns the generated code reads once it exists.
+    Column reads are memory-mapped and bypass the dataset cache.
+    """
+    import dataset_cache
+    import data_loader
+    
+    dataset_hash = dataset_cache.file_digest(file_path)
+    sample = columnar.read_sample(file_path, file_ext, data_loader.SCHEMA_SAMPLE_ROWS)
+    if optimize_dtypes:
+        sample, _ = data_loader.optimize_dtypes(sample, arrow_strings=arrow_dtypes)
+    total = sample.shape[1]
+    debug_print(f"Loaded columnar sample: {sample.shape[0]} rows, {total} columns")
+    
+    def load_full_frame(code=None):
+        columns = columnar.referenced_columns(code, list(sample.columns)) if code else None
+        full_df = columnar.read_columns(file_path, file_ext, columns)
+        report = None
+        if optimize_dtypes:
+            full_df, report = data_loader.optimize_dtypes(full_df, arrow_strings=arrow_dtypes)
+        reloaded = 'columnar' in result
+        result['columnar'] = {
+            'format': file_ext,
+            'columns_total': total,
+            'columns_loaded': full_df.shape[1],
+            'lazy_reload': reloaded,
+        }
+        debug_print(f"Read {full_df.shape[1]} of {total} columns{' (all, after a miss)' if reloaded else ''}")
+        return full_df, 'bypass', report
+    
+    return [(name, sample)], dataset_hash, load_full_frame
+
+def load_tables(table_list, result, optimize_dtypes=True, arrow_dtypes=False):
+    """
+    Load the (name, file_path, sheet) entries of data_loader.list_tables concurrently, each
+    through the dataset cache, so the load takes about as long as the largest table.
+    A workbook not yet in the cache is parsed once for all its sheets (see excel_reader).
+    Per-table details go to result['tables']. Returns (tables, dataset_hash).
+    """
+    import hashlib
+    from concurrent.futures import ThreadPoolExecutor
+    import pandas as pd
+    import dataset_cache
+    import data_loader
+    
+    paths = list(dict.fromkeys(path for _, path, _ in table_list))
+    cache = dataset_cache.get_cache()
+    workbooks = {}
+    for _, path, sheet in table_list:
+        if sheet is not None:
+            workbooks.setdefault(path, []).append(sheet)
+    
+    def convert(path, sheets):
+        start = time.perf_counter()
+        frames = excel_reader.read_sheets(path, sheets)
+        debug_print(f"Parsed {len(sheets)} sheets of {os.path.basename(path)} with {excel_reader.engine_name()} "
+                    f"in {round((time.perf_counter() - start) * 1000, 1)} ms")
+        return frames
+    
+    def load(entry):
+        name, path, sheet = entry
+        start = time.perf_counter()
+        file_ext = data_loader.file_extension(path)
+        if path in conversions:
+            # Each sheet of the parsed workbook is stored in the dataset cache as it is taken
+            reader_func = lambda _: conversions[path].result()[sheet]
+        else:
+            reader_func = reader_for(file_ext, sheet) or pd.read_csv
+        df, cache_status, _ = cache.load(
+            path, file_ext, reader_func, digest=digests[path],
+            variant=f"sheet:{sheet}" if sheet is not None else None)
+        info = {'name': name, 'file': os.path.basename(path), 'sheet': sheet, 'dataset_cache': cache_status}
+        if optimize_dtypes:
+            df, info['memory'] = data_loader.optimize_dtypes(df, arrow_strings=arrow_dtypes)
+        info.update(rows=df.shape[0], columns=df.shape[1], load_ms=round((time.perf_counter() - start) * 1000, 1))
+        return (name, df), info
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(data_loader.LOAD_WORKERS, len(table_list)))) as executor:
+        digests = dict(zip(paths, executor.map(dataset_cache.file_digest, paths)))
+        # Submitted first, so every workbook is being parsed before its sheets are waited on
+        conversions = {
+            path: executor.submit(convert, path, sheets) for path, sheets in workbooks.items()
+            if not all(cache.has(digests[path], data_loader.file_extension(path), f"sheet:{sheet}") for sheet in sheets)
+        }
+        loaded = list(executor.map(load, table_list))
+    
+    tables = [table for table, _ in loaded]
+    infos = [info for _, info in loaded]
+    result['tables'] = infos
+    statuses = {info['dataset_cache'] for info in infos}
+    result['dataset_cache'] = statuses.pop() if len(statuses) == 1 else 'mixed'
+    if optimize_dtypes:
+        before = sum(info['memory']['before_bytes'] for info in infos)
+        after = sum(info['memory']['after_bytes'] for info in infos)
+        result['memory'] = {
+            'before_bytes': before,
+            'after_bytes': after,
+            'saved_pct': round(100.0 * (before - after) / before, 1) if before else 0.0,
+        }
+    debug_print(f"Loaded {len(tables)} tables: " + ", ".join(
+        f"{info['name']} {info['rows']}x{info['columns']} ({info['dataset_cache']}, {info['load_ms']} ms)" for info in infos))
+    
+    # The same files and sheets under the same names give the same hash
+    parts = [[name, digests[path], sheet] for name, path, sheet in table_list]
+    dataset_hash = hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return tables, dataset_hash
+
+def enhance_query(query, preference):
+    """Prefix the query with instructions for the chosen preference"""
+    # Create prompting based on preference
+    prompt_prefix = ""
+    if preference == 'standard_pandas':
+        prompt_prefix = "Generate standard Pandas code (not PandasAI specific code). "
+        prompt_prefix += "Make sure to include all necessary imports. Focus on basic pandas operations. "
+        prompt_prefix += "Show the complete code solution and make sure it's executable. "
+    
+    # Modify query based on preference
+    if prompt_prefix:
+        return f"{prompt_prefix}Query: {query}"
+    return query
+
+def agent_frames(tables, overrides=None):
+    """
+    What the Agent is given for tables: the bare frame for a single table (the prompt is
+    unchanged), named connectors for several so the prompt tells dfs[0], dfs[1], ... apart.
+    overrides maps a table name to the (custom_head, description) the prompt shows instead.
+    """
+    overrides = overrides or {}
+    if len(tables) == 1 and not overrides:
+        return [tables[0][1]]
+    from pandasai.connectors import PandasConnector
+    frames = []
+    for name, df in tables:
+        head, description = overrides.get(name, (None, None))
+        frames.append(PandasConnector({"original_df": df}, name=name if len(tables) > 1 else None,
+                                      custom_head=head, description=description))
+    return frames
+
+def shallow_tables(tables):
+    """tables with shallow copies of the frames (PandasAI wraps each frame per Agent)"""
+    return [(name, df.copy(deep=False)) for name, df in tables]
+
+def make_llm(config):
+    """The LLM client for config"""
+    _, PooledLLM = load_pandasai()
+    debug_print(f"Initializing LLM with model {config['model']}, API Base: {config['api_base'][:20]}...") # Use active model name
+    # Connections are pooled per process, so warm workers and batch queries reuse them
+    return PooledLLM(
+        api_key=config['api_key'], # Use active API key
+        api_base=config['api_base'], # Use active API base
+        model=config['model'] # Use active model name
+    )
+
+def build_agent(tables, config, use_cache=True):
+    """Create the LLM client and a PandasAI Agent over the (name, df) tables"""
+    Agent, _ = load_pandasai()
+    os.makedirs(CHARTS_DIR, exist_ok=True)
+    
+    # PandasAI configuration - enable chart saving
+    agent_config = {
+        "llm": make_llm(config), 
+        "verbose": False, 
+        "save_logs": False,
+        "enforce_privacy": False,
+        "enable_cache": AGENT_CACHE_ENABLED and use_cache,
+        "use_error_correction_framework": False,
+        "save_charts": True,  # Enable chart saving (rendered in memory, see chart_store)
+        "save_charts_path": CHARTS_DIR,
+        "open_charts": False,
+        "custom_whitelisted_dependencies": ["matplotlib.pyplot", "numpy", "matplotlib.rcParams"]
+    }
+    
+    return Agent(agent_frames(tables), config=agent_config)
+
+def open_session(session_id, file_path, result, optimize_dtypes=True, arrow_dtypes=False):
+    """
+    The session a request continues: the live one (nothing is loaded), its snapshot, or a
+    new one over file_path loaded in full. A follow-up naming other data files starts over.
+    The Agent of a new or restored session is built by resume_agent.
+    """
+    store = sessions.get_store()
+    paths = split_paths(file_path)
+    session = store.get(session_id)
+    status = 'reused'
+    if session is not None and not sessions.same_source(session.source, paths):
+        debug_print(f"Session {session_id} asked about other data, starting over")
+        store.drop(session_id)
+        session = None
+    if session is None:
+        session = store.restore(session_id)
+        status = 'restored'
+        if session is not None and not sessions.same_source(session.source, paths):
+            store.drop(session_id)
+            session = None
+    if session is None:
+        tables, dataset_hash, _ = load_dataset(file_path, result, "full", optimize_dtypes, arrow_dtypes)
+        session = sessions.Session(session_id, tables, dataset_hash, paths)
+        status = 'new'
+    else:
+        result['load_mode'] = 'full'
+        result['dataset_cache'] = 'session'
+        debug_print(f"Session {session_id} {status}: turn {session.turns + 1}, no data loaded")
+    store.put(session)
+    result['session_id'] = session_id
+    result['session'] = {'status': status, 'turn': session.turns + 1}
+    return session
+
+def resume_agent(session, config, use_cache=True):
+    """The session's Agent over its tables, built (and given the restored conversation) on first use"""
+    config_key = (config['model'], config['api_base'], config['api_key'])
+    if session.agent is None:
+        agent = build_agent(session.tables, config, use_cache)
+        for message in session.messages:
+            agent.add_message(message['message'], is_user=message['is_user'])
+        session.messages = []
+        session.agent = agent
+    else:
+        # Earlier turns may have run on validation samples or compressed heads
+        point_agent_at(session.agent, session.tables)
+        if session.config_key != config_key:
+            session.agent.context.config.llm = make_llm(config)
+    session.config_key = config_key
+    return session.agent
+
+def point_agent_at(agent, tables, overrides=None):
+    """Make the Agent execute against tables (e.g. the full frame after generating on a sample)"""
+    agent.context.dfs = agent.get_dfs(agent_frames(tables, overrides))
+    agent.dfs = agent.context.dfs
+
+def profile_tables(result, tables, dataset_hash, file_path, sampled=False):
+    """
+    Column profiles of the tables (see dataset_profile.py), computed once per dataset and
+    returned in result['dataset_profile']. A single file that only gained appended rows is
+    profiled incrementally. For sample-first loads (sampled) only a profile stored by an
+    earlier full load is used. Returns {name: profile}.
+    """
+    cache = dataset_profile.get_cache()
+    paths = split_paths(file_path)
+    # The digest of a single file is what tells an appended version of it apart
+    source = paths[0] if len(tables) == 1 and len(paths) == 1 and os.path.isfile(paths[0]) else None
+    profiles, statuses = {}, []
+    try:
+        for name, df in tables:
+            if sampled:
+                profile, status = cache.get(dataset_hash, name, df), 'stored'
+            else:
+                profile, status = cache.profile(df, dataset_hash, name, file_path=source)
+            if profile is not None:
+                profiles[name] = profile
+                statuses.append(status)
+    except Exception as e:
+        debug_print(f"Dataset profiling failed: {str(e)}")
+        return {}
+    if not profiles:
+        return profiles
+    if len(tables) == 1:
+        result['dataset_profile'] = profiles[tables[0][0]]
+    else:
+        result['dataset_profile'] = {'tables': profiles}
+    result['profile_cache'] = statuses[0] if len(set(statuses)) == 1 else 'mixed'
+    debug_print(f"Dataset profile: {result['profile_cache']}")
+    return profiles
+
+def apply_prompt_context(result, agent, tables, query, token_budget, profiles=None):
+    """
+    Choose what the prompt shows of each table. With profiles, a sample row plus the
+    column profile replaces PandasAI's sample rows. When the dataframe part of the prompt
+    would exceed token_budget, a compressed head (relevant columns, truncated values,
+    category summaries) is shown instead; several tables share the budget evenly.
+    Execution still uses all of the data.
+    """
+    overrides, reports = {}, {}
+    for name, df in tables:
+        compressed = prompt_budget.compress(df, query, token_budget // len(tables)) if token_budget else None
+        if compressed is not None:
+            head, description, reports[name] = compressed
+            overrides[name] = (head, description)
+        elif profiles and name in profiles:
+            overrides[name] = (df.head(dataset_profile.HEAD_ROWS), dataset_profile.describe(profiles[name]))
+    if not overrides:
+        return
+    point_agent_at(agent, tables, overrides)
+    if profiles:
+        result['prompt_context'] = 'profile'
+    if not reports:
+        return
+    if len(tables) == 1:
+        result['prompt_compression'] = reports[tables[0][0]]
     else:
-        # Load data based on file extension
+        result['prompt_compression'] = {'budget': token_budget, 'tokenizer': prompt_budget.tokenizer_name(), 'tables': reports}
+    for name, report in reports.items():
+        debug_print(f"Prompt context of {name} compressed: {report['before_tokens']} -> {report['after_tokens']} tokens ({', '.join(report['steps'])})")
+
+def collect_code(result, agent, preference, images=None, timer=None, emit=None):
+    """Fill code, chart and tokens in result from the Agent's last executed code"""
+    timer = timer or profiling.StageTimer()
+    # Get the generated code
+    if not hasattr(agent, 'last_code_executed'):
+        result['error'] = "No code was generated"
+        debug_print("No code was generated")
+        return
+    
+    raw_code = agent.last_code_executed
+    
+    debug_print(f"Raw code from LLM:\n{raw_code}")
+    
+    # Clean the code to remove PandasAI result formatting
+    with timer.stage('clean'):
+        cleaned_code = clean_pandasai_code(raw_code, preference)
+    
+    result['code'] = cleaned_code
+    
+    # Add information about chart if one was generated
+    with timer.stage('charts'):
+        store_charts(result, images)
+    emit_chart(emit, result, timer)
+    
+    # Count tokens of the cleaned code
+    if cleaned_code:
+        result['tokens'] = prompt_budget.count_tokens(cleaned_code)
+        debug_print(f"Generated code contains {result['tokens']} tokens ({prompt_budget.tokenizer_name()})")
+    
+    debug_print("Successfully generated and cleaned code")
+
+def emit_chart(emit, result, timer):
+    """The 'chart' event, once the request's charts are stored"""
+    if result.get('chart'):
+        emit_event(emit, result, timer, 'chart', chart=result['chart'], chart_thumbnail=result.get('chart_thumbnail'),
+                   charts=result.get('charts'))
+
+def record_llm_calls(result, agent):
+    """Latency and token usage of the LLM calls made since the last record"""
+    llm = agent.context.config.llm
+    if hasattr(llm, 'take_calls'):
+        calls = llm.take_calls()
+        if calls:
+            import llm_client
+            summary = llm_client.summarize_calls(calls)
+            result['llm'] = summary
+            # The API's usage figures when it reports them, local counts otherwise
+            result['token_usage'] = {
+                'tokenizer': prompt_budget.tokenizer_name(),
+                'prompt_tokens': summary['counted_prompt_tokens'],
+                'completion_tokens': summary['counted_completion_tokens'],
+                'api_prompt_tokens': summary['prompt_tokens'],
+                'api_completion_tokens': summary['completion_tokens'],
+                'code_tokens': result.get('tokens', 0),
+            }
+
+def lookup_cached_result(result, dataset_hash, frames, use_cache):
+    """
+    Check the result cache. Returns (cache_key, hit); on a hit result already holds the
+    stored code, tokens and chart.
+    """
+    # Identical (dataset, query, model, preference, schema) requests reuse the stored answer
+    cache_key = result_cache.make_key(dataset_hash, result['query'], result['model'], result['preference'],
+                                      result_cache.schema_fingerprint(frames))
+    cached = result_cache.get_cache().get(cache_key, charts_dir=CHARTS_DIR) if use_cache else None
+    if cached is not None:
+        result.update(cached)
+        result['result_cache'] = 'hit'
+        if result.get('chart'):
+            chart_store.ChartStore(CHARTS_DIR).reference(result['chart'], request_id=result['request_id'])
+        debug_print("Result cache hit, skipping LLM call")
+        return cache_key, True
+    result['result_cache'] = 'miss' if use_cache else 'bypass'
+    return cache_key, False
+
+def execution_error(response):
+    """PandasAI reports failed code as an 'Unfortunately, ...' answer instead of raising"""
+    if isinstance(response, str) and response.startswith("Unfortunately"):
+        return response.split("error:", 1)[-1].strip()
+    return None
+
+def agent_cache_key(agent):
+    """
+    Key of the code PandasAI cached for the current question, taken before the code runs
+    (running it adds to the conversation the key is made of); None without PandasAI's cache
+    """
+    context = agent.context
+    if context.config.enable_cache and context.cache:
+        return context.cache.get_cache_key(context)
+    return None
+
+def forget_failed_code(agent, cache_key):
+    """PandasAI caches generated code before it runs: drop code that failed so it is not replayed"""
+    if cache_key is not None:
+        agent.context.cache.delete(cache_key)
+
+def record_execution_error(result, response):
+    """Report generated code that failed on the full data as the request's error; returns the error"""
+    error = execution_error(response)
+    if error:
+        result['execution'].update({'valid': False, 'error': error})
+        result['error'] = f"Error executing code: {error}"
+        debug_print(f"Generated code failed: {error}")
+    return error
+
+def validate_code(result, agent, code, tables):
+    """
+    Run generated code on small tables (samples or dtype mocks) instead of the full data
+    and record how it went in result['execution']. Charts drawn on the sample are discarded.
+    """
+    start = time.perf_counter()
+    cache_key = agent_cache_key(agent)
+    point_agent_at(agent, tables)
+    with chart_store.capture_figures():
+        response = agent.execute_code(code)
+    error = execution_error(response)
+    result['execution'].update({
+        'rows': sum(len(df) for _, df in tables),
+        'validation_ms': round((time.perf_counter() - start) * 1000, 1),
+        'valid': error is None,
+    })
+    if error:
+        forget_failed_code(agent, cache_key)
+        result['execution']['error'] = error
+        debug_print(f"Generated code failed validation: {error}")
+
+def validation_tables(tables, execution):
+    """The tables generated code is checked against for execution 'sample' or 'mock'"""
+    import data_loader
+    make = data_loader.dtype_mock if execution == 'mock' else data_loader.stratified_sample
+    return [(name, make(df)) for name, df in tables]
+
+def generate_pandas_code(file_path, query, cli_model_name=None, preference="default", cli_api_key=None, cli_api_base_url=None, use_cache=True, load_mode="full", optimize_dtypes=True, arrow_dtypes=False, execution="full", token_budget=prompt_budget.TOKEN_BUDGET, profile=None, session_id=None, prompt_context=PROMPT_CONTEXT, use_fast_path=fast_path.ENABLED, cancel=None, emit=None):
+    """
+    Generate pandas code using PandasAI.
+    Preference can be 'default' or 'standard_pandas'
+    file_path may also be a list: every file (and every sheet of a multi-sheet workbook)
+    is loaded concurrently and given to the Agent as its own named dataframe.
+    With use_cache=False stored results are ignored (the fresh answer still refreshes the cache).
+    load_mode 'schema' builds the prompt from a sample of a CSV/JSON Lines file and streams
+    the full frame in the background; 'auto' does so only for large files. For Parquet,
+    Feather and Arrow files both read only the metadata and a sample up front, then just
+    the columns the generated code refers to (see columnar.py).
+    optimize_dtypes shrinks loaded frames (categoricals, smaller ints, datetimes); arrow_dtypes
+    additionally stores free-text columns as pyarrow strings.
+    execution 'sample' (a stratified sample) or 'mock' (synthetic rows with the same dtypes)
+    only checks that the generated code runs, without a pass over the full data; in
+    'schema' and 'columnar' load mode the full file is then never read.
+    token_budget (0 = off) caps the tokens the dataframe head may take in the prompt;
+    wider contexts are compressed and the steps reported in result['prompt_compression'].
+    Every table's column profile is returned in result['dataset_profile']; prompt_context
+    'profile' also shows it to the LLM in place of sample rows ('rows' does not).
+    The time spent in each stage goes to result['timings']; profile 'cprofile' or
+    'tracemalloc' additionally writes a profile of the request (see profiling.py).
+    session_id keeps the Agent, its conversation and the loaded tables alive in this process
+    (see sessions.py): a follow-up with the same id skips loading and sees the earlier turns.
+    Session turns are always loaded in full and bypass the result cache.
+    use_fast_path answers common single-table aggregations, counts and rankings without the
+    LLM (see fast_path.py); result['source'] tells 'fast_path' from 'llm' answers.
+    cancel, a cancellation.CancelToken, stops the request at the next stage (the LLM call and
+    code execution at once); the result then has 'cancelled' set and no charts are kept.
+    emit(event) receives progress events as the request goes: 'loaded' (table shapes),
+    'llm_response', 'code' (the cleaned code, before it runs) and 'chart'. Each is a dict with
+    'event', 'request_id' and 'elapsed_ms'; the returned result is the final answer. A fast path
+    answer whose code fails to run is followed by the LLM's 'code' event, which replaces it.
+    """
+    timer = profiling.StageTimer(on_stage=cancel.stage if cancel is not None else None)
+    with profiling.profile(profile) as profile_info:
         try:
-            file_ext = os.path.splitext(file_path)[1][1:].lower()
-            
-            if file_ext in FILE_READERS:
-                debug_print(f"Reading file with {file_ext} format")
-                reader_func = FILE_READERS[file_ext]
-                df = reader_func(file_path)
+            result = _generate_pandas_code(timer, file_path, query, cli_model_name, preference, cli_api_key, cli_api_base_url,
+                                           use_cache, load_mode, optimize_dtypes, arrow_dtypes, execution, token_budget,
+                                           session_id, prompt_context, use_fast_path, cancel, emit)
+        except cancellation.Cancelled as e:
+            result = cancelled_result(query, preference, cancel, e.reason, cli_model_name, cli_api_key, cli_api_base_url)
+    result['timings'] = timer.as_dict()
+    result['peak_rss_mb'] = profiling.peak_rss_mb()
+    if profile_info is not None:
+        result['profile'] = profile_info
+        debug_print(f"Profile written to {profile_info['path']}")
+    return result
+
+def record_full_frame(result, loaded):
+    """Record how the full frame of a sample-first load was loaded; returns the frame"""
+    full_df, cache_status, memory_report = loaded
+    result['dataset_cache'] = cache_status
+    if memory_report is not None:
+        result['memory'] = memory_report
+    debug_print(f"Full data ready: {full_df.shape[0]} rows, {full_df.shape[1]} columns (dataset cache: {cache_status})")
+    return full_df
+
+def cancelled_result(query, preference, cancel, reason, cli_model_name=None, cli_api_key=None, cli_api_base_url=None):
+    """Result of a cancelled request; charts it already stored are removed"""
+    config, _ = resolve_config(cli_model_name, cli_api_key, cli_api_base_url)
+    result = new_result(query, config, preference)
+    if cancel is not None and cancel.request_id:
+        result['request_id'] = cancel.request_id
+        removed = chart_store.ChartStore(CHARTS_DIR).discard(cancel.request_id)
+        if removed:
+            debug_print(f"Removed {removed} charts of the cancelled request")
+    result['error'] = f"Request cancelled: {reason}"
+    result['cancelled'] = reason
+    return result
+
+def use_full_frame(result, agent, tables, loaded):
+    """Point the Agent at the full frame of a sample-first load and record how it was loaded"""
+    # Same Agent, now pointed at the full frame
+    point_agent_at(agent, [(tables[0][0], record_full_frame(result, loaded))])
+
+def answer_fast_path(result, query, tables, preference, execution, load_full_frame=None, timer=None, emit=None):
+    """
+    Answer query without the LLM when fast_path.py recognizes it (single-table aggregations,
+    counts and rankings). Returns whether it did; on False the Agent answers as usual.
+    """
+    timer = timer or profiling.StageTimer()
+    if len(tables) != 1:
+        return False
+    with timer.stage('fast_path'):
+        answer = fast_path.match(query, tables[0][1])
+    if answer is None:
+        return False
+    debug_print(f"Fast path: {answer['intent']} (confidence {answer['confidence']})")
+    with timer.stage('clean'):
+        code = clean_pandasai_code(answer['code'], preference)
+    emit_event(emit, result, timer, 'code', code=code, source='fast_path')
+    if answer['chart']:
+        setup_matplotlib()
+    # Answers without a chart never import pyplot
+    figures = chart_store.capture_figures if answer['chart'] else lambda: nullcontext([])
+    images = []
+    try:
+        if execution != 'full':
+            checked = validation_tables(tables, execution)
+            start = time.perf_counter()
+            with timer.stage('execute'), figures():
+                fast_path.run(answer['code'], [df for _, df in checked])
+            result['execution'].update({
+                'rows': sum(len(df) for _, df in checked),
+                'validation_ms': round((time.perf_counter() - start) * 1000, 1),
+                'valid': True,
+            })
+        else:
+            frame = tables[0][1]
+            if load_full_frame is not None:
+                # Sample-first load: the answer needs the full frame (or the columns the code uses)
+                with timer.stage('load_columns'):
+                    frame = record_full_frame(result, load_full_frame(answer['code']))
+            with timer.stage('execute'), figures() as images:
+                fast_path.run(answer['code'], [frame])
+    except Exception as e:
+        # Data the matcher did not foresee (e.g. a mixed-type column): the LLM gets a go
+        debug_print(f"Fast path code failed, asking the LLM: {str(e)}")
+        result['execution'] = {'mode': execution}
+        return False
+    
+    result['code'] = code
+    with timer.stage('charts'):
+        store_charts(result, images)
+    emit_chart(emit, result, timer)
+    result['tokens'] = prompt_budget.count_tokens(result['code'])
+    result['source'] = 'fast_path'
+    result['fast_path'] = {'intent': answer['intent'], 'confidence': answer['confidence']}
+    return True
+
+def code_generated(code):
+    """
+    Whether generate_code returned code: a failed LLM call comes back as an 'Unfortunately, ...'
+    answer, and a PandasAI cache hit returns code without setting agent.last_code_generated
+    """
+    return isinstance(code, str) and execution_error(code) is None
+
+def generate_code(agent, query):
+    """agent.generate_code, with the query screening Agent.chat applies first"""
+    if agent.check_malicious_keywords_in_query(query):
+        raise ValueError("The query contains references to io or os modules or b64decode method which can be used to execute or access system resources in unsafe ways.")
+    return agent.generate_code(query)
+
+def _generate_pandas_code(timer, file_path, query, cli_model_name, preference, cli_api_key, cli_api_base_url, use_cache, load_mode, optimize_dtypes, arrow_dtypes, execution, token_budget, session_id=None, prompt_context=PROMPT_CONTEXT, use_fast_path=fast_path.ENABLED, cancel=None, emit=None):
+    config, config_error = resolve_config(cli_model_name, cli_api_key, cli_api_base_url)
+    result = new_result(query, config, preference)
+    if cancel is not None:
+        cancel.request_id = result['request_id']
+    result['execution'] = {'mode': execution}
+    if config_error:
+        result['error'] = config_error
+        return result
+    if session_id is not None and not sessions.is_session_id(session_id):
+        result['error'] = "Invalid session id: use 1-64 letters, digits, '_' or '-'"
+        return result
+    
+    # One-time imports are attributed to their own stage rather than the first load
+    with timer.stage('import'):
+        import pandas
+        import data_loader
+    session = None
+    try:
+        with timer.stage('load'):
+            if session_id:
+                session = open_session(session_id, file_path, result, optimize_dtypes, arrow_dtypes)
+                tables, dataset_hash, load_full_frame = session.tables, session.dataset_hash, None
             else:
-                # Default to CSV if extension not recognized
-                debug_print(f"Unknown file format '{file_ext}', trying as CSV")
-                df = pd.read_csv(file_path)
-                
-            debug_print(f"Successfully loaded data: {df.shape[0]} rows, {df.shape[1]} columns")
-            
-        except Exception as e:
-            result['error'] = f"Error loading file: {str(e)}"
+                tables, dataset_hash, load_full_frame = load_dataset(file_path, result, load_mode, optimize_dtypes, arrow_dtypes)
+    except Exception as e:
+        result['error'] = f"Error loading file: {str(e)}"
+        return result
+    emit_event(emit, result, timer, 'loaded', tables=[{'name': name, 'shape': list(df.shape)} for name, df in tables],
+               load_mode=result.get('load_mode'), sampled=load_full_frame is not None,
+               dataset_cache=result.get('dataset_cache'))
+    
+    with timer.stage('profile'):
+        profiles = profile_tables(result, tables, dataset_hash, file_path, sampled=load_full_frame is not None)
+    if prompt_context != 'profile':
+        profiles = None
+    
+    if session is not None:
+        # A follow-up's answer depends on the conversation, not just the question
+        cache_key = None
+        result['result_cache'] = 'bypass'
+    else:
+        with timer.stage('cache_lookup'):
+            cache_key, hit = lookup_cached_result(result, dataset_hash, [df for _, df in tables], use_cache)
+        if hit:
+            return result
+        # Follow-ups are left to the Agent: their meaning depends on the conversation
+        if use_fast_path and answer_fast_path(result, query, tables, preference, execution, load_full_frame, timer, emit):
             return result
     
+    # Stream the full frame while the LLM writes the code
+    full_load = None
+    if load_full_frame and execution == 'full' and result['load_mode'] == 'schema':
+        full_load = data_loader.BackgroundLoad(load_full_frame)
+    
     # Initialize LLM and PandasAI Agent
+    pandas_ai_agent = None
     try:
-        debug_print(f"Initializing LLM with model {active_model_name}, API Base: {active_api_base[:20]}...") # Use active model name
-        llm = LocalLLM(
-            api_key=active_api_key, # Use active API key
-            api_base=active_api_base, # Use active API base
-            model=active_model_name # Use active model name
-        )
-        
-        # Create a plot capture handler
-        plot_capture = PlotCapture()
-        
-        # Create prompting based on preference
-        prompt_prefix = ""
-        if preference == 'standard_pandas':
-            prompt_prefix = "Generate standard Pandas code (not PandasAI specific code). "
-            prompt_prefix += "Make sure to include all necessary imports. Focus on basic pandas operations. "
-            prompt_prefix += "Show the complete code solution and make sure it's executable. "
-        
-        # Modify query based on preference
-        enhanced_query = query
-        if prompt_prefix:
-            enhanced_query = f"{prompt_prefix}Query: {query}"
-        
-        # PandasAI configuration - enable chart saving
-        config = {
-            "llm": llm, 
-            "verbose": False, 
-            "save_logs": False,
-            "enforce_privacy": False,
-            "enable_cache": True,
-            "use_error_correction_framework": False,
-            "save_charts": True,  # Enable chart saving
-            "save_charts_path": CHARTS_DIR,
-            "custom_whitelisted_dependencies": ["matplotlib.pyplot", "numpy", "matplotlib.rcParams"]
-        }
-        
-        pandas_ai_agent = Agent([df], config=config)
-        
-        # Connect to plot generation events
-        if hasattr(pandas_ai_agent, 'add_chart_handler'):
-            pandas_ai_agent.add_chart_handler(plot_capture.on_plot_generated)
+        with timer.stage('import'):
+            load_pandasai()
+        with timer.stage('agent'):
+            if session is not None:
+                pandas_ai_agent = resume_agent(session, config, use_cache)
+            else:
+                pandas_ai_agent = build_agent(tables, config, use_cache)
+            apply_prompt_context(result, pandas_ai_agent, tables, query, token_budget, profiles)
+        enhanced_query = enhance_query(query, preference)
         
-        # Run the query
+        # Run the query: code generation and execution are separate steps so that
+        # LLM and execution time can be told apart
         debug_print(f"Sending query: '{enhanced_query}'")
-        response = pandas_ai_agent.chat(enhanced_query)
-        
-        # Get the generated code
-        if hasattr(pandas_ai_agent, 'last_code_executed'):
-            raw_code = pandas_ai_agent.last_code_executed
-            
-            debug_print(f"Raw code from LLM:\n{raw_code}")
-            
-            # Clean the code to remove PandasAI result formatting
-            cleaned_code = clean_pandasai_code(raw_code, preference)
-            
-            result['code'] = cleaned_code
-            
-            # Add information about chart if one was generated
-            if plot_capture.has_plot and plot_capture.chart_path:
-                result['chart'] = os.path.basename(plot_capture.chart_path)
-                debug_print(f"Generated chart: {result['chart']}")
-            
-            # Estimate tokens count
-            if cleaned_code:
-                char_count = len(cleaned_code)
-                line_count = cleaned_code.count('\n') + 1
-                estimated_tokens = int(char_count * 0.25 + line_count * 5)
-                result['tokens'] = estimated_tokens
-                debug_print(f"Generated code estimated to contain {estimated_tokens} tokens")
-            
-            debug_print("Successfully generated and cleaned code")
-        else:
+        images = []
+        # A session's Agent must not report the previous turn's code when generation fails
+        pandas_ai_agent.last_code_generated = pandas_ai_agent.last_code_executed = None
+        with timer.stage('llm'):
+            code_to_run = generate_code(pandas_ai_agent, enhanced_query)
+        generated = code_generated(code_to_run)
+        agent_key = agent_cache_key(pandas_ai_agent)
+        emit_event(emit, result, timer, 'llm_response', llm_ms=timer.as_dict().get('llm_ms'),
+                   raw_code=pandas_ai_agent.last_code_generated or (code_to_run if generated else None))
+        if generated:
+            # Available before the code runs and renders its charts
+            emit_event(emit, result, timer, 'code', code=clean_pandasai_code(code_to_run, preference), source='llm')
+        if not generated:
             result['error'] = "No code was generated"
-            debug_print("No code was generated")
+            debug_print(f"No code was generated: {execution_error(code_to_run) or code_to_run}")
+        elif execution != 'full':
+            with timer.stage('execute'):
+                validate_code(result, pandas_ai_agent, code_to_run, validation_tables(tables, execution))
+        else:
+            if full_load is not None:
+                with timer.stage('wait_full_load'):
+                    use_full_frame(result, pandas_ai_agent, tables, full_load.result())
+            elif load_full_frame is not None:
+                # Columnar file: read just the columns the code refers to
+                with timer.stage('load_columns'):
+                    use_full_frame(result, pandas_ai_agent, tables, load_full_frame(code_to_run))
+            with timer.stage('execute'), chart_store.capture_figures() as images:
+                response = pandas_ai_agent.execute_code(code_to_run)
+            columns = result.get('columnar')
+            if execution_error(response) and columns and columns['columns_loaded'] < columns['columns_total']:
+                # The code used a column the analysis missed: load the rest and run it again
+                with timer.stage('load_columns'):
+                    use_full_frame(result, pandas_ai_agent, tables, load_full_frame())
+                with timer.stage('execute'), chart_store.capture_figures() as images:
+                    response = pandas_ai_agent.execute_code(code_to_run)
+            if record_execution_error(result, response):
+                forget_failed_code(pandas_ai_agent, agent_key)
+        
+        if generated:
+            collect_code(result, pandas_ai_agent, preference, images, timer, emit)
+        result['source'] = 'llm'
+        # Only answers that ran on the full data without error (and produced their chart) are replayed
+        if result['code'] and not result['error'] and execution == 'full' and cache_key is not None:
+            with timer.stage('cache_store'):
+                result_cache.get_cache().put(cache_key, result)
             
     except Exception as e:
         result['error'] = f"Error during code generation: {str(e)}"
         debug_print(f"Error during code generation: {str(e)}")
     
+    if pandas_ai_agent is not None:
+        record_llm_calls(result, pandas_ai_agent)
+    if session is not None and pandas_ai_agent is not None:
+        session.turns += 1
+        session.last_code = result['code']
+        sessions.get_store().save(session)
+    
     return result
 
+def read_batch_queries(lines):
+    """
+    Parse a JSONL batch: each line is {"query": ..., "preference"?: ..., "id"?: ...} or a bare
+    JSON string. Returns a list of request dicts; unparseable lines carry an 'error' instead.
+    """
+    requests = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            requests.append({'error': f"Invalid query JSON: {str(e)}"})
+            continue
+        if isinstance(request, str):
+            request = {'query': request}
+        if not isinstance(request, dict) or not request.get('query'):
+            requests.append({'id': request.get('id') if isinstance(request, dict) else None,
+                             'error': "Missing required field: query"})
+            continue
+        requests.append(request)
+    return requests
+
+def run_batch(file_path, requests, cli_model_name=None, cli_api_key=None, cli_api_base_url=None, concurrency=BATCH_CONCURRENCY, use_cache=True, optimize_dtypes=True, arrow_dtypes=False, execution="full", token_budget=prompt_budget.TOKEN_BUDGET, emit=None, prompt_context=PROMPT_CONTEXT, use_fast_path=fast_path.ENABLED):
+    """
+    Answer many queries against one dataset (one or several files). The data is loaded once; each pool thread
+    keeps its own Agent, LLM calls run concurrently and generated code is executed one
+    query at a time (pandas/pyplot state is shared). emit(result) is called as each query
+    finishes, so results arrive in completion order tagged with their input 'index'.
+    execution, token_budget, prompt_context and use_fast_path are applied to every query as in
+    generate_pandas_code.
+    Returns all results in input order.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    emit_lock = threading.Lock()
+    execute_lock = threading.Lock()
+    local = threading.local()
+    results = [None] * len(requests)
+    
+    def finish(index, request, result, timer=None):
+        result['index'] = index
+        if timer is not None:
+            result['timings'] = timer.as_dict()
+        if request.get('id') is not None:
+            result['id'] = request['id']
+        results[index] = result
+        if emit is not None:
+            with emit_lock:
+                emit(result)
+    
+    config, config_error = resolve_config(cli_model_name, cli_api_key, cli_api_base_url)
+    load_error = config_error
+    tables = dataset_hash = profiles = None
+    load_result = {}
+    if not load_error:
+        try:
+            # Chunked background loading buys nothing when the frame is shared by every query
+            tables, dataset_hash, _ = load_dataset(file_path, load_result, "full", optimize_dtypes, arrow_dtypes)
+            debug_print(f"Batch: {len(requests)} queries against {sum(len(df) for _, df in tables)} rows")
+            check_tables = validation_tables(tables, execution) if execution != 'full' else None
+            profiles = profile_tables(load_result, tables, dataset_hash, file_path)
+        except Exception as e:
+            load_error = f"Error loading file: {str(e)}"
+    
+    def answer(index, request):
+        timer = profiling.StageTimer()
+        preference = request.get('preference', 'default')
+        result = new_result(request.get('query'), config, preference)
+        result['execution'] = {'mode': execution}
+        if request.get('error') or load_error:
+            result['error'] = request.get('error') or load_error
+            return finish(index, request, result)
+        
+        result['load_mode'] = 'full'
+        result['dataset_cache'] = load_result.get('dataset_cache')
+        for field in ('tables', 'dataset_profile', 'profile_cache'):
+            if field in load_result:
+                result[field] = load_result[field]
+        try:
+            with timer.stage('cache_lookup'):
+                cache_key, hit = lookup_cached_result(result, dataset_hash, [df for _, df in tables], use_cache)
+            if hit:
+                return finish(index, request, result, timer)
+            if use_fast_path:
+                with execute_lock:
+                    answered = answer_fast_path(result, result['query'], tables, preference, execution, timer=timer)
+                if answered:
+                    return finish(index, request, result, timer)
+            
+            with timer.stage('agent'):
+                agent = batch_agent()
+                apply_prompt_context(result, agent, shallow_tables(tables), result['query'], token_budget,
+                                     profiles if prompt_context == 'profile' else None)
+            
+            debug_print(f"Batch query {index}: '{result['query']}'")
+            # The Agent is reused, so a failed generation must not leave the previous query's code
+            agent.last_code_generated = agent.last_code_executed = None
+            with timer.stage('llm'):
+                code_to_run = generate_code(agent, enhance_query(result['query'], preference))
+            images = []
+            if not code_generated(code_to_run):
+                result['error'] = "No code was generated"
+            elif execution != 'full':
+                with executing(timer):
+                    validate_code(result, agent, code_to_run, check_tables)
+                collect_code(result, agent, preference, timer=timer)
+            else:
+                with executing(timer), chart_store.capture_figures() as images:
+                    response = agent.execute_code(code_to_run)
+                record_execution_error(result, response)
+                collect_code(result, agent, preference, images, timer)
+            result['source'] = 'llm'
+            if result['code'] and not result['error'] and execution == 'full':
+                with timer.stage('cache_store'):
+                    result_cache.get_cache().put(cache_key, result)
+        except Exception as e:
+            result['error'] = f"Error during code generation: {str(e)}"
+            debug_print(f"Batch query {index} failed: {str(e)}")
+        if getattr(local, 'agent', None) is not None:
+            record_llm_calls(result, local.agent)
+        finish(index, request, result, timer)
+    
+    def batch_agent():
+        """This pool thread's Agent, created on its first query"""
+        if getattr(local, 'agent', None) is None:
+            # Shallow copy: PandasAI wraps the frame per Agent, the data itself is shared.
+            # PandasAI's own DuckDB cache cannot be created by several Agents at once;
+            # the result cache above already covers repeated queries
+            local.agent = build_agent(shallow_tables(tables), config, use_cache=False)
+        else:
+            local.agent.start_new_conversation()
+        return local.agent
+    
+    @contextmanager
+    def executing(timer):
+        """Hold the execute lock; waiting for it is timed apart from the execution itself"""
+        with timer.stage('execute_wait'):
+            execute_lock.acquire()
+        try:
+            with timer.stage('execute'):
+                yield
+        finally:
+            execute_lock.release()
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for index, request in enumerate(requests):
+            executor.submit(answer, index, request)
+    
+    return results
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="PandasAI Runner Script")
-    parser.add_argument("query", help="The query/question to ask PandasAI.")
-    parser.add_argument("file_path", help="Path to the data file (or 'none' for sample data).")
+    parser.add_argument("query", nargs="?", help="The query/question to ask PandasAI.")
+    parser.add_argument("file_path", nargs="*", help="Path to the data file (or 'none' for sample data), or a dataset id from --ingest; several files, like the sheets of a workbook, become separate named dataframes.")
     parser.add_argument("--model-name", help="Name of the AI model to use (e.g., deepseek-chat). Overrides active config from backend.")
     parser.add_argument("--preference", default="default", help="Preference for code generation ('default' or 'standard_pandas').")
     parser.add_argument("--api-key", help="API key for the AI provider. Overrides active config from backend.")
     parser.add_argument("--api-base-url", help="API base URL for the AI provider. Overrides active config from backend.")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached results and call the LLM (the fresh answer still refreshes the cache).")
+    parser.add_argument("--load-mode", choices=["full", "schema", "auto"], default="full", help="'schema' builds the prompt from a sample of CSV/JSON Lines files and streams the rest in chunks; 'auto' does so for large files only. Both read Parquet/Feather/Arrow files column by column: metadata first, then only the columns the generated code uses.")
+    parser.add_argument("--execution", choices=["full", "sample", "mock"], default="full", help="'sample' or 'mock' only checks the generated code on a stratified sample or a dtype-only mock instead of running it on the full data.")
+    parser.add_argument("--prompt-budget", type=int, default=prompt_budget.TOKEN_BUDGET, help="Compress the dataframe context in the prompt (relevant columns, truncated values, category summaries) when it exceeds this many tokens (0 = off).")
+    parser.add_argument("--prompt-context", choices=list(PROMPT_CONTEXTS), default=PROMPT_CONTEXT, help="'profile' shows the LLM per-column statistics (dtype, nulls, cardinality, range, top values) computed once per dataset instead of sample rows; 'rows' keeps PandasAI's sample rows.")
+    parser.add_argument("--no-fast-path", action="store_true", help="Always ask the LLM, also for simple aggregations, counts and rankings the fast path answers directly (see fast_path.py).")
+    parser.add_argument("--profile", choices=list(profiling.PROFILE_MODES), help="Write a cProfile or tracemalloc profile of the request to logs/profiles/ (per-stage timings are always in the result).")
+    parser.add_argument("--cassette", help="Record LLM completions to, or replay them from, this JSONL cassette file (see --cassette-mode).")
+    parser.add_argument("--cassette-mode", choices=list(llm_cassette.MODES), default=llm_cassette.CASSETTE_MODE, help="'record' calls the LLM and stores every completion, 'replay' serves stored completions only (no network, no API key), 'auto' replays what it has and records the rest.")
+    parser.add_argument("--replay-latency", action="store_true", help="When replaying, wait as long as the recorded call took.")
+    parser.add_argument("--no-optimize", action="store_true", help="Keep pandas' default dtypes instead of shrinking loaded frames (use when exact dtypes matter).")
+    parser.add_argument("--arrow-dtypes", action="store_true", help="Also store free-text columns as pyarrow-backed strings.")
+    parser.add_argument("--deadline", type=float, help="Give up after this many seconds with a 'Request cancelled' result (instead of being killed mid-request); SIGTERM does the same at once.")
+    parser.add_argument("--stream", action="store_true", help="Print newline-delimited JSON progress events (loaded, llm_response, code, chart) as the request goes, then the result as a 'done' event.")
+    parser.add_argument("--session", metavar="SESSION_ID", help="Continue the conversation of this session: follow-ups reuse the loaded data and see earlier turns. Lives in --serve workers; across one-shot runs only with SESSION_SNAPSHOT_DIR set.")
+    parser.add_argument("--serve", action="store_true", help="Run as a long-lived worker pool reading JSON-line requests from stdin (or --socket).")
+    parser.add_argument("--socket", help="With --serve, listen on this local HOST:PORT instead of stdin.")
+    parser.add_argument("--workers", type=int, help="With --serve, number of warm worker processes.")
+    parser.add_argument("--max-requests-per-worker", type=int, help="With --serve, recycle a worker after this many requests (0 = never).")
+    parser.add_argument("--max-queue", type=int, help="With --serve, requests waiting for a free worker before new ones are rejected (0 = unbounded).")
+    parser.add_argument("--max-worker-memory-mb", type=int, help="With --serve, recycle a worker once its RSS exceeds this many MB (0 = no limit).")
+
+    parser.add_argument("--batch", metavar="QUERIES_JSONL", help="Answer every query in this JSONL file (one {\"query\": ...} per line, '-' for stdin) against one dataset; prints one JSON line per query as it completes.")
+    parser.add_argument("--dataset", nargs="+", help="With --batch, the data file(s) the queries run against (default: sample data).")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="With --batch, number of queries in flight at once.")
+
+    parser.add_argument("--charts", choices=["info", "gc"], help="Print chart store statistics as JSON, or remove charts past the retention policy, then exit.")
+
+    parser.add_argument("--import-profile", action="store_true", help="Print per-module cold import times as JSON, then exit.")
+    parser.add_argument("--dataset-cache", choices=["info", "purge"], help="Print dataset cache statistics as JSON, or purge the cache, then exit.")
+    parser.add_argument("--ingest", nargs="+", metavar="FILE", help="Parse these files once into the dataset registry and print the dataset id (usable in place of file_path), then exit.")
+    parser.add_argument("--registry", choices=["info", "list", "gc"], help="Print dataset registry statistics or its datasets as JSON, or evict expired datasets, then exit.")
+    parser.add_argument("--delete-dataset", metavar="DATASET_ID", help="Remove a dataset from the registry, then exit.")
 
     args = parser.parse_args()
 
+    if args.cassette:
+        llm_cassette.configure(args.cassette, args.cassette_mode, args.replay_latency or llm_cassette.SIMULATE_LATENCY)
+
+    if args.import_profile:
+        print(json.dumps(import_profile()))
+        sys.exit(0)
+
+    if args.dataset_cache:
+        import dataset_cache
+        cache = dataset_cache.get_cache()
+        if args.dataset_cache == "purge":
+            print(json.dumps({'purged': cache.purge()}))
+        else:
+            print(json.dumps(cache.info()))
+        sys.exit(0)
+
+    if args.ingest:
+        print(json.dumps(ingest_dataset(args.ingest if len(args.ingest) > 1 else args.ingest[0],
+                                        optimize_dtypes=not args.no_optimize, arrow_dtypes=args.arrow_dtypes)))
+        sys.exit(0)
+
+    if args.registry or args.delete_dataset:
+        registry = dataset_registry.get_registry()
+        if args.delete_dataset:
+            print(json.dumps({'deleted': registry.delete(args.delete_dataset)}))
+        elif args.registry == "gc":
+            print(json.dumps({'removed': registry.gc()}))
+        elif args.registry == "list":
+            print(json.dumps(registry.list()))
+        else:
+            print(json.dumps(registry.info()))
+        sys.exit(0)
+
+    if args.charts:
+        store = chart_store.ChartStore(CHARTS_DIR)
+        if args.charts == "gc":
+            print(json.dumps({'removed': store.gc()}))
+        else:
+            print(json.dumps(store.info()))
+        sys.exit(0)
+
+    if args.serve:
+        import pandasai_server
+        pandasai_server.serve(
+            workers=args.workers if args.workers is not None else pandasai_server.DEFAULT_WORKERS,
+            max_requests=args.max_requests_per_worker if args.max_requests_per_worker is not None else pandasai_server.DEFAULT_MAX_REQUESTS,
+            max_memory_mb=args.max_worker_memory_mb if args.max_worker_memory_mb is not None else pandasai_server.DEFAULT_MAX_MEMORY_MB,
+            socket_address=args.socket,
+            max_queue=args.max_queue if args.max_queue is not None else pandasai_server.DEFAULT_MAX_QUEUE
+        )
+        sys.exit(0)
+
+    if args.batch:
+        if args.batch == "-":
+            batch_requests = read_batch_queries(sys.stdin)
+        else:
+            with open(args.batch, 'r', encoding='utf-8') as f:
+                batch_requests = read_batch_queries(f)
+        
+        def emit(result):
+            print(json.dumps(result), flush=True)
+        
+        run_batch(
+            args.dataset or "none",
+            batch_requests,
+            cli_model_name=args.model_name,
+            cli_api_key=args.api_key,
+            cli_api_base_url=args.api_base_url,
+            concurrency=args.concurrency,
+            use_cache=not args.no_cache,
+            optimize_dtypes=not args.no_optimize,
+            arrow_dtypes=args.arrow_dtypes,
+            execution=args.execution,
+            token_budget=args.prompt_budget,
+            emit=emit,
+            prompt_context=args.prompt_context,
+            use_fast_path=fast_path.ENABLED and not args.no_fast_path
+        )
+        sys.exit(0)
+
+    if args.query is None or not args.file_path:
+        parser.error("the following arguments are required: query, file_path")
+
+    # A deadline or a SIGTERM from the backend stops the request cleanly, still printing a result
+    import signal
+    cancel = cancellation.CancelToken(deadline=time.time() + args.deadline if args.deadline else None).watch()
+    cancellation.cancel_on_signal(cancel, signal.SIGTERM)
+
+    def emit_progress(event):
+        print(json.dumps(event), flush=True)
+
     # Call generate_pandas_code with the parsed arguments
     # Pass model_name explicitly, it will be handled inside generate_pandas_code
     result = generate_pandas_code(
-        args.file_path, 
+        args.file_path,
         args.query, 
         cli_model_name=args.model_name, # Pass CLI model name
         preference=args.preference,
         cli_api_key=args.api_key,       # Pass CLI API key
-        cli_api_base_url=args.api_base_url # Pass CLI API base URL
+        cli_api_base_url=args.api_base_url, # Pass CLI API base URL
+        use_cache=not args.no_cache,
+        load_mode=args.load_mode,
+        optimize_dtypes=not args.no_optimize,
+        arrow_dtypes=args.arrow_dtypes,
+        execution=args.execution,
+        token_budget=args.prompt_budget,
+        profile=args.profile,
+        session_id=args.session,
+        prompt_context=args.prompt_context,
+        use_fast_path=fast_path.ENABLED and not args.no_fast_path,
+        cancel=cancel,
+        emit=emit_progress if args.stream else None
     )
+    cancel.close()
+    if args.stream:
+        result = {'event': 'done', **result}
     
     # Only output the JSON result to stdout
     print(json.dumps(result)) 
\ No newline at end of file
@@ -0,0 +1,576 @@
+#!/usr/bin/env python
+"""
+Long-lived worker pool for pandasai_runner.py.
+
+Workers import pandas, pandasai and matplotlib once and then answer requests
+sent as JSON lines, either on stdin or on a local TCP socket. Each answer is
+the result dict returned by generate_pandas_code, plus the request "id".
+
+使用方法:
+python pandasai_runner.py --serve --workers 4
+python pandasai_runner.py --serve --socket 127.0.0.1:8765
+
+请求格式 (每行一个JSON):
+{"id": "1", "query": "...", "file_path": "data.csv", "model_name": "deepseek-chat",
+ "preference": "default", "api_key": "...", "api_base_url": "...",
+ "no_cache": false, "load_mode": "full", "no_optimize": false, "arrow_dtypes": false,
+ "prompt_context": "profile", "no_fast_path": false}
+多个文件用 "file_paths": ["a.csv", "b.xlsx"] 代替 "file_path"；已导入的数据集用 "dataset_id": "ds_..."
+多轮对话加 "session_id": "..."：同一会话的请求总是交给持有该会话的worker (见 sessions.py)
+调度: "priority": 整数, 越大越先处理 (默认0)；"deadline_seconds": 超时后排队的请求直接失败, 运行中的请求被中止
+流式输出: "stream": true 时先返回进度事件行 {"id", "event": "loaded"|"llm_response"|"code"|"chart", ...}，最后的结果带 "event": "done"
+控制行: {"cancel": "<id>"} 取消该id的请求, {"stats": true} 返回队列深度、等待时间、拒绝数等指标
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import queue
+import resource
+import threading
+import socketserver
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future
+
+# Defaults, overridable from the environment (.env) or the CLI
+DEFAULT_WORKERS = int(os.getenv("PANDASAI_WORKERS", "2"))
+DEFAULT_MAX_REQUESTS = int(os.getenv("PANDASAI_WORKER_MAX_REQUESTS", "100"))
+DEFAULT_MAX_MEMORY_MB = int(os.getenv("PANDASAI_WORKER_MAX_MEMORY_MB", "1024"))
+# Requests waiting for a free worker before new ones are rejected (0 = unbounded)
+DEFAULT_MAX_QUEUE = int(os.getenv("PANDASAI_MAX_QUEUE", "32"))
+# Deadline of requests that do not set "deadline_seconds" (0 = none)
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("PANDASAI_REQUEST_DEADLINE_SECONDS", "0"))
+
+# How often the pool checks for workers that died without saying goodbye
+MONITOR_INTERVAL = 1.0
+# Recent queue wait times kept for the percentiles in stats()
+WAIT_SAMPLES = 1000
+
+
+def debug_print(*args, **kwargs):
+    """Print debug messages to stderr instead of stdout"""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in KB on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_request(payload, cancel=None, emit=None):
+    """Answer one request dict with generate_pandas_code"""
+    import prompt_budget
+    import pandasai_runner
+
+    return pandasai_runner.generate_pandas_code(
+        payload.get("dataset_id") or payload.get("file_paths") or payload.get("file_path") or "none",
+        payload.get("query"),
+        cli_model_name=payload.get("model_name"),
+        preference=payload.get("preference") or "default",
+        cli_api_key=payload.get("api_key"),
+        cli_api_base_url=payload.get("api_base_url"),
+        use_cache=not payload.get("no_cache", False),
+        load_mode=payload.get("load_mode") or "full",
+        optimize_dtypes=not payload.get("no_optimize", False),
+        arrow_dtypes=payload.get("arrow_dtypes", False),
+        execution=payload.get("execution") or "full",
+        token_budget=payload.get("prompt_budget", prompt_budget.TOKEN_BUDGET),
+        profile=payload.get("profile"),
+        session_id=payload.get("session_id"),
+        prompt_context=payload.get("prompt_context") or pandasai_runner.PROMPT_CONTEXT,
+        use_fast_path=pandasai_runner.fast_path.ENABLED and not payload.get("no_fast_path", False),
+        cancel=cancel,
+        emit=emit,
+    )
+
+
+def _worker_main(task_queue, result_queue, cancel_id, max_requests, max_memory_mb):
+    """Worker loop: warm up once, then serve tasks until recycled"""
+    # Importing the runner pays for pandas/pandasai/matplotlib once per worker
+    import pandasai_runner
+    import cancellation
+    pandasai_runner.preload()
+    pandasai_runner.AGENT_CACHE_ENABLED = False
+
+    pid = os.getpid()
+    served = 0
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        task_id, payload, deadline = task
+        result_queue.put(("start", task_id, pid))
+        # The pool cancels a task by putting its id in cancel_id
+        cancel = cancellation.CancelToken(deadline=deadline).watch(
+            poll=lambda: "cancelled by client" if cancel_id.value == task_id else None)
+        # Progress events travel the result queue ahead of the result
+        emit = (lambda event: result_queue.put(("event", task_id, event))) if payload.get("stream") else None
+        try:
+            result = run_request(payload, cancel, emit)
+        except Exception as e:
+            result = {"error": f"Worker error: {str(e)}"}
+        except cancellation.Cancelled as e:
+            # Cancelled between two requests' stages, outside generate_pandas_code
+            result = {"query": payload.get("query"), "error": f"Request cancelled: {e.reason}", "cancelled": e.reason}
+        finally:
+            cancel.close()
+
+        served += 1
+        reason = None
+        if max_requests and served >= max_requests:
+            reason = f"served {served} requests"
+        elif max_memory_mb and current_rss_mb() > max_memory_mb:
+            reason = f"RSS above {max_memory_mb} MB"
+        result_queue.put(("done", task_id, result, pid, reason))
+        if reason:
+            break
+
+
+class _Task:
+    """A submitted request until its result is delivered"""
+
+    def __init__(self, task_id, payload, future, priority, deadline, on_event=None):
+        self.task_id = task_id
+        self.payload = payload
+        self.future = future
+        self.on_event = on_event    # called with each progress event of a "stream" request
+        self.priority = priority
+        self.deadline = deadline    # time.time() by which it must be answered, or None
+        self.session_id = payload.get("session_id")
+        self.submitted = time.time()
+        self.started = None
+        self.pid = None             # worker running it, once dispatched
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of warm runner processes behind a bounded priority queue.
+    A worker is replaced after max_requests requests or once its RSS passes
+    max_memory_mb; a worker that dies mid-request fails only that request.
+
+    Requests wait in the pool (not in the workers) until a worker is free: the
+    highest "priority" first, in submission order within a priority; requests
+    of a session only go to the worker holding it. With max_queue requests
+    waiting, further ones are rejected at once rather than queued for minutes.
+    A request still waiting at its deadline ("deadline_seconds", or
+    deadline_seconds of the pool) fails without running; one running at its
+    deadline, or cancel()led, is stopped cooperatively by its worker (see
+    cancellation.py).
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_requests=DEFAULT_MAX_REQUESTS, max_memory_mb=DEFAULT_MAX_MEMORY_MB,
+                 max_queue=DEFAULT_MAX_QUEUE, deadline_seconds=DEFAULT_DEADLINE_SECONDS):
+        self.size = max(1, int(workers))
+        self.max_requests = max_requests
+        self.max_memory_mb = max_memory_mb
+        self.max_queue = max_queue
+        self.deadline_seconds = deadline_seconds
+        self._ctx = multiprocessing.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._workers = {}      # pid -> Process
+        self._queues = {}       # pid -> task queue of that worker
+        self._cancel = {}       # pid -> shared id of the task that worker should cancel
+        self._running = {}      # pid -> task id
+        self._tasks = {}        # task id -> _Task, until its result is delivered
+        self._waiting = []      # heap of (-priority, task id) not yet dispatched
+        self._request_ids = {}  # client "id" -> task id, for cancel_request()
+        self._sessions = {}     # session id -> pid of the worker holding it
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._closing = False
+        self._reader = None
+        self.recycled = 0
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.expired = 0
+
+    def start(self):
+        for _ in range(self.size):
+            self._spawn()
+        self._reader = threading.Thread(target=self._read_results, daemon=True)
+        self._reader.start()
+        return self
+
+    def _spawn(self):
+        tasks = self._ctx.Queue()
+        cancel_id = self._ctx.Value('q', -1, lock=False)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(tasks, self._results, cancel_id, self.max_requests, self.max_memory_mb),
+            daemon=True,
+        )
+        process.start()
+        with self._lock:
+            self._workers[process.pid] = process
+            self._queues[process.pid] = tasks
+            self._cancel[process.pid] = cancel_id
+            self._dispatch()
+        debug_print(f"Started worker {process.pid}")
+
+    def submit(self, payload, on_event=None):
+        """
+        Queue a request dict; returns a Future resolving to the result dict (its task_id
+        attribute is what cancel() takes). A full queue or an invalid priority/deadline is
+        answered right away with an error result. With "stream" in the payload, on_event is
+        called with each progress event before the future resolves.
+        """
+        future = Future()
+        try:
+            priority = int(payload.get("priority") or 0)
+            deadline_seconds = float(payload.get("deadline_seconds") or self.deadline_seconds or 0)
+        except (TypeError, ValueError):
+            future.set_result({"query": payload.get("query"), "error": "Invalid priority or deadline_seconds"})
+            return future
+        with self._lock:
+            if self._closing:
+                raise RuntimeError("Worker pool is shutting down")
+            future.task_id = task_id = self._next_id
+            self._next_id += 1
+            if self.max_queue and len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                depth = len(self._waiting)
+            else:
+                deadline = time.time() + deadline_seconds if deadline_seconds > 0 else None
+                self._tasks[task_id] = _Task(task_id, payload, future, priority, deadline, on_event)
+                if payload.get("id") is not None:
+                    self._request_ids[payload["id"]] = task_id
+                heapq.heappush(self._waiting, (-priority, task_id))
+                self._dispatch()
+                return future
+        debug_print(f"Request queue full ({depth} waiting), rejecting request")
+        future.set_result({"query": payload.get("query"),
+                           "error": f"Server busy: {depth} requests already waiting, try again later",
+                           "scheduler": {"status": "rejected", "queue_depth": depth}})
+        return future
+
+    def cancel(self, task_id, reason="cancelled by client"):
+        """
+        Cancel a submitted request: a waiting one is answered at once, a running one is
+        stopped by its worker. Returns False if the request is already done.
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return False
+            self.cancelled += 1
+            if task.pid is not None:
+                self._cancel[task.pid].value = task_id
+                return True
+            self._forget_waiting(task)
+        self._deliver(task, {"query": task.payload.get("query"), "error": f"Request cancelled: {reason}",
+                             "cancelled": reason}, "cancelled")
+        return True
+
+    def cancel_request(self, request_id, reason="cancelled by client"):
+        """cancel() by the request's own "id" field"""
+        with self._lock:
+            task_id = self._request_ids.get(request_id)
+        return task_id is not None and self.cancel(task_id, reason)
+
+    def _forget_waiting(self, task):
+        """Take a task that was never dispatched out of the queue (caller holds the lock)"""
+        self._waiting = [entry for entry in self._waiting if entry[1] != task.task_id]
+        heapq.heapify(self._waiting)
+        self._tasks.pop(task.task_id, None)
+        if self._request_ids.get(task.payload.get("id")) == task.task_id:
+            del self._request_ids[task.payload["id"]]
+
+    def _dispatch(self):
+        """Hand waiting tasks to idle workers, highest priority first (caller holds the lock)"""
+        idle = [pid for pid in self._queues if pid not in self._running]
+        held = []
+        while idle and self._waiting:
+            entry = heapq.heappop(self._waiting)
+            task = self._tasks[entry[1]]
+            pid = self._sessions.get(task.session_id)
+            if pid in self._queues and pid not in idle:
+                held.append(entry)  # waits for the worker holding its session
+                continue
+            if pid not in self._queues:
+                pid = idle[0]
+                if task.session_id:
+                    self._sessions[task.session_id] = pid
+            idle.remove(pid)
+            task.pid = pid
+            self._running[pid] = task.task_id
+            self._queues[pid].put((task.task_id, task.payload, task.deadline))
+        for entry in held:
+            heapq.heappush(self._waiting, entry)
+
+    def _expire_waiting(self):
+        """Fail waiting tasks whose deadline passed; returns seconds until the next deadline"""
+        now = time.time()
+        expired = []
+        with self._lock:
+            for _, task_id in list(self._waiting):
+                task = self._tasks[task_id]
+                if task.deadline is not None and task.deadline <= now:
+                    self._forget_waiting(task)
+                    expired.append(task)
+            self.expired += len(expired)
+            deadlines = [self._tasks[task_id].deadline for _, task_id in self._waiting
+                         if self._tasks[task_id].deadline is not None]
+        for task in expired:
+            self._deliver(task, {"query": task.payload.get("query"), "cancelled": "deadline exceeded",
+                                 "error": "Request cancelled: deadline exceeded while waiting for a worker"}, "expired")
+        return min(deadlines) - now if deadlines else None
+
+    def _deliver(self, task, result, status):
+        """Resolve a task's future, with how long it waited (call without the lock)"""
+        waited = (task.started or time.time()) - task.submitted
+        result["scheduler"] = {"status": status, "priority": task.priority, "wait_ms": round(waited * 1000, 1)}
+        task.future.set_result(result)
+
+    def _forget_worker(self, pid):
+        """Drop a worker that is gone: its queue, sessions and cancel flag"""
+        with self._lock:
+            tasks = self._queues.pop(pid, None)
+            self._cancel.pop(pid, None)
+            for session_id, owner in list(self._sessions.items()):
+                if owner == pid:
+                    del self._sessions[session_id]
+        if tasks is not None:
+            tasks.cancel_join_thread()
+            tasks.close()
+
+    def _read_results(self):
+        while True:
+            next_deadline = self._expire_waiting()
+            timeout = MONITOR_INTERVAL if next_deadline is None else min(MONITOR_INTERVAL, max(0.01, next_deadline))
+            try:
+                message = self._results.get(timeout=timeout)
+            except queue.Empty:
+                self._reap_dead_workers()
+                with self._lock:
+                    stopped = self._closing and not self._workers
+                if stopped:
+                    return
+                continue
+            self._reap_dead_workers()
+
+            kind = message[0]
+            if kind == "event":
+                _, task_id, event = message
+                with self._lock:
+                    task = self._tasks.get(task_id)
+                if task is not None and task.on_event is not None:
+                    task.on_event(event)
+            elif kind == "start":
+                _, task_id, pid = message
+                with self._lock:
+                    task = self._tasks.get(task_id)
+                    if task is not None:
+                        task.started = time.time()
+                        self._waits.append(task.started - task.submitted)
+            elif kind == "done":
+                _, task_id, result, pid, retiring = message
+                if retiring:
+                    # Before dispatching: the worker takes no further task
+                    debug_print(f"Recycling worker {pid}: {retiring}")
+                    self._forget_worker(pid)
+                with self._lock:
+                    task = self._tasks.pop(task_id, None)
+                    if task is not None:
+                        if self._running.get(task.pid) == task_id:
+                            del self._running[task.pid]
+                        if self._request_ids.get(task.payload.get("id")) == task_id:
+                            del self._request_ids[task.payload["id"]]
+                    self.completed += 1
+                    self._dispatch()
+                if task is not None:
+                    self._deliver(task, result, "cancelled" if result.get("cancelled") else "done")
+                if retiring:
+                    self.recycled += 1
+                    with self._lock:
+                        process = self._workers.pop(pid, None)
+                    if process is not None:
+                        process.join(timeout=5)
+                        if not self._closing:
+                            self._spawn()
+
+    def _reap_dead_workers(self):
+        dead = []
+        with self._lock:
+            for pid, process in list(self._workers.items()):
+                if process.is_alive():
+                    continue
+                del self._workers[pid]
+                if self._closing:
+                    continue
+                # A clean exit is a retirement whose "done" message is still queued
+                task = None
+                if process.exitcode != 0:
+                    task_id = self._running.pop(pid, None)
+                    task = self._tasks.pop(task_id, None) if task_id is not None else None
+                dead.append((pid, process.exitcode, task))
+        # _forget_worker and _spawn take the lock themselves
+        for pid, exitcode, task in dead:
+            if exitcode != 0:
+                debug_print(f"Worker {pid} exited with code {exitcode}")
+                self._forget_worker(pid)
+            if task is not None:
+                self._deliver(task, {"error": f"Worker process exited with code {exitcode}"}, "failed")
+            self._spawn()
+
+    def stats(self):
+        """Pool state and scheduling metrics, for monitoring"""
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                "workers": len(self._workers),
+                "busy": len(self._running),
+                "queue_depth": len(self._waiting),
+                "max_queue": self.max_queue,
+                "pending": len(self._tasks),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+                "expired": self.expired,
+                "wait_ms": {
+                    "p50": _percentile_ms(waits, 50),
+                    "p95": _percentile_ms(waits, 95),
+                    "max": _percentile_ms(waits, 100),
+                },
+                "recycled": self.recycled,
+                "sessions": len(self._sessions),
+            }
+
+    def shutdown(self, wait=True):
+        """Stop accepting work, let queued requests finish and stop the workers"""
+        with self._lock:
+            self._closing = True
+        if wait:
+            # Waiting requests still need the workers
+            for task in list(self._tasks.values()):
+                task.future.result()
+        with self._lock:
+            queues = list(self._queues.values())
+        for tasks in queues:
+            tasks.put(None)
+        if wait:
+            with self._lock:
+                processes = list(self._workers.values())
+            for process in processes:
+                process.join()
+            if self._reader is not None:
+                self._reader.join(timeout=MONITOR_INTERVAL * 2)
+
+
+def _percentile_ms(ordered, q):
+    """Nearest-rank percentile of sorted seconds, in ms (None without samples)"""
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return round(ordered[index] * 1000, 1)
+
+
+def _answer(pool, line, on_event=None):
+    """Parse one JSON line, run it on the pool and return (payload, response dict or Future)"""
+    try:
+        payload = json.loads(line)
+    except ValueError as e:
+        return None, {"error": f"Invalid request JSON: {str(e)}"}
+    # Control lines are answered at once
+    if isinstance(payload, dict) and "cancel" in payload:
+        return None, {"id": payload["cancel"], "cancelled": pool.cancel_request(payload["cancel"])}
+    if isinstance(payload, dict) and payload.get("stats"):
+        return None, {"stats": pool.stats()}
+    if not isinstance(payload, dict) or not payload.get("query"):
+        return None, {"id": payload.get("id") if isinstance(payload, dict) else None,
+                      "error": "Missing required field: query"}
+    forward = (lambda event: on_event(_with_id(payload, event))) if on_event is not None else None
+    return payload, pool.submit(payload, forward)
+
+
+def _with_id(payload, result):
+    response = dict(result)
+    response["id"] = payload.get("id") if payload else None
+    if payload and payload.get("stream") and "event" not in response:
+        response = {"event": "done", **response}
+    return response
+
+
+def serve_stdin(pool, stdin=None, stdout=None):
+    """Read JSON-line requests from stdin, write JSON-line results as they finish"""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    write_lock = threading.Lock()
+    pending = []
+
+    def write(response):
+        with write_lock:
+            stdout.write(json.dumps(response) + "\n")
+            stdout.flush()
+
+    for line in stdin:
+        if not line.strip():
+            continue
+        payload, answer = _answer(pool, line, write)
+        if isinstance(answer, dict):
+            write(answer)
+            continue
+        answer.add_done_callback(lambda f, p=payload: write(_with_id(p, f.result())))
+        pending.append(answer)
+
+    for future in pending:
+        future.result()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode("utf-8").strip()
+            if not line:
+                continue
+            payload, answer = _answer(self.server.pool, line, self.write)
+            self.write(answer if isinstance(answer, dict) else _with_id(payload, answer.result()))
+
+    def write(self, response):
+        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve_socket(pool, address):
+    """Serve JSON-line requests on a local TCP socket, one response line per request"""
+    host, _, port = address.rpartition(":")
+    server = _ThreadingServer((host or "127.0.0.1", int(port)), _RequestHandler)
+    server.pool = pool
+    debug_print(f"Listening on {server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def serve(workers=DEFAULT_WORKERS, max_requests=DEFAULT_MAX_REQUESTS, max_memory_mb=DEFAULT_MAX_MEMORY_MB, socket_address=None,
+          max_queue=DEFAULT_MAX_QUEUE):
+    """Entry point for `pandasai_runner.py --serve`"""
+    pool = WorkerPool(workers, max_requests, max_memory_mb, max_queue).start()
+    try:
+        if socket_address:
+            serve_socket(pool, socket_address)
+        else:
+            serve_stdin(pool)
+    finally:
+        pool.shutdown()
+        debug_print(f"Worker pool stopped: {json.dumps(pool.stats())}")
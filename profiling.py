@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Stage timing and opt-in profiling for the runner.
+
+StageTimer accumulates wall time per named stage (importing, loading the file,
+building the Agent, waiting on the LLM, executing code, saving charts, ...)
+with two perf_counter() calls per stage, so it is always on. The runner puts
+the result in result['timings'] together with the process' peak RSS.
+
+profile('cprofile') and profile('tracemalloc') are opt-in and write a profile
+of the whole request next to the Node backend's logs (logs/profiles/):
+a .prof file for pstats/snakeviz, or a text report of the top allocation sites.
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.getcwd(), 'logs', 'profiles'))
+# Allocation sites listed in a tracemalloc report
+TRACEMALLOC_TOP = 30
+TRACEMALLOC_FRAMES = 10
+
+
+class StageTimer:
+    """
+    Wall time per stage; a stage entered several times accumulates.
+    on_stage(name), a context manager factory, wraps every stage (e.g. CancelToken.stage).
+    """
+
+    def __init__(self, on_stage=None):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.on_stage = on_stage
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            if self.on_stage is None:
+                yield
+            else:
+                with self.on_stage(name):
+                    yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def elapsed_ms(self):
+        """Wall time since the timer was created"""
+        return round((time.perf_counter() - self.started) * 1000, 1)
+
+    def as_dict(self):
+        """{'<stage>_ms': ..., 'total_ms': ...} in the order the stages first ran"""
+        timings = {f"{name}_ms": round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        timings['total_ms'] = self.elapsed_ms()
+        return timings
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _profile_path(suffix, profile_dir):
+    os.makedirs(profile_dir, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{time.perf_counter_ns() % 1000000:06d}"
+    return os.path.join(profile_dir, f"{name}.{suffix}")
+
+
+@contextmanager
+def profile(mode=None, profile_dir=PROFILE_DIR):
+    """
+    Profile the block with cProfile or tracemalloc. Yields a dict that gets the
+    written profile's 'path' on exit, or None when mode is None (no overhead).
+    Only the calling thread is profiled by cProfile.
+    """
+    if not mode:
+        yield None
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+
+    info = {'mode': mode}
+    if mode == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield info
+        finally:
+            profiler.disable()
+            info['path'] = _profile_path('prof', profile_dir)
+            profiler.dump_stats(info['path'])
+        return
+
+    import tracemalloc
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        yield info
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        info['peak_traced_mb'] = round(peak / (1024 * 1024), 1)
+        info['path'] = _profile_path('tracemalloc.txt', profile_dir)
+        with open(info['path'], 'w', encoding='utf-8') as f:
+            f.write(f"Peak traced memory: {info['peak_traced_mb']} MB\n")
+            f.write(f"Top {TRACEMALLOC_TOP} allocation sites:\n")
+            for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                f.write(f"{stat}\n")
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""
+Token counting and token-budgeted dataframe context for prompts.
+
+count_tokens uses tiktoken's cl100k_base encoding when tiktoken is installed
+and the encoding file is already in TIKTOKEN_CACHE_DIR (it is never downloaded
+at request time), and otherwise an offline approximation (words, number groups,
+punctuation and one token per CJK character), which stays within a few percent
+of BPE counts for code and tables. tokenizer_name() reports which one is used.
+
+PandasAI puts every column of the dataframe head into the prompt, which
+dominates prompt size for wide tables. compress() builds a smaller context
+when that part would exceed a token budget: cell values are truncated, the
+sample shrinks to one row, only the columns most relevant to the query are
+kept (the others are listed by name), and categorical columns get a short
+value summary. The result feeds PandasAI through a connector's custom_head
+and description.
+"""
+
+import os
+import re
+import hashlib
+
+# Tokens the dataframe part of the prompt may use; 0 disables compression
+TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "0"))
+
+# PandasAI shows this many sample rows per dataframe
+SAMPLE_ROWS = 3
+MAX_VALUE_CHARS = 20
+CATEGORY_SUMMARY_VALUES = 5
+CATEGORY_MAX_VALUES = 50
+
+APPROX_TOKEN_PATTERN = re.compile(
+    r"[A-Za-z]+|\d{1,3}|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]|[^\sA-Za-z\d]")
+# BPE merges long words into chunks of about this many characters
+APPROX_WORD_CHARS = 6
+
+# Pinned tiktoken cache, filled once at build time; tiktoken names the cached
+# file after the SHA-1 of the encoding's URL and checks its SHA-256
+TIKTOKEN_CACHE_DIR = os.getenv("TIKTOKEN_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'tiktoken'))
+TIKTOKEN_ENCODING = "cl100k_base"
+TIKTOKEN_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
+TIKTOKEN_SHA256 = "223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7"
+
+_encoding = None
+
+
+def tiktoken_cache_file():
+    return os.path.join(TIKTOKEN_CACHE_DIR, hashlib.sha1(TIKTOKEN_URL.encode()).hexdigest())
+
+
+def _cached_encoding_valid():
+    """The encoding file is in the cache and intact (tiktoken re-downloads it otherwise)"""
+    try:
+        with open(tiktoken_cache_file(), 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest() == TIKTOKEN_SHA256
+    except OSError:
+        return False
+
+
+def _tiktoken_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if _cached_encoding_valid():
+            try:
+                import tiktoken
+                os.environ["TIKTOKEN_CACHE_DIR"] = TIKTOKEN_CACHE_DIR
+                _encoding = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+            except Exception:
+                _encoding = False
+    return _encoding
+
+
+def tokenizer_name():
+    """The counter count_tokens actually uses"""
+    return f"tiktoken:{TIKTOKEN_ENCODING}" if _tiktoken_encoding() else "approx"
+
+
+def count_tokens(text):
+    """Number of tokens in text (0 for None)"""
+    if not text:
+        return 0
+    encoding = _tiktoken_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(-(-len(piece) // APPROX_WORD_CHARS) if piece.isalpha() and piece.isascii() else 1
+               for piece in APPROX_TOKEN_PATTERN.findall(text))
+
+
+def dataframe_context(head, rows, columns, description=None):
+    """The dataframe part of a PandasAI prompt (its CSV serializer) for this head"""
+    attributes = f' description="{description}"' if description else ""
+    return f"<dataframe{attributes}>\ndfs[0]:{rows}x{columns}\n{head.to_csv(index=False)}</dataframe>\n"
+
+
+def _name_tokens(column):
+    spaced = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(column))
+    return [t for t in re.split(r"[^0-9A-Za-z\u4e00-\u9fff]+", spaced.lower()) if len(t) > 1]
+
+
+def relevance(column, query):
+    """How strongly a query refers to a column: full name mentions outweigh shared words"""
+    query = query.lower()
+    name = str(column).lower()
+    score = 3 if name and name in query else 0
+    words = set(re.split(r"[^0-9a-z\u4e00-\u9fff]+", query))
+    return score + sum(1 for token in _name_tokens(column) if token in words or token in query)
+
+
+def _truncate(head):
+    head = head.copy()
+    for position in range(head.shape[1]):
+        column = head.iloc[:, position]
+        if column.dtype == object or str(column.dtype) in ('category', 'string'):
+            head.isetitem(position, column.astype(object).map(
+                lambda v: v[:MAX_VALUE_CHARS - 3] + "..." if isinstance(v, str) and len(v) > MAX_VALUE_CHARS else v))
+    return head
+
+
+def _category_summary(series):
+    values = series.dropna()
+    if str(series.dtype) == 'category':
+        counts = values.value_counts()
+    elif series.dtype == object and 0 < values.nunique() <= CATEGORY_MAX_VALUES:
+        counts = values.value_counts()
+    else:
+        return None
+    shown = [str(v).replace('"', "'")[:MAX_VALUE_CHARS] for v in counts.index[:CATEGORY_SUMMARY_VALUES]]
+    extra = len(counts) - len(shown)
+    return f"{series.name}: {', '.join(shown)}" + (f" (+{extra} more)" if extra > 0 else "")
+
+
+def compress(df, query, budget=TOKEN_BUDGET):
+    """
+    Shrink the dataframe context to about budget tokens. Returns None when no
+    compression is needed, else (head, description, report); report lists the
+    steps applied and the context size before and after.
+    """
+    rows, columns = df.shape
+    before = count_tokens(dataframe_context(df.head(SAMPLE_ROWS), rows, columns))
+    if not budget or before <= budget:
+        return None
+
+    steps = []
+    head = _truncate(df.head(SAMPLE_ROWS))
+    steps.append('truncate_values')
+
+    def size(frame, description=None):
+        return count_tokens(dataframe_context(frame, rows, columns, description))
+
+    if size(head) > budget and len(head) > 1:
+        head = head.head(1)
+        steps.append('sample_rows=1')
+
+    dropped = []
+    if size(head) > budget and columns > 1:
+        # Most relevant first; ties keep the original column order
+        ranked = sorted(range(columns), key=lambda i: -relevance(df.columns[i], query))
+        # Leave room for listing the dropped column names
+        available = budget * 0.75 - size(head.iloc[:, :0])
+        kept, used = [], 0
+        for position in ranked:
+            cost = count_tokens(head.iloc[:, [position]].to_csv(index=False))
+            if kept and used + cost > available:
+                continue
+            kept.append(position)
+            used += cost
+        kept.sort()
+        dropped = [df.columns[i] for i in range(columns) if i not in kept]
+        head = head.iloc[:, kept]
+        steps.append(f'columns={len(kept)}/{columns}')
+
+    # Value summaries of the kept columns first, then as many dropped names as still fit
+    summaries = []
+    for name in head.columns:
+        summary = _category_summary(df[name]) if df.columns.is_unique else None
+        if summary is None:
+            continue
+        if size(head, "; ".join(summaries + [summary])) > budget:
+            continue
+        summaries.append(summary)
+    if summaries:
+        steps.append(f'category_summary={len(summaries)}')
+
+    notes = []
+    if dropped:
+        names = [str(c).replace('"', "'") for c in dropped]
+        listed = []
+        for name in names:
+            candidate = "Other columns: " + ", ".join(listed + [name])
+            if size(head, "; ".join([candidate] + summaries)) > budget:
+                break
+            listed.append(name)
+        note = "Other columns: " + ", ".join(listed) if listed else "Other columns"
+        if len(listed) < len(names):
+            note += f" (+{len(names) - len(listed)} more)"
+        notes.append(note)
+    notes += summaries
+
+    description = "; ".join(notes) or None
+    report = {
+        'budget': budget,
+        'before_tokens': before,
+        'after_tokens': size(head, description),
+        'steps': steps,
+        'columns_kept': head.shape[1],
+        'columns_total': columns,
+        'sample_rows': len(head),
+        'tokenizer': tokenizer_name(),
+    }
+    return head, description, report
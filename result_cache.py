@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""
+Persistent cache of generated results.
+
+Entries are keyed on the dataset content hash, the normalized query text, the
+model name, the preference and a fingerprint of the frame's schema. A hit
+returns the stored code, token count and chart without calling the LLM.
+Entries expire after a TTL and the oldest ones are dropped once the cache
+holds more than the configured number of entries.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(os.getcwd(), 'cache', 'results.sqlite3'))
+TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+
+# Part of every key; bumped when the key's meaning changes so old entries are no longer matched
+KEY_VERSION = 2
+
+# Result fields replayed on a hit
+CACHED_FIELDS = ('code', 'tokens', 'chart', 'chart_thumbnail', 'charts')
+
+
+def debug_print(*args, **kwargs):
+    """Print debug messages to stderr instead of stdout"""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def normalize_query(query):
+    """
+    Whitespace and trailing punctuation do not change the question. Case does: values
+    in the question end up as case-sensitive literals in the code ('Paris' vs 'PARIS').
+    """
+    text = re.sub(r"\s+", " ", (query or "").strip())
+    return text.rstrip(" ?？.。!！")
+
+
+def schema_fingerprint(df):
+    """Hash of column names and dtypes (of each frame, for a list of frames)"""
+    if isinstance(df, (list, tuple)):
+        if len(df) != 1:
+            return hashlib.sha256(json.dumps([schema_fingerprint(frame) for frame in df]).encode('utf-8')).hexdigest()[:16]
+        df = df[0]
+    schema = [[str(column), str(dtype)] for column, dtype in df.dtypes.items()]
+    return hashlib.sha256(json.dumps(schema).encode('utf-8')).hexdigest()[:16]
+
+
+def make_key(dataset_hash, query, model, preference, schema):
+    parts = [KEY_VERSION, dataset_hash, normalize_query(query), model, preference, schema]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed result cache with TTL and entry-count eviction"""
+
+    def __init__(self, path=CACHE_PATH, ttl_seconds=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key, charts_dir=None):
+        """Stored result fields for key, or None on a miss or an expired entry"""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                value, created = row
+                if self.ttl_seconds and now - created > self.ttl_seconds:
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    conn.commit()
+                    return None
+                cached = json.loads(value)
+                # An entry whose chart file has been cleaned up is no longer complete
+                chart = cached.get('chart')
+                if chart and charts_dir and not os.path.exists(os.path.join(charts_dir, chart)):
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    conn.commit()
+                    return None
+                conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+                conn.commit()
+                return cached
+        except (sqlite3.Error, ValueError) as e:
+            debug_print(f"Result cache lookup failed: {str(e)}")
+            return None
+
+    def put(self, key, result):
+        """Store the replayable fields of a successful result"""
+        value = {field: result[field] for field in CACHED_FIELDS if result.get(field) is not None}
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now),
+                )
+                self._evict(conn, now)
+                conn.commit()
+        except sqlite3.Error as e:
+            debug_print(f"Result cache store failed: {str(e)}")
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl_seconds,))
+        if self.max_entries:
+            conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                " SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM results")
+            conn.commit()
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Process-wide ResultCache"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+"""
+Conversational sessions for long-running runner processes.
+
+A one-shot runner builds a new Agent for every question, so a follow-up such
+as "now break that down by Category" has neither the data nor the previous
+question at hand. A session keeps the Agent (with its conversation memory)
+and the loaded tables alive in the process under a caller-chosen session id;
+the next request with that id skips loading and the Agent sees the earlier
+turns. The --serve worker pool routes every request of a session to the
+worker that holds it.
+
+Live sessions are evicted after SESSION_IDLE_SECONDS without use, and the
+least recently used ones whenever their frames together exceed
+SESSION_MEMORY_MB. With SESSION_SNAPSHOT_DIR set, each session is also
+written to disk after every turn (tables as Feather once, the conversation as
+JSON; never the API credentials), so an evicted session, a recycled worker or
+a one-shot runner invoked with --session picks the conversation up again.
+Snapshots unused for SESSION_SNAPSHOT_HOURS are removed.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import threading
+from collections import OrderedDict
+
+import dataset_registry
+
+IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+MEMORY_MB = int(os.getenv("SESSION_MEMORY_MB", "512"))
+SNAPSHOT_DIR = os.getenv("SESSION_SNAPSHOT_DIR") or None
+SNAPSHOT_HOURS = float(os.getenv("SESSION_SNAPSHOT_HOURS", "24"))
+
+ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+STATE_NAME = 'state.json'
+
+
+def debug_print(*args, **kwargs):
+    """Print debug messages to stderr instead of stdout"""
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def is_session_id(value):
+    return isinstance(value, str) and bool(ID_PATTERN.match(value))
+
+
+def same_source(source, paths):
+    """Whether a follow-up naming paths asks about source (no data files means the session's own)"""
+    return not paths or paths == ['none'] or list(paths) == list(source)
+
+
+def frame_bytes(tables):
+    return int(sum(df.memory_usage(index=True, deep=True).sum() for _, df in tables))
+
+
+class Session:
+    """A live Agent with the tables it answers about and its conversation so far"""
+
+    def __init__(self, session_id, tables, dataset_hash, source, turns=0, messages=None, last_code=None):
+        self.session_id = session_id
+        self.tables = tables
+        self.dataset_hash = dataset_hash
+        self.source = list(source)
+        self.turns = turns
+        self.agent = None           # built by the runner on first use
+        self.config_key = None
+        self.messages = messages or []  # restored conversation, replayed into a new Agent
+        self.last_code = last_code
+        self.bytes = frame_bytes(tables)
+        self.last_used = time.time()
+
+    def conversation(self):
+        """The conversation as [{'message', 'is_user'}], from the Agent once there is one"""
+        if self.agent is None:
+            return list(self.messages)
+        return [{'message': str(m['message']), 'is_user': bool(m['is_user'])} for m in self.agent.context.memory.all()]
+
+    def state(self):
+        """JSON-serializable snapshot state (everything except the tables)"""
+        return {
+            'session_id': self.session_id,
+            'dataset_hash': self.dataset_hash,
+            'source': self.source,
+            'turns': self.turns,
+            'messages': self.conversation(),
+            'last_code': self.last_code,
+        }
+
+
+class SessionStore:
+    """Live sessions of this process, with idle and memory-budget eviction and optional snapshots"""
+
+    def __init__(self, idle_seconds=IDLE_SECONDS, memory_mb=MEMORY_MB, snapshot_dir=SNAPSHOT_DIR,
+                 snapshot_hours=SNAPSHOT_HOURS):
+        self.idle_seconds = idle_seconds
+        self.budget_bytes = memory_mb * 1024 * 1024
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_seconds = snapshot_hours * 3600
+        self._sessions = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, session_id):
+        """The live session, or None (expired sessions are evicted first)"""
+        self.evict_idle()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.time()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def put(self, session):
+        """Keep session live; evicts the least recently used others while over the memory budget"""
+        with self._lock:
+            session.last_used = time.time()
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            total = sum(s.bytes for s in self._sessions.values())
+            evicted = []
+            for key in list(self._sessions):
+                if total <= self.budget_bytes or key == session.session_id:
+                    continue
+                total -= self._sessions.pop(key).bytes
+                evicted.append(key)
+            self.evicted += len(evicted)
+        if evicted:
+            debug_print(f"Session memory budget exceeded, evicted: {', '.join(evicted)}")
+        return evicted
+
+    def drop(self, session_id):
+        """Forget a session, live and on disk; returns whether it existed"""
+        with self._lock:
+            existed = self._sessions.pop(session_id, None) is not None
+        if self.snapshot_dir and os.path.isdir(self._dir(session_id)):
+            shutil.rmtree(self._dir(session_id), ignore_errors=True)
+            existed = True
+        return existed
+
+    def evict_idle(self, now=None):
+        """Evict sessions idle for longer than idle_seconds and expired snapshots; returns the evicted ids"""
+        now = now or time.time()
+        with self._lock:
+            expired = [key for key, s in self._sessions.items() if self.idle_seconds and now - s.last_used > self.idle_seconds]
+            for key in expired:
+                del self._sessions[key]
+            self.evicted += len(expired)
+        if expired:
+            debug_print(f"Evicted idle sessions: {', '.join(expired)}")
+        self._prune_snapshots(now)
+        return expired
+
+    def info(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'bytes': sum(s.bytes for s in self._sessions.values()),
+                'budget_bytes': self.budget_bytes,
+                'idle_seconds': self.idle_seconds,
+                'evicted': self.evicted,
+                'snapshot_dir': self.snapshot_dir,
+            }
+
+    # ---- snapshots --------------------------------------------------------
+
+    def save(self, session):
+        """Write session to the snapshot directory (tables only the first time)"""
+        if not self.snapshot_dir:
+            return
+        directory = self._dir(session.session_id)
+        state = session.state()
+        try:
+            previous = self._read_state(session.session_id)
+            if previous is None or previous.get('dataset_hash') != session.dataset_hash:
+                shutil.rmtree(directory, ignore_errors=True)
+                os.makedirs(directory, exist_ok=True)
+                state['tables'] = [{'name': name, 'file': dataset_registry.write_table(directory, position, df)}
+                                   for position, (name, df) in enumerate(session.tables)]
+            else:
+                state['tables'] = previous['tables']
+            tmp_path = os.path.join(directory, f"{STATE_NAME}.{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, os.path.join(directory, STATE_NAME))
+        except (OSError, ValueError) as e:
+            debug_print(f"Could not snapshot session {session.session_id}: {str(e)}")
+
+    def restore(self, session_id):
+        """A Session (without Agent) from its snapshot, or None"""
+        if not self.snapshot_dir:
+            return None
+        state = self._read_state(session_id)
+        if state is None:
+            return None
+        try:
+            tables = [(t['name'], dataset_registry.read_table(self._dir(session_id), t['file'])) for t in state['tables']]
+        except (OSError, ValueError, KeyError) as e:
+            debug_print(f"Could not restore session {session_id}: {str(e)}")
+            return None
+        return Session(session_id, tables, state['dataset_hash'], state['source'], turns=state['turns'],
+                       messages=state['messages'], last_code=state.get('last_code'))
+
+    def _dir(self, session_id):
+        return os.path.join(self.snapshot_dir, session_id)
+
+    def _read_state(self, session_id):
+        try:
+            with open(os.path.join(self._dir(session_id), STATE_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _prune_snapshots(self, now):
+        if not self.snapshot_dir or not self.snapshot_seconds or not os.path.isdir(self.snapshot_dir):
+            return
+        for key in os.listdir(self.snapshot_dir):
+            try:
+                last_used = os.path.getmtime(os.path.join(self._dir(key), STATE_NAME))
+            except OSError:
+                continue
+            if now - last_used > self.snapshot_seconds and key not in self._sessions:
+                shutil.rmtree(self._dir(key), ignore_errors=True)
+
+
+_default_store = None
+
+
+def get_store():
+    """Process-wide session store (configured from the environment)"""
+    global _default_store
+    if _default_store is None:
+        _default_store = SessionStore()
+    return _default_store
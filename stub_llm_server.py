@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Local OpenAI-compatible stub of the chat completions endpoint.
+
+Answers every request with a fixed code block, so the runner, the helper and
+the tests can be exercised without network access or an API key. Latency and
+transient failures can be injected to test retries, deadlines and hedging.
+
+Usage:
+python stub_llm_server.py --port 8765 --latency 0.5
+python pandasai_runner.py "total sales" data.csv --api-key x --api-base-url http://127.0.0.1:8765/v1 --model-name stub
+"""
+
+import json
+import time
+import argparse
+import threading
+import http.server
+
+DEFAULT_CODE = ("```python\nimport pandas as pd\ndf = dfs[0]\n"
+                "total = df.groupby('Category')['Sales'].sum()\n"
+                "result = {'type': 'dataframe', 'value': total.reset_index()}\n```")
+
+
+class StubLLMServer:
+    """
+    Threaded stub server. latency delays every answer (seconds); the first
+    fail_first requests get HTTP fail_status; the first slow_first requests and
+    prompts containing slow_marker wait slow_latency seconds instead of latency.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, code=DEFAULT_CODE, latency=0.0, fail_first=0, fail_status=503,
+                 slow_first=0, slow_marker="SLOW", slow_latency=2.0):
+        self.code = code
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.slow_first = slow_first
+        self.slow_marker = slow_marker
+        self.slow_latency = slow_latency
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_request(self):
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+    def _handler(self):
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            # Keep-alive, like the real endpoint
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                number = stub._next_request()
+                prompt = body["messages"][-1]["content"] if body.get("messages") else ""
+                if number <= stub.fail_first:
+                    return self._send(stub.fail_status, {"error": {"message": "stub failure", "type": "server_error"}})
+                slow = number <= stub.fail_first + stub.slow_first or (stub.slow_marker and stub.slow_marker in prompt)
+                time.sleep(stub.slow_latency if slow else stub.latency)
+                self._send(200, {
+                    "id": f"stub-{number}", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": stub.code},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(stub.code) // 4,
+                              "total_tokens": len(prompt) // 4 + len(stub.code) // 4},
+                })
+
+            def _send(self, status, payload):
+                out = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(out)))
+                    self.end_headers()
+                    self.wfile.write(out)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client gave up (deadline or losing hedge)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before every answer.")
+    parser.add_argument("--fail-first", type=int, default=0, help="Answer the first N requests with --fail-status.")
+    parser.add_argument("--fail-status", type=int, default=503)
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.host, args.port, latency=args.latency, fail_first=args.fail_first,
+                           fail_status=args.fail_status)
+    print(f"Stub LLM listening on {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+测试批量查询 (pandasai_runner.py --batch)
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络；慢查询不应阻塞其他查询
+"""
+
+import pandas as pd
+
+import pandasai_runner
+from stub_llm_server import StubLLMServer
+
+
+def test_batch_streams_in_completion_order(tmp_path):
+    server = StubLLMServer(slow_latency=2.0).start()
+
+    data = tmp_path / "data.csv"
+    pd.DataFrame({"Category": ["a", "b", "a"], "Sales": [1, 2, 3]}).to_csv(data, index=False)
+    requests = pandasai_runner.read_batch_queries(
+        ['{"query": "SLOW total", "id": "slow"}', '"total by category"', "not json", '{"id": 7}'])
+
+    emitted = []
+    try:
+        results = pandasai_runner.run_batch(
+            str(data), requests, cli_model_name="m", cli_api_key="k",
+            cli_api_base_url=server.base_url,
+            concurrency=2, use_cache=False, emit=emitted.append)
+    finally:
+        server.stop()
+
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    # The slow query finishes last but did not hold back the others
+    assert emitted[-1]["id"] == "slow"
+    assert "groupby('Category')" in results[0]["code"]
+    assert results[1]["error"] is None and results[1]["code"]
+    assert results[2]["error"].startswith("Invalid query JSON")
+    assert results[3]["id"] == 7 and results[3]["error"] == "Missing required field: query"
+
+
+def test_batch_reports_failing_code(tmp_path):
+    """执行出错的查询在批量结果中记为失败"""
+    server = StubLLMServer(code="```python\ndf = dfs[0]\nresult = {'type': 'number', 'value': df['Missing'].sum()}\n```").start()
+    data = tmp_path / "data.csv"
+    pd.DataFrame({"Category": ["a", "b"], "Sales": [1, 2]}).to_csv(data, index=False)
+    try:
+        (result,) = pandasai_runner.run_batch(
+            str(data), pandasai_runner.read_batch_queries(['"sum of the missing column"']), cli_model_name="m",
+            cli_api_key="k", cli_api_base_url=server.base_url, use_cache=False, use_fast_path=False)
+    finally:
+        server.stop()
+
+    assert result["error"].startswith("Error executing code") and "Missing" in result["error"]
+    assert result["execution"]["valid"] is False and result["code"]
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+测试基准脚本 (benchmarks/bench_end_to_end.py, bench_excel.py, bench_fast_path.py)
+使用本地的OpenAI兼容桩服务器，无需网络
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "benchmarks"))
+
+import bench_end_to_end  # noqa: E402
+
+
+def test_percentile_and_compare():
+    assert bench_end_to_end.percentile([3, 1, 2], 50) == 2
+    assert bench_end_to_end.percentile([1, 2, 3, 4], 90) == 3.7
+
+    baseline = {"results": [{"format": "csv", "size": 10, "p50_ms": 100, "peak_rss_mb": 200}]}
+    current = {"results": [{"format": "csv", "size": 10, "p50_ms": 130, "peak_rss_mb": 210}]}
+    regressions = bench_end_to_end.compare(current, baseline, threshold=1.2)
+    assert [r["metric"] for r in regressions] == ["p50_ms"]
+
+
+def test_small_run_writes_report(tmp_path):
+    output = tmp_path / "report.json"
+    proc = subprocess.run(
+        [sys.executable, os.path.join(HERE, "benchmarks", "bench_end_to_end.py"), "--formats", "csv,pickle",
+         "--sizes", "200", "--repeat", "2", "--latency", "0", "--output", str(output)],
+        capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+
+    report = json.loads(output.read_text())
+    assert [(r["format"], r["size"]) for r in report["results"]] == [("csv", 200), ("pickle", 200)]
+    for r in report["results"]:
+        assert r["errors"] == 0 and r["runs"] == 2
+        assert r["p50_ms"] <= r["p99_ms"]
+        assert r["peak_rss_mb"] > 0
+        assert r["stages_p50_ms"]["llm_ms"] > 0
+
+
+def test_excel_benchmark():
+    proc = subprocess.run(
+        [sys.executable, os.path.join(HERE, "benchmarks", "bench_excel.py"), "--rows", "100", "--sheets", "2",
+         "--repeat", "1", "--processes", "1"],
+        capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+
+    results = json.loads(proc.stdout)
+    assert set(results["median_ms"]) >= {"openpyxl_per_sheet", "openpyxl_once", "dataset_cache"}
+    assert all(ms > 0 for ms in results["median_ms"].values())
+
+
+def test_fast_path_benchmark(tmp_path):
+    queries = tmp_path / "queries.txt"
+    queries.write_text("total Sales by Category\nWhich products sold better in the second half?\n", encoding="utf-8")
+    proc = subprocess.run(
+        [sys.executable, os.path.join(HERE, "benchmarks", "bench_fast_path.py"), "--rows", "200", "--repeat", "1",
+         "--latency", "0.2", "--queries", str(queries)],
+        capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+
+    results = json.loads(proc.stdout)
+    assert results["hit_rate"] == 0.5
+    assert [q["fast_path"] for q in results["per_query"]] == [True, False]
+    assert all(q["errors"] == 0 for q in results["per_query"])
+    assert results["hit_mean_ms"] < results["hit_llm_mean_ms"]
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+测试请求的协作式取消 (cancellation.py)：阶段边界检查、LLM调用和代码执行的中断、截止时间
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import threading
+import time
+
+import pytest
+
+import cancellation
+import pandasai_runner
+from stub_llm_server import StubLLMServer
+
+LOOP_CODE = """```python
+df = dfs[0]
+n = 0
+while True:
+    n += 1
+```"""
+
+
+@pytest.fixture
+def ask(tmp_path):
+    path = tmp_path / "sales.csv"
+    path.write_text("Category,Sales\na,1\nb,2\n")
+
+    def ask(server, cancel, query="plot the sales"):
+        return pandasai_runner.generate_pandas_code(
+            str(path), query, cli_model_name="m", cli_api_key="k", cli_api_base_url=server.base_url,
+            use_cache=False, use_fast_path=False, cancel=cancel)
+    return ask
+
+
+def test_token_stages_and_deadline():
+    """阶段入口检查取消状态；截止时间到期即视为取消"""
+    token = cancellation.CancelToken(deadline=time.time() + 60)
+    with token.stage("load"):
+        pass
+    token.cancel("stop")
+    with pytest.raises(cancellation.Cancelled, match="stop"):
+        with token.stage("load"):
+            pass
+    assert token.reason == "stop"
+
+    expired = cancellation.CancelToken(deadline=time.time() - 1)
+    assert expired.cancelled and expired.reason == "deadline exceeded"
+
+
+def test_interrupts_llm_call(ask):
+    """LLM调用进行中被另一个线程取消时立即返回，不等待响应"""
+    server = StubLLMServer(latency=30).start()
+    cancel = cancellation.CancelToken()
+    try:
+        threading.Timer(0.5, cancel.cancel, args=("cancelled by client",)).start()
+        start = time.perf_counter()
+        result = ask(server, cancel)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    assert result["error"] == "Request cancelled: cancelled by client"
+    assert result["cancelled"] == "cancelled by client" and elapsed < 10
+
+
+def test_deadline_interrupts_generated_code(ask):
+    """生成的代码死循环时，截止时间到期后中断执行"""
+    server = StubLLMServer(code=LOOP_CODE).start()
+    cancel = cancellation.CancelToken(deadline=time.time() + 3).watch()
+    try:
+        result = ask(server, cancel)
+    finally:
+        cancel.close()
+        server.stop()
+
+    assert result["cancelled"] == "deadline exceeded"
+    assert result["error"].startswith("Request cancelled")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+测试图表存储 (chart_store.py)
+"""
+
+import os
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+import chart_store
+
+
+def _render(values):
+    with chart_store.capture_figures() as images:
+        plt.bar(["a", "b"], values)
+        plt.savefig("temp_chart.png")
+    return images
+
+
+def test_capture_and_dedupe(tmp_path, monkeypatch):
+    """savefig渲染到内存不写文件；相同图表按内容哈希复用同一个文件，清单记录每个请求"""
+    monkeypatch.chdir(tmp_path)
+    images = _render([1, 2])
+    assert len(images) == 1 and images[0].startswith(b"\x89PNG")
+    assert not (tmp_path / "temp_chart.png").exists()
+    assert plt.get_fignums() == []
+
+    store = chart_store.ChartStore(str(tmp_path / "charts"), thumbnail_format="webp", thumbnail_size=64)
+    first = store.save(images[0], request_id="r1")
+    second = store.save(_render([1, 2])[0], request_id="r2")
+    other = store.save(_render([3, 1])[0], request_id="r3")
+
+    assert first["chart"] == second["chart"] != other["chart"]
+    assert not first["reused"] and second["reused"]
+    assert (tmp_path / "charts" / first["thumbnail"]).exists()
+    assert [e["chart"] for e in store.lookup("r2")] == [first["chart"]]
+    assert store.latest()["request_id"] == "r3"
+    assert store.info()["charts"] == 2
+
+
+def test_gc_retention_and_limit(tmp_path):
+    store = chart_store.ChartStore(str(tmp_path), retention_days=1, max_files=2, gc_interval_hours=0)
+    names = [store.save(_render([i, 1])[0], request_id=f"r{i}")["chart"] for i in range(4)]
+    now = time.time()
+    # r0 is older than the retention period; r1 is the oldest of the rest
+    os.utime(tmp_path / names[0], (now - 3 * 86400, now - 3 * 86400))
+    os.utime(tmp_path / names[1], (now - 3600, now - 3600))
+
+    assert store.gc(now=now) == 2
+    assert sorted(os.listdir(tmp_path)) == sorted([names[2], names[3], "manifest.jsonl", "manifest.lock", ".gc"])
+    assert [e["request_id"] for e in store._read_manifest()] == ["r2", "r3"]
+
+
+def test_discard_cancelled_request(tmp_path):
+    """取消的请求的图表被删除，其他请求也生成或复用的图表保留"""
+    store = chart_store.ChartStore(str(tmp_path / "charts"))
+    shared = store.save(_render([1, 2])[0], request_id="cancelled")
+    store.save(_render([1, 2])[0], request_id="other")
+    own = store.save(_render([5, 1])[0], request_id="cancelled")
+
+    assert store.discard("cancelled") == 1
+    assert store.lookup("cancelled") == [] and len(store.lookup("other")) == 1
+    assert (tmp_path / "charts" / shared["chart"]).exists()
+    assert not (tmp_path / "charts" / own["chart"]).exists()
+    assert store.discard("cancelled") == 0
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+测试代码清理 (code_cleaner.py)
+语料在 test_corpus/clean_code/：每个 NAME.input 对应期望输出 NAME.expected，
+名称中含 standard_pandas 的用例使用该偏好
+"""
+
+import os
+import glob
+
+import pytest
+
+import code_cleaner
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_corpus", "clean_code")
+CASES = sorted(os.path.basename(path)[:-len(".input")] for path in glob.glob(os.path.join(CORPUS_DIR, "*.input")))
+
+
+def _read(name, suffix):
+    with open(os.path.join(CORPUS_DIR, name + suffix), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_corpus(name):
+    preference = "standard_pandas" if "standard_pandas" in name else "default"
+    cleaned, compiled = code_cleaner.clean_and_compile(_read(name, ".input"), preference)
+
+    assert cleaned.rstrip("\n") == _read(name, ".expected").rstrip("\n")
+    assert "result = {" not in cleaned or "syntax_error" in name
+    assert (compiled is None) == ("syntax_error" in name)
+
+
+def test_memoized_by_source():
+    code_cleaner.clear_cache()
+    code = _read(CASES[0], ".input")
+
+    first = code_cleaner.clean_and_compile(code)
+    second = code_cleaner.clean_and_compile(code)
+    other_preference = code_cleaner.clean_and_compile(code, "standard_pandas")
+
+    assert second is first
+    assert other_preference[0] != first[0]
+    assert code_cleaner.stats == {"hits": 1, "misses": 2, "fallbacks": 0}
+    assert code_cleaner.clean_code(None) is None
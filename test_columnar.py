@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+测试Parquet/Feather/Arrow文件的按列读取 (columnar.py)
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import columnar
+import pandasai_runner
+from stub_llm_server import StubLLMServer
+
+COLUMNS = ["Category", "Sales"] + [f"metric_{i}" for i in range(50)]
+
+# 分析漏掉了拼接出来的列名，执行失败后应补齐其余列重新执行
+MISSED_COLUMN_CODE = ("```python\ndf = dfs[0]\nrows = df.query('Sales > 1 and ' + 'metric_5 >= 0')\n"
+                      "result = {'type': 'number', 'value': len(rows)}\n```")
+
+
+def _write(df, path, file_ext):
+    if file_ext == "parquet":
+        df.to_parquet(path, index=False)
+    elif file_ext == "feather":
+        df.to_feather(path)
+    else:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.ipc.new_file(str(path), table.schema) as writer:
+            writer.write_table(table, max_chunksize=100)
+
+
+@pytest.fixture
+def wide(tmp_path):
+    data = {"Category": ["a", "b"] * 250, "Sales": np.arange(500)}
+    data.update({f"metric_{i}": np.random.RandomState(i).rand(500) for i in range(50)})
+    return tmp_path, pd.DataFrame(data)
+
+
+def test_referenced_columns():
+    code = "df = dfs[0]\ntotal = df.groupby('Category')['Sales'].sum()\nresult = {'type': 'dataframe', 'value': total}"
+    assert columnar.referenced_columns(code, COLUMNS) == ["Category", "Sales"]
+    code = "df = dfs[0]\nbig = df[df.metric_3 > 0.5]\nresult = {'type': 'number', 'value': big.loc[:, 'Sales'].mean()}"
+    assert columnar.referenced_columns(code, COLUMNS) == ["Sales", "metric_3"]
+    code = "df = dfs[0]\nresult = {'type': 'number', 'value': len(df.query('Sales > 10 and `metric_7` < 1'))}"
+    assert columnar.referenced_columns(code, COLUMNS) == ["Sales", "metric_7"]
+    # 整表聚合、输出整表或按位置访问时需要全部列
+    for code in ("df = dfs[0]\nresult = {'type': 'dataframe', 'value': df.describe()}",
+                 "df = dfs[0]\nresult = {'type': 'dataframe', 'value': df.groupby('Category').sum()}",
+                 "df = dfs[0]\nresult = {'type': 'dataframe', 'value': df[df['Sales'] > 1]}",
+                 "df = dfs[0]\nresult = {'type': 'number', 'value': df.iloc[0, 3]}",
+                 "for df in dfs:\n    print(df)"):
+        assert columnar.referenced_columns(code, COLUMNS) is None
+
+
+@pytest.mark.parametrize("file_ext", ["parquet", "feather", "arrow"])
+def test_reads(wide, file_ext):
+    tmp_path, df = wide
+    path = str(tmp_path / f"wide.{file_ext}")
+    _write(df, path, file_ext)
+    assert columnar.read_schema(path, file_ext).names == COLUMNS
+    assert columnar.read_sample(path, file_ext, 150).shape == (150, len(COLUMNS))
+    projected = columnar.read_columns(path, file_ext, ["Category", "Sales"])
+    pd.testing.assert_frame_equal(projected, df[["Category", "Sales"]])
+    pd.testing.assert_frame_equal(pandasai_runner.FILE_READERS["arrow"](path) if file_ext == "arrow"
+                                  else columnar.read_columns(path, file_ext), df)
+
+
+@pytest.mark.parametrize("file_ext", ["parquet", "arrow"])
+def test_loads_only_used_columns(wide, file_ext):
+    tmp_path, df = wide
+    path = str(tmp_path / f"wide.{file_ext}")
+    _write(df, path, file_ext)
+    server = StubLLMServer().start()
+    try:
+        result = pandasai_runner.generate_pandas_code(
+            path, "total sales by category", cli_model_name="m", cli_api_key="k",
+            cli_api_base_url=server.base_url, use_cache=False, load_mode="auto")
+    finally:
+        server.stop()
+
+    assert result["error"] is None
+    assert result["load_mode"] == "columnar"
+    assert result["columnar"] == {"format": file_ext, "columns_total": len(COLUMNS), "columns_loaded": 2, "lazy_reload": False}
+    assert result["timings"]["load_columns_ms"] >= 0
+
+
+def test_missed_column_loads_lazily(wide):
+    tmp_path, df = wide
+    path = str(tmp_path / "wide.feather")
+    _write(df, path, "feather")
+    server = StubLLMServer(code=MISSED_COLUMN_CODE).start()
+    try:
+        result = pandasai_runner.generate_pandas_code(
+            path, "rows with sales", cli_model_name="m", cli_api_key="k",
+            cli_api_base_url=server.base_url, use_cache=False, load_mode="schema")
+    finally:
+        server.stop()
+
+    assert result["error"] is None
+    assert result["code"]
+    assert result["columnar"]["lazy_reload"] is True
+    assert result["columnar"]["columns_loaded"] == len(COLUMNS)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+测试分块加载 (data_loader.py)
+"""
+
+import pandas as pd
+
+import data_loader
+
+
+def _frame(rows=1000):
+    return pd.DataFrame({
+        "Category": [["Electronics", "Audio", "Gaming"][i % 3] for i in range(rows)],
+        "Product": [f"p{i}" for i in range(rows)],
+        "Sales": [float(i) for i in range(rows)],
+    })
+
+
+def test_chunked_csv_matches_full_read(tmp_path):
+    """分块读取与一次性读取的数据一致；开启时低基数字符串列变为category"""
+    path = tmp_path / "data.csv"
+    _frame().to_csv(path, index=False)
+
+    sample = data_loader.read_sample(str(path), "csv", nrows=50)
+    df = data_loader.read_chunked(str(path), "csv", sample=sample, chunksize=128, categorize=True)
+
+    assert len(sample) == 50
+    assert isinstance(df["Category"].dtype, pd.CategoricalDtype)
+    assert df["Product"].dtype == object
+    pd.testing.assert_frame_equal(df.astype({"Category": object}), pd.read_csv(path))
+    # Default: plain object columns, exactly what read_csv gives
+    pd.testing.assert_frame_equal(data_loader.read_chunked(str(path), "csv", sample=sample, chunksize=128),
+                                  pd.read_csv(path))
+
+
+def test_json_lines(tmp_path):
+    path = tmp_path / "data.json"
+    _frame(300).to_json(path, orient="records", lines=True)
+    array_path = tmp_path / "array.json"
+    _frame(3).to_json(array_path, orient="records")
+
+    assert data_loader.stream_format(str(path), "json") == "jsonl"
+    assert data_loader.stream_format(str(array_path), "json") is None
+    df = data_loader.read_chunked(str(path), "json", chunksize=64)
+    assert df.shape == (300, 3)
+    assert df["Sales"].sum() == sum(range(300))
+
+
+def test_resolve_load_mode(tmp_path):
+    path = tmp_path / "small.csv"
+    _frame(10).to_csv(path, index=False)
+
+    assert data_loader.resolve_load_mode("schema", str(path), "csv") == "schema"
+    assert data_loader.resolve_load_mode("auto", str(path), "csv") == "full"
+    assert data_loader.resolve_load_mode("schema", str(path), "xlsx") == "full"
+    assert data_loader.resolve_load_mode("full", str(path), "csv") == "full"
+
+
+def test_optimize_dtypes_reports_savings():
+    """开启时低基数字符串转category、整数最小降到int32；日期字符串转datetime"""
+    df = pd.DataFrame({
+        "Category": ["a", "b"] * 50,
+        "Date": [f"2024-01-0{i % 9 + 1}" for i in range(100)],
+        "Mixed": ["2024-01-01"] * 99 + ["soon"],
+        "Count": list(range(100)),
+        "Price": [0.1] * 100,
+    })
+    optimized, report = data_loader.optimize_dtypes(df, categorize=True, downcast_ints=True)
+
+    assert isinstance(optimized["Category"].dtype, pd.CategoricalDtype)
+    assert optimized["Date"].dtype.kind == "M"
+    assert optimized["Mixed"].dtype.kind != "M"
+    assert optimized["Count"].dtype == "int32"
+    assert optimized["Price"].dtype == "float64"
+    assert report["after_bytes"] < report["before_bytes"]
+    assert report["columns"]["Count"] == "int64->int32"
+    # The input frame is left untouched
+    assert df["Count"].dtype == "int64"
+    assert (optimized["Count"] == df["Count"]).all()
+
+
+def test_validation_frames():
+    """分层抽样保留每个类别；dtype模拟数据保持列名和类型"""
+    df = pd.DataFrame({
+        "Category": ["common"] * 9990 + ["rare"] * 10,
+        "Sales": range(10000),
+        "When": pd.date_range("2024-01-01", periods=10000, freq="h"),
+    })
+    df, _ = data_loader.optimize_dtypes(df, categorize=True)
+    sample = data_loader.stratified_sample(df, nrows=200)
+
+    assert 150 < len(sample) <= 200
+    assert set(sample["Category"]) == {"common", "rare"}
+    assert sample.index.is_monotonic_increasing
+
+    mock = data_loader.dtype_mock(df)
+    assert len(mock) == data_loader.MOCK_ROWS
+    assert list(mock.columns) == list(df.columns)
+    assert mock.dtypes.equals(df.dtypes)
+
+
+def _sales():
+    return pd.DataFrame({
+        "Region": ["East", "West", "North", "South"] * 25,
+        "Cat": ["a", "b", "c", "d", "a"] * 20,
+        "Sales": [3_000_000 + i for i in range(100)],
+        "Date": ["2024-01-01"] * 100,
+    })
+
+
+def test_default_optimization_keeps_answers():
+    """默认优化后的数据与原始数据的算术、分组和字符串运算结果相同"""
+    df = _sales()
+    optimized, report = data_loader.optimize_dtypes(df)
+
+    assert set(report["columns"]) == {"Date"}
+    # int32 would wrap around: 3_000_000 * 1000 > 2**31
+    pd.testing.assert_series_equal(optimized["Sales"] * 1000, df["Sales"] * 1000)
+    assert (optimized["Sales"] * 1000).min() == 3_000_000_000
+    # A categorical column would also report the groups the filter removed (observed=False)
+    east = lambda frame: frame[frame.Region == "East"].groupby("Cat")["Sales"].sum()  # noqa: E731
+    pd.testing.assert_series_equal(east(optimized), east(df))
+    assert len(east(optimized)) == df[df.Region == "East"]["Cat"].nunique()
+    pd.testing.assert_series_equal(optimized["Region"] + "_x", df["Region"] + "_x")
+    pd.testing.assert_series_equal(optimized["Region"].str.lower(), df["Region"].str.lower())
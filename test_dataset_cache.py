@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+测试数据集缓存 (dataset_cache.py)
+"""
+
+import os
+import re
+
+import pandas as pd
+
+import dataset_cache
+
+
+def _counting_reader(calls):
+    def reader(path):
+        calls.append(path)
+        return pd.read_csv(path)
+    return reader
+
+
+def test_same_bytes_skip_parsing(tmp_path):
+    """相同内容的文件第二次加载不再调用解析函数"""
+    csv = tmp_path / "a.csv"
+    pd.DataFrame({"Category": ["x", "y", "x"], "Sales": [1, 2, 3]}).to_csv(csv, index=False)
+    copy = tmp_path / "b.csv"
+    copy.write_bytes(csv.read_bytes())
+
+    calls = []
+    cache = dataset_cache.DatasetCache(cache_dir=str(tmp_path / "cache"))
+    df1, status1, digest1 = cache.load(str(csv), "csv", _counting_reader(calls))
+    df2, status2, digest2 = cache.load(str(copy), "csv", _counting_reader(calls))
+
+    assert (status1, status2) == ("miss", "memory")
+    assert digest1 == digest2
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(df1, df2)
+
+    # A new process only has the disk layer
+    fresh = dataset_cache.DatasetCache(cache_dir=str(tmp_path / "cache"))
+    df3, status3, _ = fresh.load(str(csv), "csv", _counting_reader(calls))
+    assert status3 == "disk"
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(df1, df3)
+
+    info = fresh.info()
+    assert (info["misses"], info["memory_hits"], info["disk_hits"]) == (1, 1, 1)
+    assert fresh.purge() == 1
+    assert fresh.info()["disk_entries"] == 0
+
+
+def test_variant_file_names_are_portable(tmp_path):
+    """工作表名等加载变体不直接出现在缓存文件名中"""
+    csv = tmp_path / "a.csv"
+    pd.DataFrame({"Sales": [1, 2]}).to_csv(csv, index=False)
+    cache = dataset_cache.DatasetCache(cache_dir=str(tmp_path / "cache"))
+    for variant in ("sheet:Q1 销售", "sheet:Q1/销售", "chunked"):
+        assert cache.load(str(csv), "xlsx", pd.read_csv, variant=variant)[1] == "miss"
+        assert cache.has(dataset_cache.file_digest(str(csv)), "xlsx", variant)
+
+    names = [name for name in os.listdir(tmp_path / "cache") if name.endswith(".feather")]
+    assert len(names) == 3
+    assert all(re.fullmatch(r"[0-9a-f]+-xlsx-[0-9a-f]+\.feather", name) for name in names)
+
+
+def test_memory_budget_evicts_lru(tmp_path):
+    """内存层超过字节预算时淘汰最久未使用的数据集"""
+    cache = dataset_cache.DatasetCache(cache_dir=str(tmp_path / "cache"), memory_budget_mb=1)
+    for i in range(3):
+        path = tmp_path / f"{i}.csv"
+        pd.DataFrame({"v": range(i * 60000, (i + 1) * 60000)}).to_csv(path, index=False)
+        cache.load(str(path), "csv", pd.read_csv)
+
+    info = cache.info()
+    assert info["memory_bytes"] <= info["memory_budget_bytes"]
+    assert info["memory_evictions"] >= 1
+    assert info["disk_entries"] == 3
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+测试数据集画像 (dataset_profile.py)：按列统计、分块与增量计算、磁盘缓存，以及作为提示词上下文
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset_cache
+import dataset_profile
+import pandasai_runner
+from stub_llm_server import StubLLMServer
+
+
+@pytest.fixture
+def profiles():
+    return dataset_profile.get_cache()
+
+
+def _frame(rows=1200):
+    return pd.DataFrame({
+        "Category": pd.Series(["a", "b", None] * (rows // 3)),
+        "Sales": np.arange(rows),
+        "Date": pd.date_range("2024-01-01", periods=rows, freq="h"),
+        "Id": [f"id{i}" for i in range(rows)],
+    })
+
+
+def _rounded(profile):
+    for column in profile["columns"].values():
+        if "mean" in column:
+            column["mean"] = round(column["mean"], 6)
+    return profile
+
+
+def test_column_statistics_independent_of_chunking():
+    df = _frame()
+    full = dataset_profile.summarize(dataset_profile.fold(df))
+    assert full["rows"] == 1200
+    category = full["columns"]["Category"]
+    assert (category["nulls"], category["distinct"]) == (400, 2)
+    assert category["top"] == [{"value": "a", "count": 400}, {"value": "b", "count": 400}]
+    sales = full["columns"]["Sales"]
+    assert (sales["min"], sales["max"], sales["mean"]) == (0, 1199, 599.5)
+    assert sales["quantiles"]["p50"] == 599.5
+    assert full["columns"]["Date"]["min"] == "2024-01-01 00:00:00"
+    assert abs(full["columns"]["Id"]["distinct"] - 1200) < 120 and full["columns"]["Id"]["distinct_estimated"]
+
+    # 分块和增量计算得到同样的画像
+    chunked = dataset_profile.summarize(dataset_profile.fold(df, chunk_rows=100))
+    appended = dataset_profile.summarize(dataset_profile.fold(df.iloc[700:], dataset_profile.fold(df.iloc[:700]), offset=700))
+    assert _rounded(full) == _rounded(chunked) == _rounded(appended)
+    assert "Category (text): 400 nulls, 2 distinct: a (400), b (400)" in dataset_profile.describe(full)
+
+
+def test_cached_and_incremental_on_append(profiles, tmp_path, monkeypatch):
+    path = tmp_path / "sales.csv"
+    _frame(600).to_csv(path, index=False)
+    df = pd.read_csv(path)
+    first, status = profiles.profile(df, dataset_cache.file_digest(path), "sales", file_path=str(path))
+    assert status == "computed" and first["rows"] == 600
+
+    # 新的进程从磁盘读取
+    again = dataset_profile.ProfileCache(profiles.profile_dir)
+    assert again.profile(df, dataset_cache.file_digest(path), "sales", file_path=str(path)) == (first, "disk")
+
+    # 追加行后只计算新增的行
+    with open(path, "a") as f:
+        _frame(1200).iloc[600:].to_csv(f, index=False, header=False)
+    df = pd.read_csv(path)
+    folded = []
+    fold = dataset_profile.fold
+    monkeypatch.setattr(dataset_profile, "fold", lambda frame, *args, **kwargs: folded.append(len(frame)) or fold(frame, *args, **kwargs))
+    profile, status = again.profile(df, dataset_cache.file_digest(path), "sales", file_path=str(path))
+    assert status == "incremental" and folded == [600]
+    expected = dataset_profile.summarize(fold(df), {c: str(t) for c, t in df.dtypes.items()})
+    assert _rounded(profile) == _rounded(expected)
+
+
+def test_runner_returns_profile_and_uses_it_in_prompt(profiles, tmp_path):
+    path = tmp_path / "sales.csv"
+    _frame(300).to_csv(path, index=False)
+    server = StubLLMServer().start()
+    try:
+        results = [pandasai_runner.generate_pandas_code(str(path), "total sales by category", cli_model_name="m",
+                                                        cli_api_key="k", cli_api_base_url=server.base_url,
+                                                        use_cache=False, prompt_context=context, use_fast_path=False)
+                   for context in ("profile", "rows")]
+    finally:
+        server.stop()
+
+    profiled, rows = results
+    assert profiled["error"] is None and profiled["prompt_context"] == "profile"
+    assert profiled["profile_cache"] == "computed"
+    assert profiled["dataset_profile"]["columns"]["Category"]["dtype"] == "object"
+    assert "profile_ms" in profiled["timings"]
+    # 画像总是随结果返回，'rows' 只是不放进提示词
+    assert rows["profile_cache"] == "memory" and "prompt_context" not in rows
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+测试数据集注册表 (dataset_registry.py)：导入一次，之后按数据集ID提问
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import os
+import time
+
+import pandas as pd
+import pytest
+
+import dataset_registry
+import pandasai_runner
+from stub_llm_server import StubLLMServer
+
+
+@pytest.fixture
+def registry():
+    return dataset_registry.get_registry()
+
+
+def _csv(tmp_path, name, rows=100):
+    path = tmp_path / name
+    pd.DataFrame({"Category": ["a", "b"] * (rows // 2), "Sales": range(rows)}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_ingest_then_query_by_id(registry, tmp_path, monkeypatch):
+    path = _csv(tmp_path, "sales.csv")
+    ingested = pandasai_runner.ingest_dataset(path)
+    assert ingested["error"] is None and ingested["status"] == "created"
+    assert dataset_registry.is_dataset_id(ingested["dataset_id"])
+    assert ingested["tables"][0]["rows"] == 100
+    assert ingested["tables"][0]["schema"] == {"Category": "object", "Sales": "int64"}
+    # 相同内容再次导入得到同一个ID
+    assert pandasai_runner.ingest_dataset(path)["status"] == "existing"
+
+    # 上传的文件已删除，按ID提问不再解析
+    os.remove(path)
+    monkeypatch.setitem(pandasai_runner.FILE_READERS, "csv", None)
+    server = StubLLMServer().start()
+    try:
+        result = pandasai_runner.generate_pandas_code(
+            ingested["dataset_id"], "total sales by category", cli_model_name="m", cli_api_key="k",
+            cli_api_base_url=server.base_url, use_cache=False)
+    finally:
+        server.stop()
+    assert result["error"] is None
+    assert result["dataset_id"] == ingested["dataset_id"]
+    assert result["dataset_cache"] == "registry"
+    assert "groupby('Category')" in result["code"]
+
+
+def test_unknown_id(registry):
+    result = pandasai_runner.generate_pandas_code("ds_00000000000000000000", "q", cli_model_name="m",
+                                                  cli_api_key="k", cli_api_base_url="http://127.0.0.1:9/v1")
+    assert "Unknown or expired dataset" in result["error"]
+
+
+def test_age_and_quota_eviction(registry, tmp_path):
+    ids = [pandasai_runner.ingest_dataset(_csv(tmp_path, f"f{i}.csv", rows=200 + i * 2))["dataset_id"] for i in range(3)]
+    assert registry.info()["datasets"] == 3
+
+    # 超过最长保留时间的先淘汰
+    old = time.time() - 30 * 86400
+    os.utime(registry._meta_path(ids[0]), (old, old))
+    assert registry.gc() == [ids[0]]
+
+    # 超出配额时淘汰最久未使用的
+    registry.load(ids[1])
+    registry.quota_bytes = registry.info()["bytes"] - 1
+    assert registry.gc() == [ids[2]]
+    assert [d["dataset_id"] for d in registry.list()] == [ids[1]]
+    assert registry.delete(ids[1]) is True
+    assert registry.get(ids[1]) is None
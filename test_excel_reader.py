@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+测试Excel快速读取 (excel_reader.py) 与工作簿的一次性列式缓存
+"""
+
+import pandas as pd
+import pytest
+
+import dataset_cache
+import excel_reader
+import pandasai_runner
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "book.xlsx"
+    frames = {
+        "Orders": pd.DataFrame({"Category": ["a", "b", None] * 20, "Sales": range(60),
+                                "Date": pd.date_range("2024-01-01", periods=60)}),
+        "Returns": pd.DataFrame({"Category": ["a", "b"], "Amount": [1.5, 2.25]}),
+    }
+    with pd.ExcelWriter(path) as writer:
+        for sheet, frame in frames.items():
+            frame.to_excel(writer, sheet_name=sheet, index=False)
+    return str(path), frames
+
+
+def test_read_sheet_matches_read_excel(workbook):
+    path, _ = workbook
+    pd.testing.assert_frame_equal(excel_reader.read_sheet(path, engine="openpyxl"), pd.read_excel(path))
+    pd.testing.assert_frame_equal(excel_reader.read_sheet(path, "Returns", engine="openpyxl"),
+                                  pd.read_excel(path, sheet_name="Returns"))
+    with pytest.raises(ValueError):
+        excel_reader.engine_name("xlrd")
+
+
+def test_parallel_sheets(workbook, monkeypatch):
+    """多进程解析与单进程结果一致"""
+    path, _ = workbook
+    monkeypatch.setattr(excel_reader, "PARALLEL_MIN_MB", 0)
+    serial = excel_reader.read_sheets(path, ["Orders", "Returns"], engine="openpyxl", processes=1)
+    parallel = excel_reader.read_sheets(path, ["Orders", "Returns"], engine="openpyxl", processes=2)
+    assert list(parallel) == ["Orders", "Returns"]
+    for sheet in serial:
+        pd.testing.assert_frame_equal(parallel[sheet], serial[sheet])
+
+
+def test_calamine_matches_openpyxl(workbook):
+    pytest.importorskip("python_calamine")
+    path, _ = workbook
+    calamine = excel_reader.read_sheets(path, ["Orders", "Returns"], engine="calamine", processes=1)
+    for sheet, frame in calamine.items():
+        pd.testing.assert_frame_equal(frame, pd.read_excel(path, sheet_name=sheet))
+
+
+def test_workbook_parsed_once(workbook, monkeypatch):
+    """第一次解析后每个工作表都存入数据集缓存，之后不再解析Excel"""
+    path, frames = workbook
+    calls = []
+    read_sheets = excel_reader.read_sheets
+    monkeypatch.setattr(excel_reader, "read_sheets", lambda *args, **kwargs: calls.append(args) or read_sheets(*args, **kwargs))
+
+    first = {}
+    tables, _, _ = pandasai_runner.load_dataset(path, first, optimize_dtypes=False)
+    assert calls == [(path, ["Orders", "Returns"])]
+    assert first["dataset_cache"] == "miss"
+    pd.testing.assert_frame_equal(dict(tables)["book_Returns"], frames["Returns"])
+
+    dataset_cache._default_cache = dataset_cache.DatasetCache(cache_dir=dataset_cache.get_cache().cache_dir)
+    again = {}
+    pandasai_runner.load_dataset(path, again, optimize_dtypes=False)
+    assert len(calls) == 1
+    assert again["dataset_cache"] == "disk"
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+测试无需LLM的快速路径 (fast_path.py)：常见的聚合、计数和排名问题直接生成pandas代码
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import pandas as pd
+import pytest
+
+import fast_path
+import pandasai_runner
+from stub_llm_server import StubLLMServer
+
+
+def _frame():
+    return pd.DataFrame({
+        "Category": ["a", "b", "c", "a"] * 25,
+        "Product": [f"p{i % 10}" for i in range(100)],
+        "Sales": range(100),
+        "Price": [1.5, 2.5] * 50,
+        "Date": pd.date_range("2024-01-01", periods=100, freq="D"),
+    })
+
+
+@pytest.mark.parametrize("query,intent,expected", [
+    ("What are the total sales per category?", "aggregate", {"a": 2475, "b": 1225, "c": 1250}),
+    ("各Category的Sales总和", "aggregate", {"a": 2475, "b": 1225, "c": 1250}),
+    ("average Price", "aggregate", 2.0),
+    ("按Category统计Price的平均值", "aggregate", {"a": 2.0, "b": 2.5, "c": 1.5}),
+    ("top 2 Product by Sales", "top_n", {"p9": 540, "p8": 530}),
+    ("Sales最高的前2个Product", "top_n", {"p9": 540, "p8": 530}),
+    ("which category has the lowest sales", "top_n", {"b": 1225}),
+    ("how many rows", "count_rows", 100),
+    ("数据有多少条记录？", "count_rows", 100),
+    ("number of rows per Category", "count_rows", {"a": 50, "b": 25, "c": 25}),
+    ("how many unique products", "count_distinct", 10),
+    ("max Date", "aggregate", pd.Timestamp("2024-04-09")),
+])
+def test_matches_english_and_chinese(query, intent, expected):
+    df = _frame()
+    answer = fast_path.match(query, df)
+    assert answer is not None and answer["intent"] == intent
+    assert answer["confidence"] >= fast_path.MIN_CONFIDENCE
+    value = fast_path.run(answer["code"], [df])["value"]
+    if isinstance(expected, dict):
+        value = dict(zip(value.iloc[:, 0], value.iloc[:, 1]))
+    assert value == expected
+
+
+@pytest.mark.parametrize("query", [
+    "Sales in 2024",                        # 过滤条件
+    "total Sales and average Price",        # 两个聚合
+    "average Category",                     # 非数值列
+    "total revenue by Category",            # 不存在的列
+    "Sales的同比增长",                      # 不认识的词
+    "average price?",                       # 看似可以但 'price' 同时匹配两列时是歧义
+])
+def test_leaves_other_questions_to_llm(query):
+    df = _frame()
+    if query == "average price?":
+        df = df.assign(PRICE=df["Price"])
+    assert fast_path.match(query, df) is None
+
+
+def test_runner_answers_without_llm(tmp_path):
+    path = tmp_path / "sales.csv"
+    _frame().to_csv(path, index=False)
+    server = StubLLMServer().start()
+    try:
+        ask = lambda query, **kwargs: pandasai_runner.generate_pandas_code(  # noqa: E731
+            str(path), query, cli_model_name="m", cli_api_key="k", cli_api_base_url=server.base_url, use_cache=False,
+            **kwargs)
+        fast = ask("bar chart of total Sales by Category")
+        assert server.requests == 0
+        fallback = ask("which products sold better in the second half of the year")
+        disabled = ask("total Sales by Category", use_fast_path=False)
+        requests = server.requests
+    finally:
+        server.stop()
+
+    assert fast["error"] is None and fast["source"] == "fast_path"
+    assert fast["fast_path"] == {"intent": "aggregate", "confidence": 1.0}
+    assert "groupby('Category')['Sales'].sum()" in fast["code"] and "plt.show()" in fast["code"]
+    assert fast["chart"] and "llm_ms" not in fast["timings"]
+    assert (fallback["source"], disabled["source"], requests) == ("llm", "llm", 2)
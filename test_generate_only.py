@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+测试只生成代码的执行模式 (generate_pandas_code(execution=...))
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import pandas as pd
+import pytest
+
+import pandasai_runner
+import result_cache
+from stub_llm_server import StubLLMServer
+
+BROKEN_CODE = "```python\ndf = dfs[0]\nresult = {'type': 'number', 'value': df['Missing'].sum()}\n```"
+
+
+@pytest.fixture
+def data(tmp_path):
+    path = tmp_path / "data.csv"
+    pd.DataFrame({"Category": ["a", "b"] * 2000, "Sales": range(4000)}).to_csv(path, index=False)
+    return str(path)
+
+
+def _run(server, data, execution, load_mode="full"):
+    return pandasai_runner.generate_pandas_code(
+        data, f"total {execution} {load_mode}", cli_model_name="m", cli_api_key="k", cli_api_base_url=server.base_url,
+        use_cache=False, load_mode=load_mode, execution=execution)
+
+
+@pytest.mark.parametrize("execution,load_mode", [("sample", "full"), ("mock", "full"), ("sample", "schema")])
+def test_validates_without_full_pass(data, execution, load_mode):
+    server = StubLLMServer().start()
+    try:
+        result = _run(server, data, execution, load_mode)
+    finally:
+        server.stop()
+
+    assert result["error"] is None
+    assert "groupby('Category')" in result["code"]
+    assert result["execution"]["mode"] == execution
+    assert result["execution"]["valid"] is True
+    assert result["execution"]["rows"] <= 1000
+    assert result["execution"]["validation_ms"] >= 0
+    assert result["timings"]["llm_ms"] > 0 and result["timings"]["execute_ms"] > 0
+    # Schema-first loading never reads the full file when nothing runs on it
+    assert load_mode != "schema" or "dataset_cache" not in result
+
+
+def test_reports_failing_code(data):
+    server = StubLLMServer(code=BROKEN_CODE).start()
+    try:
+        result = _run(server, data, "sample")
+    finally:
+        server.stop()
+
+    assert result["code"]
+    assert result["execution"]["valid"] is False
+    assert "Missing" in result["execution"]["error"]
+
+
+def test_full_run_reports_failing_code(data):
+    """在完整数据上执行失败的代码作为请求的错误返回"""
+    server = StubLLMServer(code=BROKEN_CODE).start()
+    try:
+        result = _run(server, data, "full")
+    finally:
+        server.stop()
+
+    assert result["code"] and result["source"] == "llm"
+    assert result["error"].startswith("Error executing code") and "Missing" in result["error"]
+    assert result["execution"]["valid"] is False
+
+
+def test_reports_failed_generation(data):
+    """LLM调用失败时没有代码可执行，返回错误而不是空结果"""
+    server = StubLLMServer(fail_first=1000, fail_status=400).start()
+    try:
+        result = _run(server, data, "full")
+    finally:
+        server.stop()
+
+    assert result["error"] == "No code was generated"
+    assert result["code"] is None and server.requests > 0
+
+
+def test_agent_cache_hit_returns_code(data, monkeypatch):
+    """PandasAI自身缓存命中时不调用LLM，代码仍然执行并返回"""
+    server = StubLLMServer().start()
+    try:
+        ask = lambda: pandasai_runner.generate_pandas_code(  # noqa: E731
+            data, "total sales by category", cli_model_name="m", cli_api_key="k", cli_api_base_url=server.base_url,
+            use_fast_path=False)
+        first = ask()
+        # 只保留PandasAI的缓存
+        monkeypatch.setattr(result_cache, "_default_cache", result_cache.ResultCache(path="other.sqlite3"))
+        second = ask()
+    finally:
+        server.stop()
+
+    assert first["error"] is None and second["error"] is None
+    assert second["result_cache"] == "miss" and second["code"] == first["code"]
+    assert server.requests == 1
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+测试 pandasai_helper.py 的批量模式：多个数据文件 × 多个查询，进程池中每个文件只加载一次
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+import pandas as pd
+
+import pandasai_helper
+from stub_llm_server import StubLLMServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_reads_queries_and_files(tmp_path):
+    """查询文件支持纯文本行、JSON行和注释；目录下只取CSV文件"""
+    queries = tmp_path / "queries.txt"
+    queries.write_text('总销售额\n# 注释\n{"query": "how many rows", "id": 3}\n"平均价格"\n')
+    (tmp_path / "b.csv").write_text("x\n1\n")
+    (tmp_path / "a.csv").write_text("x\n1\n")
+    (tmp_path / "notes.txt").write_text("")
+
+    assert pandasai_helper.read_queries(str(queries)) == [
+        {"query": "总销售额"}, {"query": "how many rows", "id": 3}, {"query": "平均价格"}]
+    assert [os.path.basename(p) for p in pandasai_helper.find_batch_files(str(tmp_path))] == ["a.csv", "b.csv"]
+    assert pandasai_helper.find_batch_files(str(tmp_path / "b.*")) == [str(tmp_path / "b.csv")]
+
+
+def test_output_names_never_collide():
+    """不同目录下的同名文件得到各自的输出名，后缀不会与已有的文件名重复"""
+    files = [os.path.join("a", "east.csv"), os.path.join("a", "east_2.csv"), os.path.join("b", "east.csv"),
+             os.path.join("c", "east.csv"), os.path.join("c", "east_2.csv")]
+    names = pandasai_helper.output_names(files)
+    assert [names[f] for f in files] == ["east", "east_2", "east_3", "east_4", "east_2_2"]
+
+
+def test_batch_writes_per_file_outputs_and_summary(tmp_path):
+    """每个文件一个JSONL和Parquet结果，summary记录吞吐量和失败；读取失败的文件只影响它自己的查询"""
+    data = tmp_path / "data"
+    data.mkdir()
+    for name, rows in (("east", "a,1\nb,2\na,3\n"), ("west", "a,5\nc,1\n")):
+        (data / f"{name}.csv").write_text("Category,Sales\n" + rows)
+    (data / "broken.csv").write_text("")
+    (tmp_path / "queries.txt").write_text("total Sales by Category\nplot the sales trend\n")
+
+    server = StubLLMServer().start()
+    env = dict(os.environ, DEEPSEEK_API_KEY="k", DEEPSEEK_API_BASE=server.base_url)
+    try:
+        proc = subprocess.run([sys.executable, os.path.join(HERE, "pandasai_helper.py"), "--batch", "data",
+                               "--queries", "queries.txt", "--workers", "2", "--format", "both", "--no-cache"],
+                              cwd=str(tmp_path), env=env, capture_output=True, text=True, timeout=300)
+    finally:
+        server.stop()
+
+    assert proc.returncode == 1, proc.stderr  # the broken file's queries failed
+    (run_dir,) = (tmp_path / "output").glob("batch-*")
+    summary = json.loads((run_dir / "summary.json").read_text())
+    assert (summary["files"], summary["queries"], summary["answers"]) == (3, 2, 6)
+    assert (summary["succeeded"], summary["failed"], summary["workers"]) == (4, 2, 2)
+    assert {f["file"] for f in summary["failures"]} == {os.path.join("data", "broken.csv")}
+    assert all(f["error"].startswith("Error loading file") for f in summary["failures"])
+    assert summary["answers_per_s"] > 0
+
+    east = [json.loads(line) for line in (run_dir / "east.jsonl").read_text().splitlines()]
+    assert [r["query"] for r in east] == ["total Sales by Category", "plot the sales trend"]
+    assert [r["source"] for r in east] == ["fast_path", "llm"] and all(r["code"] for r in east)
+    west = pd.read_parquet(run_dir / "west.parquet")
+    assert list(west["index"]) == [0, 1] and west["error"].isna().all()
+    assert set(west["file"]) == {os.path.join("data", "west.csv")}
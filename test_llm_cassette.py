@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+测试LLM调用的录制与回放 (llm_cassette.py)
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import time
+
+import pytest
+
+import llm_cassette
+import llm_client
+from stub_llm_server import StubLLMServer
+
+
+def _llm(base_url, cassette):
+    return llm_client.PooledLLM(api_base=base_url, model="stub", api_key="k-cassette", backoff=0.01, cassette=cassette)
+
+
+def test_record_then_replay(tmp_path):
+    """录制后回放不再访问网络，返回相同的代码和记录的token用量"""
+    path = str(tmp_path / "llm.jsonl")
+    server = StubLLMServer(latency=0.2).start()
+    try:
+        recorder = _llm(server.base_url, llm_cassette.Cassette(path, "record"))
+        answer = recorder.chat_completion("total sales", None)
+        assert recorder.take_calls()[0]["cassette"] == "recorded"
+    finally:
+        server.stop()
+
+    cassette = llm_cassette.Cassette(path, "replay")
+    assert cassette.info()["recordings"] == 1
+    player = _llm(server.base_url, cassette)
+    start = time.monotonic()
+    assert player.chat_completion("total sales", None) == answer
+    assert time.monotonic() - start < 0.2
+    call = player.take_calls()[0]
+    assert call["cassette"] == "replayed" and call["attempts"] == 0 and call["total_tokens"] > 0
+
+    with pytest.raises(llm_cassette.CassetteMiss):
+        player.chat_completion("another question", None)
+
+    # 模拟录制时的耗时
+    slow = _llm(server.base_url, llm_cassette.Cassette(path, "replay", simulate_latency=True))
+    start = time.monotonic()
+    slow.chat_completion("total sales", None)
+    assert time.monotonic() - start >= 0.2
+
+
+def test_auto_mode_and_fingerprint(tmp_path):
+    """auto模式只录制未见过的提示；指纹忽略PandasAI随机抽取的样本行"""
+    prompt = "<dataframe>\ndfs[0]:10x2\nCategory,Sales\n{rows}</dataframe>\n\nQuery: total"
+    first = [{"role": "user", "content": prompt.format(rows="a,1\nb,2\n")}]
+    second = [{"role": "user", "content": prompt.format(rows="c,7\n")}]
+    assert llm_cassette.fingerprint("m", first) == llm_cassette.fingerprint("m", second)
+    assert llm_cassette.fingerprint("m", first) != llm_cassette.fingerprint("other", first)
+
+    server = StubLLMServer().start()
+    try:
+        llm = _llm(server.base_url, llm_cassette.Cassette(str(tmp_path / "auto.jsonl"), "auto"))
+        for query in ("q1", "q1", "q2"):
+            llm.chat_completion(query, None)
+    finally:
+        server.stop()
+    assert server.requests == 2
+    assert [c["cassette"] for c in llm.take_calls()] == ["recorded", "replayed", "recorded"]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+测试LLM客户端 (llm_client.py)
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import time
+
+import pytest
+
+import llm_client
+from stub_llm_server import StubLLMServer
+
+
+@pytest.fixture
+def stub():
+    server = StubLLMServer().start()
+    yield server
+    server.stop()
+
+
+def _llm(stub, **kwargs):
+    kwargs.setdefault("backoff", 0.01)
+    return llm_client.PooledLLM(api_base=stub.base_url, model="stub", api_key=f"k-{id(stub)}", **kwargs)
+
+
+def test_keep_alive_and_usage(stub):
+    """多次调用复用同一个连接，并记录耗时和token用量"""
+    llm = _llm(stub)
+    for _ in range(3):
+        assert "groupby" in llm.chat_completion("total sales", None)
+
+    calls = llm.take_calls()
+    assert stub.requests == 3
+    assert stub.connections == 1
+    assert [c["attempts"] for c in calls] == [1, 1, 1]
+    assert all(c["total_tokens"] > 0 and c["latency_ms"] >= 0 for c in calls)
+    assert all(c["counted_prompt_tokens"] > 0 and c["counted_completion_tokens"] > 0 for c in calls)
+    summary = llm_client.summarize_calls(calls)
+    assert summary["calls"] == 3
+    assert summary["total_tokens"] == sum(c["total_tokens"] for c in calls)
+    assert llm.take_calls() == []
+
+
+def test_retries_transient_errors(stub):
+    """503会按退避重试；400等错误不重试"""
+    stub.fail_first = 2
+    llm = _llm(stub)
+    assert "groupby" in llm.chat_completion("q", None)
+    assert llm.take_calls()[0]["retries"] == 2
+
+    stub.requests, stub.fail_first, stub.fail_status = 0, 1, 400
+    with pytest.raises(Exception):
+        llm.chat_completion("q", None)
+    assert stub.requests == 1
+    assert "error" in llm.take_calls()[0]
+
+
+def test_deadline(stub):
+    stub.latency = 1.0
+    llm = _llm(stub, deadline=0.3)
+    start = time.monotonic()
+    with pytest.raises(llm_client.LLMDeadlineError):
+        llm.chat_completion("q", None)
+    assert time.monotonic() - start < 0.9
+
+
+def test_hedge_wins_when_first_attempt_is_slow(stub):
+    """第一个请求很慢时发送对冲请求，先返回的结果生效"""
+    stub.slow_first = 1
+    llm = _llm(stub, hedge_after=0.2)
+
+    start = time.monotonic()
+    assert "groupby" in llm.chat_completion("q", None)
+    call = llm.take_calls()[0]
+    assert call["hedged"] and call["attempts"] == 2
+    assert time.monotonic() - start < stub.slow_latency
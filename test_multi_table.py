@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+测试多文件与多工作表数据集的并行加载 (pandasai_runner.load_dataset, data_loader.list_tables)
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import time
+
+import pandas as pd
+import pytest
+
+import data_loader
+import dataset_cache
+import pandasai_runner
+from stub_llm_server import StubLLMServer
+
+CONCAT_CODE = ("```python\nimport pandas as pd\ndf = pd.concat([dfs[0], dfs[1], dfs[2]])\n"
+               "result = {'type': 'number', 'value': int(df['Sales'].sum())}\n```")
+
+
+@pytest.fixture
+def files(tmp_path):
+    df = pd.DataFrame({"Category": ["a", "b"] * 50, "Sales": range(100)})
+    # 模拟Node后端保存的上传文件名
+    csv_path = tmp_path / "1700000000000-123456789-orders 2024.csv"
+    df.to_csv(csv_path, index=False)
+    xlsx_path = tmp_path / "regions.xlsx"
+    with pd.ExcelWriter(xlsx_path) as writer:
+        df.to_excel(writer, sheet_name="North", index=False)
+        df.head(10).to_excel(writer, sheet_name="South", index=False)
+    return str(csv_path), str(xlsx_path)
+
+
+def test_stable_table_names(files):
+    csv_path, xlsx_path = files
+    assert data_loader.excel_sheets(xlsx_path) == ["North", "South"]
+    tables = data_loader.list_tables([csv_path, xlsx_path, csv_path])
+    assert [name for name, _, _ in tables] == ["orders_2024", "regions_North", "regions_South", "orders_2024_2"]
+    assert [sheet for _, _, sheet in tables] == [None, "North", "South", None]
+
+
+def test_loads_every_table(files):
+    result = {}
+    tables, dataset_hash, load_full_frame = pandasai_runner.load_dataset(list(files), result)
+    assert load_full_frame is None
+    assert [(name, len(df)) for name, df in tables] == [("orders_2024", 100), ("regions_North", 100), ("regions_South", 10)]
+    assert [info["sheet"] for info in result["tables"]] == [None, "North", "South"]
+    assert result["dataset_cache"] == "miss"
+
+    # 第二次加载全部来自数据集缓存，哈希不变
+    again = {}
+    _, same_hash, _ = pandasai_runner.load_dataset(list(files), again)
+    assert same_hash == dataset_hash
+    assert again["dataset_cache"] == "memory"
+
+
+def test_tables_load_concurrently(files, monkeypatch):
+    """每个表的读取都很慢时，总耗时接近最慢的一个而不是总和"""
+    csv_path, _ = files
+
+    def slow_csv(path):
+        time.sleep(0.3)
+        return pd.read_csv(path)
+
+    monkeypatch.setitem(pandasai_runner.FILE_READERS, "csv", slow_csv)
+    start = time.perf_counter()
+    tables, _, _ = pandasai_runner.load_dataset([csv_path] * 4, {})
+    elapsed = time.perf_counter() - start
+    assert len(tables) == 4
+    assert elapsed < 0.3 * 4 * 0.75
+
+
+def test_agent_sees_every_table(files):
+    server = StubLLMServer(code=CONCAT_CODE).start()
+    try:
+        result = pandasai_runner.generate_pandas_code(
+            list(files), "total sales over all tables", cli_model_name="m", cli_api_key="k",
+            cli_api_base_url=server.base_url, use_cache=False)
+    finally:
+        server.stop()
+
+    assert result["error"] is None
+    assert "pd.concat([dfs[0], dfs[1], dfs[2]])" in result["code"]
+    assert [info["name"] for info in result["tables"]] == ["orders_2024", "regions_North", "regions_South"]
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+测试常驻worker池 (pandasai_server.py)
+请求不带API密钥时worker在调用LLM之前返回错误；调度相关的测试使用本地的OpenAI兼容桩服务器，因此无需网络
+"""
+
+import io
+import os
+import json
+import time
+import signal
+
+import pandasai_server
+from stub_llm_server import StubLLMServer
+
+
+def _pool(monkeypatch, **kwargs):
+    monkeypatch.delenv("DEEPSEEK_API_KEY", raising=False)
+    monkeypatch.delenv("DEEPSEEK_API_BASE", raising=False)
+    return pandasai_server.WorkerPool(**kwargs).start()
+
+
+def test_pool_answers_and_recycles(monkeypatch):
+    """每个worker处理一个请求后被替换，结果仍然按请求返回"""
+    pool = _pool(monkeypatch, workers=2, max_requests=1, max_memory_mb=0)
+    try:
+        futures = [pool.submit({"query": f"q{i}", "model_name": "m"}) for i in range(4)]
+        results = [f.result(timeout=120) for f in futures]
+    finally:
+        pool.shutdown()
+
+    assert [r["query"] for r in results] == ["q0", "q1", "q2", "q3"]
+    assert all("API key" in r["error"] for r in results)
+    assert pool.stats()["completed"] == 4
+    assert pool.recycled >= 3
+
+
+def test_serve_stdin_tags_ids(monkeypatch):
+    """stdin模式: 每行一个请求, 输出带id, 非法JSON单独报错"""
+    pool = _pool(monkeypatch, workers=1, max_requests=0, max_memory_mb=0)
+    stdin = io.StringIO('{"id": "a", "query": "x", "model_name": "m"}\nnot json\n{"id": "b"}\n')
+    stdout = io.StringIO()
+    try:
+        pandasai_server.serve_stdin(pool, stdin=stdin, stdout=stdout)
+    finally:
+        pool.shutdown()
+
+    responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    by_id = {r.get("id"): r for r in responses}
+    assert by_id["a"]["query"] == "x"
+    assert by_id["b"]["error"] == "Missing required field: query"
+    assert any(r["error"].startswith("Invalid request JSON") for r in responses)
+
+
+def _stub_pool(tmp_path, stub, **kwargs):
+    path = tmp_path / "sales.csv"
+    path.write_text("Category,Sales\na,1\nb,2\n")
+    base = {"model_name": "m", "api_key": "k", "api_base_url": stub.base_url, "file_path": str(path),
+            "no_cache": True, "no_fast_path": True}
+    return pandasai_server.WorkerPool(workers=1, max_requests=0, max_memory_mb=0, **kwargs).start(), base
+
+
+def test_priorities_and_bounded_queue(tmp_path):
+    """队列满时立即拒绝；等待中的请求按优先级处理"""
+    stub = StubLLMServer(latency=1.0).start()
+    pool, base = _stub_pool(tmp_path, stub, max_queue=2)
+    finished = []
+    try:
+        futures = [pool.submit(dict(base, query=name, priority=priority))
+                   for name, priority in (("running", 0), ("low", 0), ("high", 5))]
+        for future in futures:
+            future.add_done_callback(lambda f: finished.append(f.result()["query"]))
+        rejected = pool.submit(dict(base, query="overflow")).result(timeout=1)
+        results = [f.result(timeout=120) for f in futures]
+        stats = pool.stats()
+    finally:
+        pool.shutdown()
+        stub.stop()
+
+    assert rejected["scheduler"]["status"] == "rejected" and "Server busy" in rejected["error"]
+    assert [r["error"] for r in results] == [None] * 3
+    assert finished == ["running", "high", "low"]
+    assert results[1]["scheduler"]["wait_ms"] > results[2]["scheduler"]["wait_ms"]
+    assert (stats["rejected"], stats["completed"], stats["queue_depth"]) == (1, 3, 0)
+    assert stats["wait_ms"]["max"] >= 1000
+
+
+def test_cancel_and_deadline(tmp_path):
+    """取消等待中和运行中的请求，超过截止时间的请求被中止；worker仍可继续处理请求"""
+    stub = StubLLMServer(latency=30).start()
+    pool, base = _stub_pool(tmp_path, stub)
+    try:
+        running = pool.submit(dict(base, query="running", id="r"))
+        waiting = pool.submit(dict(base, query="waiting", id="w"))
+        assert pool.cancel_request("w")
+        assert waiting.result(timeout=1)["scheduler"]["status"] == "cancelled"
+
+        assert pandasai_server._answer(pool, '{"cancel": "r"}') == (None, {"id": "r", "cancelled": True})
+        cancelled = running.result(timeout=60)
+        expired = pool.submit(dict(base, query="slow", deadline_seconds=1)).result(timeout=60)
+        stub.latency = 0
+        answered = pool.submit(dict(base, query="fast")).result(timeout=60)
+        _, stats = pandasai_server._answer(pool, '{"stats": true}')
+    finally:
+        pool.shutdown()
+        stub.stop()
+
+    assert cancelled["error"] == "Request cancelled: cancelled by client"
+    assert cancelled["scheduler"]["status"] == "cancelled"
+    assert expired["cancelled"] == "deadline exceeded"
+    assert answered["error"] is None and answered["code"]
+    assert stats["stats"]["cancelled"] == 2 and stats["stats"]["workers"] == 1
+
+
+def test_crashed_worker_is_replaced(tmp_path):
+    """worker进程崩溃时它正在处理的请求返回错误，池中补充新的worker"""
+    stub = StubLLMServer(latency=30).start()
+    pool, base = _stub_pool(tmp_path, stub)
+    try:
+        crashed = pool.submit(dict(base, query="crash"))
+        while stub.requests == 0:
+            time.sleep(0.05)
+        (pid,) = list(pool._running)
+        os.kill(pid, signal.SIGKILL)
+        failed = crashed.result(timeout=60)
+        stub.latency = 0
+        answered = pool.submit(dict(base, query="after")).result(timeout=60)
+        stats = pool.stats()
+    finally:
+        pool.shutdown()
+        stub.stop()
+
+    assert failed["error"] == f"Worker process exited with code {-signal.SIGKILL}"
+    assert answered["error"] is None and answered["code"]
+    assert stats["workers"] == 1 and stats["busy"] == 0
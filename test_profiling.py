@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+测试阶段计时与性能分析 (profiling.py)
+"""
+
+import pstats
+import time
+
+import pytest
+
+import profiling
+
+
+def test_stage_timer_accumulates():
+    timer = profiling.StageTimer()
+    for _ in range(2):
+        with timer.stage("load"):
+            time.sleep(0.01)
+    with pytest.raises(ValueError):
+        with timer.stage("llm"):
+            raise ValueError("failed stages are still timed")
+
+    timings = timer.as_dict()
+    assert list(timings) == ["load_ms", "llm_ms", "total_ms"]
+    assert timings["load_ms"] >= 20
+    assert timings["total_ms"] >= timings["load_ms"] + timings["llm_ms"]
+    assert profiling.peak_rss_mb() > 0
+
+
+def test_profile_modes(tmp_path):
+    """关闭时不做任何事；cprofile和tracemalloc把分析结果写入指定目录"""
+    with profiling.profile(None, profile_dir=str(tmp_path)) as info:
+        assert info is None
+    assert list(tmp_path.iterdir()) == []
+
+    with profiling.profile("cprofile", profile_dir=str(tmp_path)) as info:
+        sorted(range(10000), key=lambda x: -x)
+    assert info["path"].endswith(".prof")
+    assert pstats.Stats(info["path"]).total_calls > 0
+
+    with profiling.profile("tracemalloc", profile_dir=str(tmp_path)) as info:
+        data = [bytes(1000) for _ in range(1000)]
+    assert info["peak_traced_mb"] >= 0.9
+    with open(info["path"], encoding="utf-8") as f:
+        assert "test_profiling.py" in f.read()
+    del data
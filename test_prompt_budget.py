@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+测试Token统计与提示压缩 (prompt_budget.py)
+"""
+
+import os
+import sys
+import types
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import prompt_budget
+
+
+def _wide_frame(columns=200):
+    data = {f"metric_{i}": np.random.RandomState(i).rand(20) for i in range(columns)}
+    data["Region"] = ["North", "South", "East", "West"] * 5
+    data["customer_note"] = ["a very long free text note about this customer"] * 20
+    data["Sales"] = np.arange(20)
+    return pd.DataFrame(data)
+
+
+def test_count_tokens():
+    assert prompt_budget.count_tokens("") == 0
+    assert prompt_budget.count_tokens(None) == 0
+    code = "df = dfs[0]\ntotal = df.groupby('Category')['Sales'].sum()"
+    assert 15 <= prompt_budget.count_tokens(code) <= 40
+    # 每个汉字大约一个token
+    assert prompt_budget.count_tokens("各类别销售总额") == 7
+
+
+def test_compress_wide_frame():
+    """宽表按查询相关性保留列，其余列只列出名称，压缩后不超过预算太多"""
+    df = _wide_frame()
+    head, description, report = prompt_budget.compress(df, "total Sales by Region", budget=400)
+
+    assert report["before_tokens"] > 400
+    assert report["after_tokens"] <= 400 * 1.05
+    assert report["columns_total"] == df.shape[1]
+    assert "Sales" in head.columns and "Region" in head.columns
+    assert report["columns_kept"] == head.shape[1] < df.shape[1]
+    assert report["steps"][0] == "truncate_values"
+    assert description.startswith("Other columns: ")
+
+
+def test_no_compression_under_budget():
+    df = _wide_frame(columns=3)
+    assert prompt_budget.compress(df, "total Sales", budget=0) is None
+    assert prompt_budget.compress(df, "total Sales", budget=100000) is None
+
+
+def test_category_summary_and_truncation():
+    df = _wide_frame(columns=20)
+    head, description, report = prompt_budget.compress(df, "Region notes", budget=250)
+    assert all(len(v) <= prompt_budget.MAX_VALUE_CHARS for v in head["customer_note"])
+    assert "Region: " in description
+    assert any(step.startswith("category_summary=") for step in report["steps"])
+
+
+def test_tiktoken_only_from_pinned_cache(tmp_path, monkeypatch):
+    """cl100k_base 只从固定的缓存目录读取，不会联网下载；报告中给出实际使用的计数方式"""
+    loaded = []
+    fake = types.ModuleType("tiktoken")
+    fake.get_encoding = lambda name: loaded.append(name) or types.SimpleNamespace(
+        encode=lambda text, disallowed_special=(): list(text))
+    monkeypatch.setitem(sys.modules, "tiktoken", fake)
+    monkeypatch.setattr(prompt_budget, "TIKTOKEN_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(prompt_budget, "_encoding", None)
+    df = _wide_frame()
+
+    # 缓存中没有编码文件：不调用tiktoken，使用离线近似并如实报告
+    assert prompt_budget.tokenizer_name() == "approx" and loaded == []
+    assert prompt_budget.compress(df, "total Sales", budget=400)[2]["tokenizer"] == "approx"
+
+    # 文件损坏时tiktoken会重新下载，因此同样不使用
+    monkeypatch.setattr(prompt_budget, "_encoding", None)
+    cached = tmp_path / hashlib.sha1(prompt_budget.TIKTOKEN_URL.encode()).hexdigest()
+    cached.write_bytes(b"corrupt")
+    assert prompt_budget.tokenizer_name() == "approx" and loaded == []
+
+    # 与固定的哈希一致时由tiktoken从该目录加载
+    monkeypatch.setattr(prompt_budget, "_encoding", None)
+    monkeypatch.setattr(prompt_budget, "TIKTOKEN_SHA256", hashlib.sha256(b"corrupt").hexdigest())
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", "elsewhere")
+    assert prompt_budget.tokenizer_name() == "tiktoken:cl100k_base" and loaded == ["cl100k_base"]
+    assert os.environ["TIKTOKEN_CACHE_DIR"] == str(tmp_path)
+    assert prompt_budget.count_tokens("abc") == 3
+    assert prompt_budget.compress(df, "total Sales", budget=400)[2]["tokenizer"] == "tiktoken:cl100k_base"
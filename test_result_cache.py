@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+测试结果缓存 (result_cache.py)
+"""
+
+import time
+
+import pandas as pd
+
+import pandasai_runner
+import result_cache
+from stub_llm_server import StubLLMServer
+
+
+def _key(query="Total sales by Category?", model="deepseek-chat", schema="s"):
+    return result_cache.make_key("abc", query, model, "default", schema)
+
+
+def test_key_normalizes_query():
+    """空白和末尾标点不影响缓存键，大小写、模型和schema会影响"""
+    assert _key() == _key("  Total   sales by Category ")
+    assert _key() == _key("Total sales by Category？")
+    # 查询中的取值会成为区分大小写的过滤条件
+    assert _key("rows where City == 'Paris'") != _key("rows where City == 'PARIS'")
+    assert _key() != _key("total SALES by category")
+    assert _key() != _key(model="deepseek-r1")
+    assert _key() != _key(schema="other")
+
+    df = pd.DataFrame({"a": [1], "b": ["x"]})
+    assert result_cache.schema_fingerprint(df) != result_cache.schema_fingerprint(df.astype({"a": float}))
+
+
+def test_ttl_and_size_eviction(tmp_path):
+    cache = result_cache.ResultCache(path=str(tmp_path / "r.sqlite3"), ttl_seconds=3600, max_entries=2)
+    for i in range(3):
+        cache.put(f"k{i}", {"code": f"print({i})", "tokens": i, "error": None})
+        time.sleep(0.01)
+
+    assert cache.get("k0") is None
+    assert cache.get("k2") == {"code": "print(2)", "tokens": 2}
+
+    expired = result_cache.ResultCache(path=str(tmp_path / "r.sqlite3"), ttl_seconds=1e-6)
+    assert expired.get("k2") is None
+
+
+def test_missing_chart_is_a_miss(tmp_path):
+    cache = result_cache.ResultCache(path=str(tmp_path / "r.sqlite3"))
+    cache.put("k", {"code": "plt.show()", "tokens": 3, "chart": "gone.png"})
+    assert cache.get("k", charts_dir=str(tmp_path)) is None
+
+
+def test_failing_code_is_not_cached(tmp_path):
+    """执行失败的代码不写入缓存，相同的问题再次询问LLM"""
+    path = tmp_path / "sales.csv"
+    pd.DataFrame({"Category": ["a", "b"], "Sales": [1, 2]}).to_csv(path, index=False)
+    server = StubLLMServer(code="```python\ndf = dfs[0]\nresult = {'type': 'number', 'value': df['Missing'].sum()}\n```").start()
+    try:
+        results = [pandasai_runner.generate_pandas_code(str(path), "sum of the missing column", cli_model_name="m",
+                                                        cli_api_key="k", cli_api_base_url=server.base_url,
+                                                        use_fast_path=False) for _ in range(2)]
+        requests = server.requests
+    finally:
+        server.stop()
+
+    assert [r["result_cache"] for r in results] == ["miss", "miss"]
+    assert all("Missing" in r["error"] for r in results)
+    assert requests == 2
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+测试多轮对话会话 (sessions.py)：同一会话的追问复用已加载的数据和Agent的对话记忆
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import pandas as pd
+import pytest
+
+import pandasai_runner
+import pandasai_server
+import sessions
+from stub_llm_server import StubLLMServer
+
+
+@pytest.fixture
+def stub():
+    server = StubLLMServer().start()
+    yield server
+    server.stop()
+
+
+def _csv(tmp_path):
+    path = tmp_path / "sales.csv"
+    pd.DataFrame({"Category": ["a", "b"] * 50, "Sales": range(100)}).to_csv(path, index=False)
+    return str(path)
+
+
+def _ask(server, file_path, query, session_id="s1"):
+    return pandasai_runner.generate_pandas_code(file_path, query, cli_model_name="m", cli_api_key="k",
+                                                cli_api_base_url=server.base_url, session_id=session_id)
+
+
+def test_follow_up_reuses_agent_and_data(stub, tmp_path, monkeypatch):
+    path = _csv(tmp_path)
+    first = _ask(stub, path, "total sales")
+    assert first["error"] is None
+    assert first["session"] == {"status": "new", "turn": 1}
+    agent = sessions.get_store().get("s1").agent
+
+    # 追问不再解析文件，也可以不再指定文件
+    monkeypatch.setitem(pandasai_runner.FILE_READERS, "csv", None)
+    second = _ask(stub, "none", "now break that down by Category")
+    assert second["error"] is None
+    assert second["session"] == {"status": "reused", "turn": 2}
+    assert second["dataset_cache"] == "session"
+    assert second["result_cache"] == "bypass"
+    session = sessions.get_store().get("s1")
+    assert session.agent is agent
+    user_messages = [m["message"] for m in session.conversation() if m["is_user"]]
+    assert "total sales" in user_messages and "now break that down by Category" in user_messages
+
+    assert "Invalid session id" in _ask(stub, path, "q", session_id="../x")["error"]
+
+
+def test_eviction_and_snapshot_restore(stub, tmp_path):
+    path = _csv(tmp_path)
+    store = sessions.get_store()
+    _ask(stub, path, "total sales", session_id="a")
+
+    # 超出内存预算时淘汰最久未使用的会话；空闲超时的会话也被淘汰
+    store.budget_bytes = 1
+    _ask(stub, path, "total sales", session_id="b")
+    assert store.get("a") is None and store.get("b") is not None
+    store.idle_seconds = 0.001
+    assert store.evict_idle(now=store.get("b").last_used + 1) == ["b"]
+
+    # 新进程 (新的store) 从快照恢复数据和对话
+    sessions._default_store = sessions.SessionStore(snapshot_dir=store.snapshot_dir)
+    result = _ask(stub, "none", "and the average?", session_id="a")
+    assert result["error"] is None
+    assert result["session"] == {"status": "restored", "turn": 2}
+    restored = sessions.get_store().get("a")
+    assert [m["message"] for m in restored.conversation() if m["is_user"]][0] == "total sales"
+    assert len(restored.tables[0][1]) == 100
+
+    # 换了数据文件则重新开始
+    other = tmp_path / "other.csv"
+    pd.DataFrame({"Category": ["x"], "Sales": [1]}).to_csv(other, index=False)
+    assert _ask(stub, str(other), "total sales", session_id="a")["session"] == {"status": "new", "turn": 1}
+
+
+def test_pool_routes_session_to_its_worker(stub, tmp_path):
+    """同一会话的请求总是交给持有它的worker"""
+    path = _csv(tmp_path)
+    pool = pandasai_server.WorkerPool(workers=2, max_requests=0, max_memory_mb=0).start()
+    base = {"model_name": "m", "api_key": "k", "api_base_url": stub.base_url, "no_cache": True}
+    try:
+        results = [pool.submit(dict(base, query=f"q{i}", file_path=path, session_id="pooled")).result(timeout=120)
+                   for i in range(3)]
+        stats = pool.stats()
+    finally:
+        pool.shutdown()
+
+    assert [r["error"] for r in results] == [None] * 3
+    assert [r["session"] for r in results] == [{"status": "new", "turn": 1}, {"status": "reused", "turn": 2},
+                                                {"status": "reused", "turn": 3}]
+    assert stats["sessions"] == 1
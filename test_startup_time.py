@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+启动时间回归测试
+不需要LLM的错误路径（如缺少API密钥）不应导入pandas/PandasAI/matplotlib，
+冷启动时间不能超过 STARTUP_BUDGET_SECONDS（默认1秒）
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "1.0"))
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ["pandas", "pandasai", "matplotlib", "openai"]
+
+
+def _env():
+    env = dict(os.environ)
+    env.pop("DEEPSEEK_API_KEY", None)
+    env.pop("DEEPSEEK_API_BASE", None)
+    return env
+
+
+def test_import_is_light(tmp_path):
+    for script in ("pandasai_runner", "pandasai_helper"):
+        code = f"import sys, json; import {script}; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+        proc = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=_env(), capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr
+        assert json.loads(proc.stdout) == [], f"{script} imports heavy modules at import time"
+    # Importing the runner must not create directories as a side effect
+    proc = subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {HERE!r}); import pandasai_runner"],
+                          cwd=str(tmp_path), env=_env())
+    assert proc.returncode == 0
+    assert not (tmp_path / "charts").exists()
+
+
+def test_error_path_cold_start_within_budget(tmp_path):
+    """缺少API密钥时runner在预算时间内返回错误JSON"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join(HERE, "pandasai_runner.py"), "query", "none"],
+                          cwd=str(tmp_path), env=_env(), capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+
+    assert "API key" in json.loads(proc.stdout)["error"]
+    assert elapsed < STARTUP_BUDGET_SECONDS, f"cold start took {elapsed:.2f}s (budget {STARTUP_BUDGET_SECONDS}s)"
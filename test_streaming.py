@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+测试流式进度事件 (--stream)：runner按阶段输出JSON行事件，最后一行是带 "event": "done" 的完整结果
+使用本地的OpenAI兼容桩服务器 (stub_llm_server.py)，无需网络
+"""
+
+import io
+import os
+import sys
+import json
+import subprocess
+
+import pandasai_runner
+import pandasai_server
+from stub_llm_server import StubLLMServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _csv(tmp_path):
+    path = tmp_path / "sales.csv"
+    path.write_text("Category,Sales\na,1\nb,2\na,3\n")
+    return path
+
+
+def test_cli_streams_events_before_result(tmp_path):
+    """LLM路径依次输出 loaded、llm_response、code，最后是与非流式模式相同的结果"""
+    path = _csv(tmp_path)
+    server = StubLLMServer(latency=1.0).start()
+    try:
+        proc = subprocess.run([sys.executable, os.path.join(HERE, "pandasai_runner.py"), "plot the sales", str(path),
+                               "--model-name", "m", "--api-key", "k", "--api-base-url", server.base_url,
+                               "--no-cache", "--no-fast-path", "--stream"],
+                              cwd=str(tmp_path), capture_output=True, text=True, timeout=120)
+    finally:
+        server.stop()
+
+    events = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert [e["event"] for e in events] == ["loaded", "llm_response", "code", "done"]
+    loaded, llm_response, code, done = events
+    assert loaded["tables"] == [{"name": "sales", "shape": [3, 2]}]
+    assert llm_response["llm_ms"] >= 1000 and "dfs[0]" in llm_response["raw_code"]
+    assert code["code"] == done["code"] and code["source"] == "llm"
+    assert {e["request_id"] for e in events} == {done["request_id"]}
+    assert done["error"] is None and done["source"] == "llm" and "timings" in done
+    # The data shape is known long before the answer
+    assert loaded["elapsed_ms"] < done["timings"]["total_ms"] - 1000
+
+
+def test_fast_path_chart_event(tmp_path):
+    """快速路径在执行代码之前输出 code 事件，图表保存后输出 chart 事件"""
+    events = []
+    result = pandasai_runner.generate_pandas_code(
+        str(_csv(tmp_path)), "bar chart of total Sales by Category", cli_model_name="m", cli_api_key="k",
+        cli_api_base_url="http://127.0.0.1:9", use_cache=False, emit=events.append)
+
+    assert [e["event"] for e in events] == ["loaded", "code", "chart"]
+    assert events[1]["source"] == "fast_path" and events[1]["code"] == result["code"]
+    assert events[2]["chart"] == result["chart"] and (tmp_path / "charts" / result["chart"]).exists()
+
+
+def test_serve_streams_tagged_events(tmp_path):
+    """服务模式中 "stream": true 的请求先收到带id的进度事件，其他请求只收到结果"""
+    server = StubLLMServer().start()
+    pool = pandasai_server.WorkerPool(workers=1, max_requests=0, max_memory_mb=0).start()
+    base = {"model_name": "m", "api_key": "k", "api_base_url": server.base_url, "file_path": str(_csv(tmp_path)),
+            "no_cache": True, "no_fast_path": True, "query": "plot the sales"}
+    stdin = io.StringIO(json.dumps(dict(base, id="s", stream=True)) + "\n" + json.dumps(dict(base, id="p")) + "\n")
+    stdout = io.StringIO()
+    try:
+        pandasai_server.serve_stdin(pool, stdin=stdin, stdout=stdout)
+    finally:
+        pool.shutdown()
+        server.stop()
+
+    responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    streamed = [r.get("event") for r in responses if r["id"] == "s"]
+    plain = [r for r in responses if r["id"] == "p"]
+    assert streamed == ["loaded", "llm_response", "code", "done"]
+    assert len(plain) == 1 and "event" not in plain[0] and plain[0]["error"] is None